@@ -67,6 +67,21 @@ export const paymentsAPI = {
     }
   },
 
+  // Check access to many books in one request (e.g. a library shelf)
+  checkBooksAccess: async (bookIds) => {
+    try {
+      const response = await apiClient.post('/user-purchases/check-access-batch/', {
+        book_ids: bookIds,
+      });
+      return { success: true, data: response.data.results };
+    } catch (error) {
+      return {
+        success: false,
+        message: error.response?.data?.error || 'Failed to check book access',
+      };
+    }
+  },
+
   // Verify Chapa payment
   verifyChapaPayment: async (txRef) => {
     try {
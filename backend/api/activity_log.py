@@ -1,20 +1,188 @@
-# core/activity_log.py
+"""
+Admin activity feed shared by every worker.
 
-from collections import deque
-from datetime import datetime
+Entries are rows of the append-only ``ActivityEntry`` table, so all workers
+serve the same feed and it survives restarts. ``log_activity`` does not
+touch the database: it appends to an in-process buffer that a daemon thread
+writes with one ``bulk_create`` every ``ACTIVITY_LOG_FLUSH_INTERVAL`` seconds
+(default 2), or as soon as it holds ``ACTIVITY_LOG_FLUSH_MAX`` entries, and
+at exit. ``ACTIVITY_LOG_FLUSH_INTERVAL = 0`` writes each entry immediately.
+After a failed write the entries stay buffered and only the flush thread
+retries, backing off exponentially up to ``MAX_BACKOFF`` seconds; the buffer
+keeps at most ``ACTIVITY_LOG_BUFFER_MAX`` entries, dropping the oldest.
+
+``get_recent_activities`` reads newest-first pages by id cursor (``before``
+for older pages, ``after`` to poll for new entries). ``prune`` enforces
+retention (``ACTIVITY_LOG_RETENTION_DAYS`` and ``ACTIVITY_LOG_MAX_ROWS``);
+the flush thread runs it at most once an hour across all workers.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import ActivityEntry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 2
+DEFAULT_FLUSH_MAX = 100
+DEFAULT_RETENTION_DAYS = 90
+DEFAULT_MAX_ROWS = 100000
+DEFAULT_BUFFER_MAX = 10000
+MAX_BACKOFF = 300
+PRUNE_INTERVAL = 3600
+MAX_PAGE = 100
+
+_lock = threading.Lock()
+_buffer = []
+_flusher = None
+_pid = None
+_failures = 0
+_retry_at = 0.0
+_dropped = 0
+
+
+def flush_interval():
+    return getattr(settings, 'ACTIVITY_LOG_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
 
-# Store only the latest 100 activities in memory
-ACTIVITY_LOG = deque(maxlen=100)
 
 def log_activity(user, action, model_name, object_id):
-    ACTIVITY_LOG.appendleft({
-        "user": user.username if user else "System",
-        "action": action.lower(),
-        "model": model_name.lower(),
-        "object_id": object_id,
-        "timestamp": datetime.utcnow().isoformat(),
-        "text": f"{action.title()} {model_name.title()} with ID {object_id}"
-    })
-
-def get_recent_activities(limit=100):
-    return list(ACTIVITY_LOG)[:limit]
+    entry = ActivityEntry(
+        user=user if user is not None and user.is_authenticated else None,
+        username=user.username if user else "System",
+        action=action.lower(),
+        model_name=model_name.lower(),
+        object_id='' if object_id is None else str(object_id),
+        text=f"{action.title()} {model_name.title()} with ID {object_id}"[:255],
+        created_at=timezone.now(),
+    )
+    with _lock:
+        _ensure_flusher()
+        _buffer.append(entry)
+        _trim()
+        full = len(_buffer) >= getattr(settings, 'ACTIVITY_LOG_FLUSH_MAX', DEFAULT_FLUSH_MAX)
+    if (full or flush_interval() <= 0) and not _backing_off():
+        flush()
+
+
+def _trim():
+    """Drop the oldest entries beyond ``ACTIVITY_LOG_BUFFER_MAX`` (called with ``_lock`` held)."""
+    global _dropped
+    excess = len(_buffer) - getattr(settings, 'ACTIVITY_LOG_BUFFER_MAX', DEFAULT_BUFFER_MAX)
+    if excess > 0:
+        del _buffer[:excess]
+        _dropped += excess
+
+
+def _backing_off():
+    """Whether a write failed recently; the flush thread retries (without it, once the backoff ends)."""
+    if not _failures:
+        return False
+    return _flusher is not None or time.monotonic() < _retry_at
+
+
+def flush():
+    """Write buffered entries; returns how many were written."""
+    global _buffer, _failures, _retry_at, _dropped
+    with _lock:
+        entries, _buffer = _buffer, []
+    if not entries:
+        return 0
+    try:
+        ActivityEntry.objects.bulk_create(entries)
+    except Exception as e:
+        with _lock:
+            _buffer[:0] = entries
+            _trim()
+            _failures += 1
+            backoff = min(MAX_BACKOFF, max(flush_interval(), 1) * 2 ** (_failures - 1))
+            _retry_at = time.monotonic() + backoff
+            dropped, _dropped = _dropped, 0
+        logger.error(f"Failed to write {len(entries)} activity entries, retrying in {backoff}s: {str(e)}")
+        if dropped:
+            logger.error(f"Activity log buffer full, dropped the {dropped} oldest entries")
+        return 0
+    _failures = 0
+    return len(entries)
+
+
+def get_recent_activities(limit=100, before=None, after=None):
+    """
+    Newest-first feed entries, at most ``limit`` (capped at ``MAX_PAGE``):
+    older than entry id ``before`` and/or newer than entry id ``after``.
+    """
+    flush()  # include this worker's own recent entries
+    entries = ActivityEntry.objects.all()
+    if before is not None:
+        entries = entries.filter(id__lt=before)
+    if after is not None:
+        entries = entries.filter(id__gt=after)
+    return [
+        {
+            "id": entry.id,
+            "user": entry.username,
+            "action": entry.action,
+            "model": entry.model_name,
+            "object_id": entry.object_id,
+            "timestamp": entry.created_at.isoformat(),
+            "text": entry.text,
+        }
+        for entry in entries.order_by('-id')[:max(1, min(limit, MAX_PAGE))]
+    ]
+
+
+def prune(retention_days=None, max_rows=None):
+    """Delete entries past the retention period or beyond the newest ``max_rows``; returns the count."""
+    retention_days = retention_days or getattr(settings, 'ACTIVITY_LOG_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)
+    max_rows = max_rows or getattr(settings, 'ACTIVITY_LOG_MAX_ROWS', DEFAULT_MAX_ROWS)
+    deleted, _ = ActivityEntry.objects.filter(created_at__lt=timezone.now() - timedelta(days=retention_days)).delete()
+    boundary = ActivityEntry.objects.order_by('-id').values_list('id', flat=True)[max_rows:max_rows + 1].first()
+    if boundary is not None:
+        deleted += ActivityEntry.objects.filter(id__lte=boundary).delete()[0]
+    return deleted
+
+
+def _ensure_flusher():
+    """Start the flush thread on first use in this process (called with ``_lock`` held)."""
+    global _flusher, _pid
+    if _pid == os.getpid() and _flusher is not None:
+        return
+    if _pid is not None and _pid != os.getpid():
+        # Forked after the parent logged; its entries are the parent's to write
+        _buffer.clear()
+    _pid = os.getpid()
+    if flush_interval() > 0:
+        _flusher = threading.Thread(target=_flush_loop, name='activity-log-flush', daemon=True)
+        _flusher.start()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(flush_interval() if flush_interval() > 0 else DEFAULT_FLUSH_INTERVAL)
+        if _failures and time.monotonic() < _retry_at:
+            continue
+        try:
+            # One writing worker per interval does the retention sweep
+            if flush() and cache.add('activity_log:pruned', time.time(), PRUNE_INTERVAL):
+                prune()
+        except Exception as e:
+            logger.error(f"Activity log flush failed: {str(e)}")
+        finally:
+            close_old_connections()
+
+
+@atexit.register
+def _flush_at_exit():
+    if _pid == os.getpid():
+        try:
+            flush()
+        except Exception as e:
+            logger.error(f"Activity log flush at exit failed: {str(e)}")
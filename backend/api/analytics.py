@@ -0,0 +1,300 @@
+"""
+Time-series rollups behind the admin analytics endpoint.
+
+``AnalyticsRollup`` rows hold hourly and daily totals per metric (and an
+optional dimension such as the payment method):
+
+* signups, books_added, projects_added, questions_added, payments, and
+  payments_completed and revenue (by payment method) are recomputed from
+  their source tables by ``aggregate`` (the ``aggregate_analytics`` job and
+  management command);
+* book_views, book_downloads and project_views are events with no source
+  table; they are recorded as api.counters flushes them.
+
+Daily rows are summed from the hourly rows, so any date range is answered
+from the rollup table with a single indexed query; the most viewed and
+most downloaded lists read the top of the views/downloads indexes. ``report`` assembles the
+admin_analytics payload and caches it for ``ANALYTICS_TTL`` seconds. It never
+aggregates inline: until the first backfill job has run, the payload is built
+from the rollups that exist and marked ``rollups.status = 'pending'``.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+
+from .models import AnalyticsRollup, BackgroundJob, Book, Payment, Project, Questions
+from .stats import dashboard_data
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+DEFAULT_REFRESH_INTERVAL = 900
+DEFAULT_TTL = 60
+BACKFILL_DAYS = 365
+RANGES = {'7d': 7, '30d': 30, '90d': 90, '365d': 365}
+
+# metric -> (model, timestamp field, filter, aggregate, dimension field)
+SOURCE_METRICS = {
+    'signups': (User, 'date_joined', {}, Count('pk'), None),
+    'books_added': (Book, 'created_at', {}, Count('pk'), None),
+    'projects_added': (Project, 'created_at', {}, Count('pk'), None),
+    # Questions have no timestamp of their own; use their subject's
+    'questions_added': (Questions, 'subject__created_at', {}, Count('pk'), None),
+    'payments': (Payment, 'created_at', {}, Count('pk'), None),
+    'payments_completed': (Payment, 'created_at', {'status': 'completed'}, Count('pk'), 'payment_method'),
+    'revenue': (Payment, 'created_at', {'status': 'completed'}, Sum('amount'), 'payment_method'),
+}
+
+# (model, counter field) flushed by api.counters -> event metric
+EVENT_METRICS = {
+    (Book, 'views'): 'book_views',
+    (Book, 'downloads'): 'book_downloads',
+    (Project, 'views'): 'project_views',
+}
+
+
+def _day_start(value):
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+# -----------------------
+# Writing rollups
+# -----------------------
+def record_event(metric, value, when=None, dimension=''):
+    """Add ``value`` to the hourly and daily buckets containing ``when``."""
+    when = timezone.localtime(when or timezone.now())
+    hour = when.replace(minute=0, second=0, microsecond=0)
+    for granularity, bucket_start in (('hour', hour), ('day', _day_start(hour))):
+        bucket = AnalyticsRollup.objects.filter(
+            granularity=granularity, bucket_start=bucket_start, metric=metric, dimension=dimension,
+        )
+        if bucket.update(value=F('value') + value):
+            continue
+        try:
+            with transaction.atomic():
+                AnalyticsRollup.objects.create(
+                    granularity=granularity, bucket_start=bucket_start, metric=metric, dimension=dimension, value=value,
+                )
+        except IntegrityError:
+            bucket.update(value=F('value') + value)  # created concurrently
+
+
+def _hourly_rows(metric, start, end):
+    model, field, filters, aggregate, dimension = SOURCE_METRICS[metric]
+    rows = (
+        model._default_manager.filter(**{f'{field}__gte': start, f'{field}__lt': end}, **filters)
+        .annotate(bucket=TruncHour(field))
+        .values('bucket', *([dimension] if dimension else []))
+        .annotate(total=aggregate)
+    )
+    for row in rows:
+        yield AnalyticsRollup(
+            granularity='hour',
+            bucket_start=row['bucket'],
+            metric=metric,
+            dimension=str(row[dimension] or '') if dimension else '',
+            value=float(row['total'] or 0),
+        )
+
+
+def aggregate(days=2, now=None):
+    """
+    Recompute the rollups for the last ``days`` days (whole days, up to now).
+
+    Source metrics are re-counted per hour; daily rows for every metric are
+    then re-summed from the hourly rows. Returns the number of rows written.
+    """
+    now = now or timezone.now()
+    start = _day_start(timezone.localtime(now)) - timedelta(days=days - 1)
+    end = now + timedelta(hours=1)
+
+    hourly = []
+    for metric in SOURCE_METRICS:
+        hourly.extend(_hourly_rows(metric, start, end))
+
+    with transaction.atomic():
+        AnalyticsRollup.objects.filter(
+            granularity='hour', bucket_start__gte=start, metric__in=list(SOURCE_METRICS),
+        ).delete()
+        AnalyticsRollup.objects.bulk_create(hourly, batch_size=1000)
+
+        daily = [
+            AnalyticsRollup(granularity='day', bucket_start=row['day'], metric=row['metric'],
+                            dimension=row['dimension'], value=row['total'])
+            for row in AnalyticsRollup.objects.filter(granularity='hour', bucket_start__gte=start)
+            .annotate(day=TruncDay('bucket_start'))
+            .values('day', 'metric', 'dimension')
+            .annotate(total=Sum('value'))
+        ]
+        AnalyticsRollup.objects.filter(granularity='day', bucket_start__gte=start).delete()
+        AnalyticsRollup.objects.bulk_create(daily, batch_size=1000)
+
+        # Daily rows are kept; hourly detail only as far back as a backfill reaches
+        AnalyticsRollup.objects.filter(
+            granularity='hour', bucket_start__lt=now - timedelta(days=BACKFILL_DAYS + 1),
+        ).delete()
+    return len(hourly) + len(daily)
+
+
+def run_aggregate_analytics_job(job):
+    """Job handler for ``aggregate_analytics``: payload ``{days}``."""
+    days = int(job.payload.get('days', 2))
+    return {'days': days, 'rows': aggregate(days=days)}
+
+
+def ensure_fresh():
+    """
+    Queue the aggregation the rollups need and return it while the first backfill is pending.
+
+    The first call queues a ``BACKFILL_DAYS`` backfill; once that has run, an
+    incremental aggregation is queued whenever the last one is older than
+    ``ANALYTICS_REFRESH_INTERVAL``. Returns None when the backfill is done.
+    """
+    from . import jobs
+
+    backfilled = BackgroundJob.objects.filter(
+        kind='aggregate_analytics', payload__days=BACKFILL_DAYS, status='done',
+    ).exists()
+    last = BackgroundJob.objects.filter(kind='aggregate_analytics').order_by('-created_at').first()
+    interval = getattr(settings, 'ANALYTICS_REFRESH_INTERVAL', DEFAULT_REFRESH_INTERVAL)
+    if last is None or (last.status not in ('queued', 'running')
+                        and last.created_at < timezone.now() - timedelta(seconds=interval)):
+        last = jobs.enqueue('aggregate_analytics', {'days': 2 if backfilled else BACKFILL_DAYS})
+    return None if backfilled else last
+
+
+# -----------------------
+# Reading rollups
+# -----------------------
+def parse_range(value):
+    """Number of days for ``7d``/``30d``/``365d`` (or a plain number); ValueError otherwise."""
+    value = (value or '7d').strip().lower()
+    if value in RANGES:
+        return RANGES[value]
+    try:
+        days = int(value[:-1] if value.endswith('d') else value)
+    except ValueError:
+        raise ValueError("Range must look like 7d, 30d or 365d")
+    if not 1 <= days <= BACKFILL_DAYS:
+        raise ValueError(f"Range must be between 1 and {BACKFILL_DAYS} days")
+    return days
+
+
+def read_series(days, now=None):
+    """
+    Daily totals for the last ``days`` days (today included), in one query.
+
+    Returns ``(dates, values)`` where ``values[metric][dimension][date]`` is a number.
+    """
+    now = timezone.localtime(now or timezone.now())
+    start = _day_start(now) - timedelta(days=days - 1)
+    dates = [(start + timedelta(days=i)).date() for i in range(days)]
+
+    values = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))
+    rows = AnalyticsRollup.objects.filter(granularity='day', bucket_start__gte=start).values_list(
+        'bucket_start', 'metric', 'dimension', 'value',
+    )
+    for bucket_start, metric, dimension, value in rows:
+        values[metric][dimension][timezone.localtime(bucket_start).date()] += value
+    return dates, values
+
+
+def _total(values, metric, dates, dimension=None):
+    """Sum of ``metric`` over ``dates`` (all dimensions unless one is given)."""
+    series = values.get(metric, {})
+    dimensions = [dimension] if dimension is not None else list(series)
+    return sum(series.get(d, {}).get(date, 0) for d in dimensions for date in dates)
+
+
+def _by_dimension(values, metric, dates):
+    totals = {dimension: sum(series.get(date, 0) for date in dates) for dimension, series in values.get(metric, {}).items()}
+    return {dimension: round(value, 2) for dimension, value in totals.items() if value}
+
+
+def _series(values, metric, dates):
+    return [{'date': date.isoformat(), 'value': round(_total(values, metric, [date]), 2)} for date in dates]
+
+
+def report(days):
+    """The admin analytics payload for the last ``days`` days."""
+    cache_key = f'admin_analytics:{days}'
+    data = cache.get(cache_key)
+    if data is not None:
+        return data
+
+    from .jobs import serialize_job
+
+    backfill = None
+    try:
+        backfill = ensure_fresh()
+    except Exception as e:
+        logger.error(f"Could not refresh analytics rollups: {str(e)}")
+
+    now = timezone.now()
+    dates, values = read_series(max(days, 30), now)
+    period, week, month = dates[-days:], dates[-7:], dates[-30:]
+    totals = dashboard_data()
+    count = lambda metric, dates: int(_total(values, metric, dates))
+
+    data = {
+        'range': {'days': days, 'from': period[0].isoformat(), 'to': period[-1].isoformat()},
+        # Newest day first
+        'user_growth': [{'date': date.isoformat(), 'count': count('signups', [date])} for date in reversed(period)],
+        'content_analytics': {
+            'books': {
+                'total': totals['total_books'],
+                'this_week': count('books_added', week),
+                'this_month': count('books_added', month),
+                'in_range': count('books_added', period),
+                'views_in_range': count('book_views', period),
+                'downloads_in_range': count('book_downloads', period),
+                'most_viewed': list(Book.objects.order_by('-views')[:5].values('id', 'title', 'views')),
+                'most_downloaded': list(Book.objects.order_by('-downloads')[:5].values('id', 'title', 'downloads')),
+            },
+            'projects': {
+                'total': totals['ongoing_projects'],
+                'this_week': count('projects_added', week),
+                'this_month': count('projects_added', month),
+                'in_range': count('projects_added', period),
+                'views_in_range': count('project_views', period),
+                'most_viewed': list(Project.objects.order_by('-views')[:5].values('id', 'title', 'views')),
+            },
+            'questions': {
+                'total': totals['total_exams'],
+                'this_week': count('questions_added', week),
+                'this_month': count('questions_added', month),
+                'in_range': count('questions_added', period),
+            },
+        },
+        'revenue_analytics': {
+            'total_payments': totals['payment_stats']['total_payments'],
+            'completed_payments': totals['payment_stats']['completed_payments'],
+            'total_revenue': totals['payment_stats']['total_revenue'],
+            'payments_this_month': count('payments_completed', month),
+            'revenue_in_range': round(_total(values, 'revenue', period), 2),
+            'payment_methods': {method: int(n) for method, n in _by_dimension(values, 'payments_completed', period).items()},
+            'revenue_by_method': _by_dimension(values, 'revenue', period),
+        },
+        'series': {
+            metric: _series(values, metric, period)
+            for metric in list(SOURCE_METRICS) + list(EVENT_METRICS.values())
+        },
+        'generated_at': now.isoformat(),
+        # Until the first backfill has run, the series only cover what was recorded so far
+        'rollups': {
+            'status': 'pending' if backfill is not None else 'ready',
+            'job': serialize_job(backfill) if backfill is not None else None,
+        },
+    }
+    if backfill is None:
+        cache.set(cache_key, data, getattr(settings, 'ANALYTICS_TTL', DEFAULT_TTL))
+    return data
@@ -0,0 +1,275 @@
+"""
+Whole-book audiobook rendering.
+
+A book's stored page text (api.book_text) is split into chapter-sized
+segments: a new segment starts at every page that opens with a chapter
+heading, and long stretches without headings are cut every
+``MAX_SEGMENT_WORDS`` words. Segments are synthesized in parallel with the
+configured TTS backend (api.tts_backends) and saved as ``AudioBookSegment``
+rows with their real MP3 duration.
+
+Rendering runs as the ``render_audiobook`` background job (api.jobs) or via
+``manage.py render_audiobook``. It is resumable: a segment whose text and
+voice settings are unchanged and whose audio is already saved is skipped.
+"""
+import hashlib
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.urls import reverse
+
+from .book_text import ingest_book
+from .entitlements import media_url
+from .jobs import update_progress
+from .models import AudioBookSegment, BackgroundJob, Book
+from .tts_backends import get_backend
+from .tts_cache import chunk_text
+
+logger = logging.getLogger(__name__)
+
+MAX_SEGMENT_WORDS = 4500  # ~30 minutes of speech
+TTS_CHUNK_CHARS = 1000
+MAX_RENDER_WORKERS = 4
+HEADING_CHARS = 200  # headings may follow a running header at the top of the page
+CHAPTER_RE = re.compile(
+    r'(?<!\w)((?:Chapter|CHAPTER|Part|PART|ምዕራፍ|Boqonnaa|BOQONNAA|Cutubka|CUTUBKA)\s+(?:\d+|[IVXLC]+|[፩-፼]+))(?!\w)'
+    r'[ \t]*\n?([^\n]{0,60})'
+)
+
+
+# -----------------------
+# MP3 duration
+# -----------------------
+_BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],  # MPEG-1
+    2: [22050, 24000, 16000],  # MPEG-2
+    0: [11025, 12000, 8000],   # MPEG-2.5
+}
+
+
+def mp3_duration(data):
+    """Duration in seconds of MPEG Layer III audio, summed frame by frame."""
+    pos = 0
+    if data[:3] == b'ID3' and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        pos = 10 + size
+
+    seconds = 0.0
+    length = len(data)
+    while pos + 4 <= length:
+        header = int.from_bytes(data[pos:pos + 4], 'big')
+        version = (header >> 19) & 0x3
+        layer = (header >> 17) & 0x3
+        bitrate_index = (header >> 12) & 0xF
+        rate_index = (header >> 10) & 0x3
+        if (header >> 21) != 0x7FF or version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+            pos += 1  # not a Layer III frame header; resync
+            continue
+        bitrate = _BITRATES[1 if version == 3 else 2][bitrate_index] * 1000
+        sample_rate = _SAMPLE_RATES[version][rate_index]
+        padding = (header >> 9) & 0x1
+        samples = 1152 if version == 3 else 576
+        frame_length = samples // 8 * bitrate // sample_rate + padding
+        seconds += samples / sample_rate
+        pos += frame_length
+    return seconds
+
+
+# -----------------------
+# Segmentation
+# -----------------------
+def chapter_heading(text):
+    """'Chapter 1: Title' when the page opens a chapter, else None."""
+    match = CHAPTER_RE.search((text or '')[:HEADING_CHARS])
+    if not match:
+        return None
+    heading = ' '.join(match.group(1).split())
+    subtitle = ' '.join(match.group(2).split())
+    # A short line after the number is the chapter's name, not body text
+    if subtitle and len(subtitle) < 60 and not subtitle.endswith(('.', ',')):
+        heading = f"{heading}: {subtitle}"
+    return heading
+
+
+def plan_segments(pages, max_words=MAX_SEGMENT_WORDS):
+    """Group ``BookPage`` objects into a list of segment dicts (title, pages, text)."""
+    segments = []
+    current = None
+    for page in pages:
+        text = page.text.strip()
+        words = len(text.split())
+        heading = chapter_heading(text)
+        if current is None or heading or (current['words'] and current['words'] + words > max_words):
+            # A long chapter is split into several segments named after it
+            title = heading or (f"{current['chapter']} (continued)" if current and current['chapter'] else None)
+            chapter = heading or (current['chapter'] if current else None)
+            current = {'title': title, 'chapter': chapter, 'page_start': page.page_number, 'texts': [], 'words': 0}
+            segments.append(current)
+        current['page_end'] = page.page_number
+        if text:
+            current['texts'].append(text)
+            current['words'] += words
+
+    planned = []
+    for segment in segments:
+        if not segment['words']:
+            continue
+        index = len(planned) + 1
+        planned.append({
+            'index': index,
+            'title': segment['title'] or f"Part {index} (pages {segment['page_start']}-{segment['page_end']})",
+            'page_start': segment['page_start'],
+            'page_end': segment['page_end'],
+            'text': '\n'.join(segment['texts']),
+        })
+    return planned
+
+
+def segment_hash(text, lang, speed, backend):
+    return hashlib.sha256(f"{backend.name}\0{backend.cache_params(lang, speed)}\0{text}".encode('utf-8')).hexdigest()
+
+
+def render_text(text, lang, speed, backend=None):
+    """Synthesize ``text`` chunk by chunk and return the concatenated MP3 bytes."""
+    backend = backend or get_backend()
+    return b''.join(backend.synthesize(chunk, lang, speed) for chunk in chunk_text(text, TTS_CHUNK_CHARS))
+
+
+# -----------------------
+# Rendering
+# -----------------------
+def render_book(book, lang='en', speed=1.0, force=False, on_progress=None, max_workers=MAX_RENDER_WORKERS):
+    """
+    Render ``book`` into ``AudioBookSegment`` rows; returns ``(rendered, skipped)``.
+
+    Synthesis runs on a thread pool; database writes stay in the calling
+    thread. ``on_progress(done, total)`` is called after every segment.
+    """
+    ingest_book(book)
+    backend = get_backend()
+    planned = plan_segments(book.pages.all().only('page_number', 'text'))
+    existing = {segment.index: segment for segment in AudioBookSegment.objects.filter(book=book)}
+
+    todo = []
+    for plan in planned:
+        plan['text_hash'] = segment_hash(plan['text'], lang, speed, backend)
+        segment = existing.get(plan['index'])
+        if (not force and segment is not None and segment.status == 'done'
+                and segment.text_hash == plan['text_hash'] and segment.audio_file):
+            continue
+        todo.append(plan)
+
+    # Segments beyond the new plan belong to an older PDF or segmentation
+    stale = AudioBookSegment.objects.filter(book=book, index__gt=len(planned))
+    for segment in stale:
+        if segment.audio_file:
+            segment.audio_file.delete(save=False)
+    stale.delete()
+
+    total = len(planned)
+    done = total - len(todo)
+    if on_progress:
+        on_progress(done, total)
+
+    errors = []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(todo) or 1))) as pool:
+        futures = {pool.submit(render_text, plan['text'], lang, speed, backend): plan for plan in todo}
+        for future in as_completed(futures):
+            plan = futures[future]
+            try:
+                audio = future.result()
+            except Exception as e:
+                logger.error(f"Failed to render segment {plan['index']} of book {book.id}: {str(e)}")
+                errors.append(f"Segment {plan['index']}: {str(e)}")
+                _save_segment(book, plan, lang, speed, error=str(e))
+            else:
+                _save_segment(book, plan, lang, speed, audio=audio)
+            done += 1
+            if on_progress:
+                on_progress(done, total)
+
+    if errors:
+        raise RuntimeError(f"{len(errors)} of {total} segments failed; rerun to resume. " + '; '.join(errors[:3]))
+    return len(todo), total - len(todo)
+
+
+def _save_segment(book, plan, lang, speed, audio=None, error=''):
+    defaults = {
+        'title': plan['title'][:200],
+        'page_start': plan['page_start'],
+        'page_end': plan['page_end'],
+        'text_hash': plan['text_hash'],
+        'voice_lang': lang,
+        'voice_speed': speed,
+        'status': 'failed' if audio is None else 'done',
+        'error': error,
+    }
+    with transaction.atomic():
+        segment, _ = AudioBookSegment.objects.select_for_update().get_or_create(
+            book=book, index=plan['index'], defaults=defaults,
+        )
+        for field, value in defaults.items():
+            setattr(segment, field, value)
+        if audio is not None:
+            if segment.audio_file:
+                segment.audio_file.delete(save=False)
+            segment.audio_file.save(f"{plan['index']:03d}.mp3", ContentFile(audio), save=False)
+            segment.duration_seconds = mp3_duration(audio)
+        segment.save()
+    return segment
+
+
+def run_render_audiobook_job(job):
+    """Job handler for ``render_audiobook``: payload ``{book_id, voice_lang, voice_speed, force}``."""
+    payload = job.payload
+    book = Book.objects.get(pk=payload['book_id'])
+    rendered, skipped = render_book(
+        book,
+        lang=payload.get('voice_lang', 'en'),
+        speed=payload.get('voice_speed', 1.0),
+        force=payload.get('force', False),
+        on_progress=lambda done, total: update_progress(job, done, total),
+    )
+    return {'book_id': book.id, 'rendered': rendered, 'skipped': skipped}
+
+
+def latest_render_job(book):
+    return BackgroundJob.objects.filter(kind='render_audiobook', payload__book_id=book.pk).order_by('-created_at').first()
+
+
+def active_render_job(book):
+    """The queued or running ``render_audiobook`` job for ``book``, or None."""
+    return (
+        BackgroundJob.objects.filter(kind='render_audiobook', payload__book_id=book.pk, status__in=['queued', 'running'])
+        .order_by('-created_at').first()
+    )
+
+
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
+
+
+def serialize_segment(segment, request=None):
+    # Served by the entitlement-checked chapter endpoint; api.file_delivery does not serve audiobooks/
+    url = reverse('audiobook-chapter-audio', args=[segment.book_id, segment.index]) if segment.audio_file else None
+    if url and request is not None:
+        url = request.build_absolute_uri(media_url(url, request.user, segment.book_id))
+    return {
+        'id': segment.index,
+        'title': segment.title,
+        'duration': format_duration(segment.duration_seconds),
+        'duration_seconds': round(segment.duration_seconds, 2),
+        'audio_url': url,
+        'page_start': segment.page_start,
+        'page_end': segment.page_end,
+    }
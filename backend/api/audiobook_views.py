@@ -1,17 +1,26 @@
 # Audio Book API Views
 from rest_framework import viewsets, status
-from rest_framework.decorators import api_view, action
+from rest_framework.decorators import api_view, action, permission_classes
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
-from django.http import HttpResponse
+from django.http import Http404, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 import os
-import tempfile
 import logging
-from .models import Book
-from .serializers import BookSerializer
+from .models import AudioBookSegment, Book
+from .serializers import BookSerializer, book_pdf_url
+from .book_text import ingest_job, is_ingested, search_pages, serialize_hit
+from . import tts_cache
+from .tts_backends import get_backend
+from .audiobook import active_render_job, format_duration, latest_render_job, serialize_segment
+from .entitlements import check_access as check_book_access, media_user
+from .file_delivery import serve_file
+from . import jobs
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -34,35 +43,17 @@ class AudioBookViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get'])
     def chapters(self, request, pk=None):
-        """Get chapters for an audio book"""
+        """Get the rendered chapters of an audio book and the rendering status"""
         book = self.get_object()
-        
-        # Sample chapters data
-        chapters = [
-            {
-                'id': 1,
-                'title': f'Chapter 1: Introduction to {book.title}',
-                'duration': '45:30',
-                'audio_url': f'/media/audiobooks/{book.id}/chapter1.mp3'
-            },
-            {
-                'id': 2,
-                'title': f'Chapter 2: Main Content',
-                'duration': '52:15',
-                'audio_url': f'/media/audiobooks/{book.id}/chapter2.mp3'
-            },
-            {
-                'id': 3,
-                'title': f'Chapter 3: Conclusion',
-                'duration': '38:20',
-                'audio_url': f'/media/audiobooks/{book.id}/chapter3.mp3'
-            }
-        ]
+        segments = list(AudioBookSegment.objects.filter(book=book, status='done'))
+        job = latest_render_job(book)
         
         return Response({
             'book_id': book.id,
             'book_title': book.title,
-            'chapters': chapters
+            'chapters': [serialize_segment(segment, request) for segment in segments],
+            'total_duration': format_duration(sum(segment.duration_seconds for segment in segments)),
+            'rendering': jobs.serialize_job(job) if job else None
         })
 
     @action(detail=True, methods=['post'])
@@ -84,6 +75,53 @@ class AudioBookViewSet(viewsets.ModelViewSet):
             'current_time': current_time
         })
 
+    @action(detail=True, methods=['get'])
+    def search(self, request, pk=None):
+        """Search inside a book's text: returns matching pages with snippets"""
+        book = self.get_object()
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response(
+                {'success': False, 'error': 'Query parameter q is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not book.pdf_file:
+            return Response(
+                {'success': False, 'error': 'Book does not have a PDF file', 'book_id': book.id},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        pending = _pending_ingest_response(request, book)
+        if pending is not None:
+            return pending
+        
+        pages = search_pages(query, book_id=book.id)
+        return Response({
+            'success': True,
+            'book_id': book.id,
+            'query': query,
+            'count': len(pages),
+            'results': [serialize_hit(page, query) for page in pages]
+        })
+
+    @action(detail=False, methods=['get'], url_path='search-inside')
+    def search_inside(self, request):
+        """Search inside all ingested books (run manage.py ingest_book_text to backfill)"""
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response(
+                {'success': False, 'error': 'Query parameter q is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        pages = search_pages(query, limit=100, active_only=True)
+        return Response({
+            'success': True,
+            'query': query,
+            'count': len(pages),
+            'results': [serialize_hit(page, query) for page in pages]
+        })
+
     @action(detail=False, methods=['get'])
     def featured(self, request):
         """Get featured audio books"""
@@ -101,6 +139,7 @@ def get_audiobook_detail(request, book_id):
     """Get detailed audio book information"""
     try:
         book = Book.objects.get(id=book_id, is_active=True)
+        segments = list(AudioBookSegment.objects.filter(book=book, status='done'))
         
         # Prepare audio book data
         audiobook_data = {
@@ -110,29 +149,10 @@ def get_audiobook_detail(request, book_id):
             'narrator': 'Professional Narrator',  # Add narrator field to Book model
             'description': book.description,
             'cover_image': book.cover_image.url if book.cover_image else None,
-            'duration': '5h 32m',  # Calculate from chapters
+            'duration': format_duration(sum(segment.duration_seconds for segment in segments)),
             'language': book.language,
             'rating': book.rating,
-            'chapters': [
-                {
-                    'id': 1,
-                    'title': f'Chapter 1: Introduction',
-                    'duration': '45:30',
-                    'audio_url': f'/media/audiobooks/{book.id}/chapter1.mp3'
-                },
-                {
-                    'id': 2,
-                    'title': f'Chapter 2: Main Content',
-                    'duration': '52:15',
-                    'audio_url': f'/media/audiobooks/{book.id}/chapter2.mp3'
-                },
-                {
-                    'id': 3,
-                    'title': f'Chapter 3: Conclusion',
-                    'duration': '38:20',
-                    'audio_url': f'/media/audiobooks/{book.id}/chapter3.mp3'
-                }
-            ]
+            'chapters': [serialize_segment(segment, request) for segment in segments]
         }
         
         return Response(audiobook_data)
@@ -369,6 +389,9 @@ def accessibility_settings(request):
         )
 
 
+MAX_STREAM_CHARS = 100000
+
+
 @api_view(['POST'])
 def text_to_speech_stream(request):
     """
@@ -376,9 +399,18 @@ def text_to_speech_stream(request):
     """
     try:
         text = request.data.get('text', '')
-        voice_speed = request.data.get('voice_speed', 1.0)
         voice_lang = request.data.get('voice_lang', 'en')
-        chunk_size = request.data.get('chunk_size', 1000)
+        try:
+            voice_speed = float(request.data.get('voice_speed', 1.0))
+            chunk_size = int(request.data.get('chunk_size', 1000))
+        except (TypeError, ValueError):
+            return Response(
+                {
+                    'success': False,
+                    'error': 'voice_speed and chunk_size must be numbers'
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         if not text:
             return Response(
@@ -389,47 +421,23 @@ def text_to_speech_stream(request):
                 },
                 status=status.HTTP_400_BAD_REQUEST
             )
+        if len(text) > MAX_STREAM_CHARS:
+            return Response(
+                {
+                    'success': False,
+                    'error': f'Text is limited to {MAX_STREAM_CHARS} characters per request'
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         # Split text into chunks for streaming
-        text_chunks = []
         words = text.split()
-        current_chunk = []
-        current_length = 0
-        
-        for word in words:
-            if current_length + len(word) > chunk_size and current_chunk:
-                text_chunks.append(' '.join(current_chunk))
-                current_chunk = [word]
-                current_length = len(word)
-            else:
-                current_chunk.append(word)
-                current_length += len(word) + 1
-        
-        if current_chunk:
-            text_chunks.append(' '.join(current_chunk))
-        
-        # Generate audio URLs for each chunk
+        text_chunks = tts_cache.chunk_text(text, max(50, chunk_size))
+        
+        # Identical chunks are served from the on-disk audio cache (see api.tts_cache)
         chunk_urls = []
         try:
-            from gtts import gTTS
-            
-            for i, chunk in enumerate(text_chunks):
-                # Create TTS for chunk
-                tts = gTTS(text=chunk, lang=voice_lang, slow=(voice_speed < 0.8))
-                
-                # Save to temporary file
-                temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=f'_chunk_{i}.mp3')
-                tts.save(temp_file.name)
-                
-                # You would typically save this to your media storage
-                # For now, we'll just return the chunk info
-                chunk_urls.append({
-                    'chunk_index': i,
-                    'text': chunk,
-                    'temp_file': temp_file.name,
-                    'estimated_duration': len(chunk.split()) / 150  # ~150 words per minute
-                })
-        
+            results = tts_cache.get_or_synthesize_many(text_chunks, voice_lang, voice_speed)
         except ImportError:
             return Response(
                 {
@@ -440,6 +448,15 @@ def text_to_speech_stream(request):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
         
+        for i, (chunk, (audio_name, cached)) in enumerate(zip(text_chunks, results)):
+            chunk_urls.append({
+                'chunk_index': i,
+                'text': chunk,
+                'audio_url': request.build_absolute_uri(default_storage.url(audio_name)),
+                'cached': cached,
+                'estimated_duration': len(chunk.split()) / 150  # ~150 words per minute
+            })
+        
         return Response({
             'success': True,
             'message': 'TTS chunks generated successfully',
@@ -464,10 +481,128 @@ def text_to_speech_stream(request):
         )
 
 
+@api_view(['GET', 'POST'])
+def text_to_speech_audio(request):
+    """
+    Stream synthesized speech as a single MP3 response.
+
+    Accepts the same parameters as ``text_to_speech_stream`` (query string
+    for GET, so the URL can be used directly as an <audio> source). Audio for
+    the first chunk is sent as soon as it is ready while the following chunks
+    are synthesized in the background.
+    """
+    params = request.data if request.method == 'POST' else request.query_params
+    text = params.get('text', '')
+    voice_lang = params.get('voice_lang', 'en')
+    try:
+        voice_speed = float(params.get('voice_speed', 1.0))
+        chunk_size = int(params.get('chunk_size', 300))
+    except (TypeError, ValueError):
+        return Response(
+            {
+                'success': False,
+                'error': 'voice_speed and chunk_size must be numbers'
+            },
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    if not text:
+        return Response(
+            {
+                'success': False,
+                'error': 'Text is required',
+                'required_fields': ['text']
+            },
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if len(text) > MAX_STREAM_CHARS:
+        return Response(
+            {
+                'success': False,
+                'error': f'Text is limited to {MAX_STREAM_CHARS} characters per request'
+            },
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    # Small first chunks keep time-to-first-audio low
+    chunks = tts_cache.chunk_text(text, max(50, chunk_size))
+    response = StreamingHttpResponse(
+        tts_cache.iter_audio(chunks, voice_lang, voice_speed),
+        content_type=get_backend().content_type,
+    )
+    response['X-TTS-Chunks'] = str(len(chunks))
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+PAGE_WINDOW = 10
+MAX_PAGE_WINDOW = 50
+
+
+def _pending_ingest_response(request, book):
+    """
+    None once ``book``'s PDF text is stored; otherwise queue its extraction
+    job and answer 202 with the job's progress (or 500 if it failed).
+    """
+    if is_ingested(book):
+        return None
+    job = ingest_job(book, request.user)
+    if job.status == 'done':
+        book.refresh_from_db()
+        return None
+    if job.status == 'failed':
+        return Response(
+            {
+                'success': False,
+                'error': f'Failed to extract text from PDF: {job.error}',
+                'book_id': book.id,
+                'job': jobs.serialize_job(job)
+            },
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+    return Response(
+        {
+            'success': True,
+            'message': 'Text extraction queued; poll this URL again',
+            'book_id': book.id,
+            'book_title': book.title,
+            'job': jobs.serialize_job(job)
+        },
+        status=status.HTTP_202_ACCEPTED
+    )
+
+
+def _parse_page_range(request):
+    """
+    Read ``?from=&to=`` as a 1-based inclusive page range.
+
+    Returns ``(None, None)`` when neither is given (whole book). A missing
+    ``to`` defaults to a window of ``PAGE_WINDOW`` pages and no range may span
+    more than ``MAX_PAGE_WINDOW`` pages.
+    """
+    raw_from = request.query_params.get('from')
+    raw_to = request.query_params.get('to')
+    if raw_from is None and raw_to is None:
+        return None, None
+    try:
+        page_from = int(raw_from) if raw_from is not None else 1
+        page_to = int(raw_to) if raw_to is not None else page_from + PAGE_WINDOW - 1
+    except (TypeError, ValueError):
+        raise ValueError('from and to must be page numbers')
+    if page_from < 1 or page_to < page_from:
+        raise ValueError('Invalid page range')
+    return page_from, min(page_to, page_from + MAX_PAGE_WINDOW - 1)
+
+
 @api_view(['GET'])
 def extract_pdf_text(request, book_id):
     """
     Extract text from PDF for display and TTS with enhanced error handling
+
+    Pass ``?from=&to=`` to fetch only a window of pages (returned under
+    ``pages``); responses carry an ETag derived from the PDF's content hash
+    and the book's last update. Until the PDF's text has been extracted by
+    a background job the answer is 202 with the job's progress.
     """
     try:
         # Get book with proper error handling
@@ -522,61 +657,82 @@ def extract_pdf_text(request, book_id):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
         
-        # Extract text from PDF with enhanced error handling
+        # Optional page window: ?from=&to= (1-based, inclusive)
         try:
-            import PyPDF2
-            
-            text_content = ""
-            page_count = 0
-            
-            with open(pdf_path, 'rb') as pdf_file:
-                pdf_reader = PyPDF2.PdfReader(pdf_file)
-                page_count = len(pdf_reader.pages)
-                
-                # Extract text from all pages with progress tracking
-                for page_num in range(page_count):
-                    try:
-                        page = pdf_reader.pages[page_num]
-                        page_text = page.extract_text()
-                        if page_text.strip():  # Only add non-empty pages
-                            text_content += f"\n--- Page {page_num + 1} ---\n"
-                            text_content += page_text + "\n\n"
-                    except Exception as page_error:
-                        # Continue with other pages if one fails
-                        text_content += f"\n--- Page {page_num + 1} (Error reading page) ---\n\n"
-                        continue
-                
-                # Clean up text content
-                text_content = text_content.strip()
-                
-                if not text_content:
-                    return Response(
-                        {
-                            'success': False,
-                            'error': 'No readable text found in PDF',
-                            'book_id': book.id,
-                            'book_title': book.title,
-                            'page_count': page_count,
-                            'text_length': 0
-                        },
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-                
-        except ImportError:
+            page_from, page_to = _parse_page_range(request)
+        except ValueError as e:
             return Response(
                 {
                     'success': False,
-                    'error': 'PyPDF2 library not installed. Please install it: pip install PyPDF2',
-                    'book_id': book.id,
-                    'book_title': book.title
+                    'error': str(e),
+                    'book_id': book.id
                 },
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Per-page text is extracted once per PDF content hash and stored (see api.book_text)
+        pending = _pending_ingest_response(request, book)
+        if pending is not None:
+            return pending
+        try:
+            ingest = book.text_ingest
+            page_count = ingest.page_count
+            if page_from is not None and page_from > max(page_count, 1):
+                return Response(
+                    {
+                        'success': False,
+                        'error': f'Page range starts after the last page ({page_count})',
+                        'book_id': book.id,
+                        'page_count': page_count
+                    },
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            # The stored text only changes with the PDF; the rest of the response with the
+            # book's metadata and, through the signed PDF link, with the reader
+            page_window = f"{page_from}-{page_to}" if page_from is not None else "all"
+            reader = request.user.pk if request.user.is_authenticated else ''
+            etag = quote_etag(
+                f"{ingest.content_hash or ingest.pdf_name}:{book.updated_at.timestamp()}:{reader}:{page_window}"
             )
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                return not_modified
+            
+            pages = book.pages.all()
+            if page_from is not None:
+                pages = pages.filter(page_number__gte=page_from, page_number__lte=page_to)
+            pages = list(pages)
+            
+            text_content = ""
+            for page in pages:
+                if page.has_error:
+                    text_content += f"\n--- Page {page.page_number} (Error reading page) ---\n\n"
+                elif page.text:
+                    text_content += f"\n--- Page {page.page_number} ---\n"
+                    text_content += page.text + "\n\n"
+            
+            # Clean up text content
+            text_content = text_content.strip()
+            
+            if not text_content and page_from is None:
+                return Response(
+                    {
+                        'success': False,
+                        'error': 'No readable text found in PDF',
+                        'book_id': book.id,
+                        'book_title': book.title,
+                        'page_count': page_count,
+                        'text_length': 0
+                    },
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+                
         except Exception as e:
             return Response(
                 {
                     'success': False,
-                    'error': f'Failed to extract text from PDF: {str(e)}',
+                    'error': f'Failed to read the extracted PDF text: {str(e)}',
                     'book_id': book.id,
                     'book_title': book.title,
                     'pdf_path': pdf_path
@@ -585,7 +741,7 @@ def extract_pdf_text(request, book_id):
             )
         
         # Return successful response with comprehensive data
-        return Response({
+        response_data = {
             'success': True,
             'book_id': book.id,
             'book_title': book.title,
@@ -595,10 +751,24 @@ def extract_pdf_text(request, book_id):
             'page_count': page_count,
             'word_count': len(text_content.split()) if text_content else 0,
             'estimated_reading_time': max(1, len(text_content.split()) // 200) if text_content else 0,  # minutes
-            'pdf_file_url': book.pdf_file.url,
+            'pdf_file_url': book_pdf_url(book, request),
             'cover_image_url': book.cover_image.url if book.cover_image else None,
             'extraction_timestamp': timezone.now().isoformat()
-        })
+        }
+        if page_from is not None:
+            response_data.update({
+                'from': page_from,
+                'to': min(page_to, page_count),
+                'has_more': page_to < page_count,
+                'next_from': page_to + 1 if page_to < page_count else None,
+                'pages': [
+                    {'page_number': page.page_number, 'text': page.text, 'has_error': page.has_error}
+                    for page in pages
+                ],
+            })
+        response = Response(response_data)
+        response['ETag'] = etag
+        return response
         
     except Exception as e:
         return Response(
@@ -611,18 +781,41 @@ def extract_pdf_text(request, book_id):
         )
 
 
+@api_view(['GET'])
+def audiobook_chapter_audio(request, book_id, index):
+    """A rendered chapter's MP3, after the entitlement check (like ``book_pdf``), with Range support"""
+    segment = AudioBookSegment.objects.filter(
+        book_id=book_id, book__is_active=True, index=index, status='done',
+    ).first()
+    if segment is None or not segment.audio_file:
+        return Response({'error': 'Chapter not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    result = check_book_access(media_user(request, book_id), [book_id])[book_id]
+    if not result['access']:
+        return Response({'error': result.get('message', 'Access denied')}, status=status.HTTP_403_FORBIDDEN)
+
+    try:
+        return serve_file(request, segment.audio_file.path)
+    except Http404:
+        return Response({'error': 'Audio file is missing'}, status=status.HTTP_404_NOT_FOUND)
+
+
 @api_view(['POST'])
+@permission_classes([IsAuthenticated])
 def generate_ai_audio(request):
     """
-    Generate AI audio from PDF text using Text-to-Speech with enhanced features
+    Queue rendering of a whole book into chapter audio segments
+
+    Staff, and users who may open the book, can start a render; while one is
+    queued or running for the book it is returned instead of a new one, and
+    only staff can force a full re-render. Poll ``audiobooks/<id>/chapters/``
+    for progress and the finished chapters.
     """
     try:
         # Extract parameters
         book_id = request.data.get('book_id')
         voice_speed = request.data.get('voice_speed', 1.0)  # 0.5 to 2.0
         voice_lang = request.data.get('voice_lang', 'en')
-        max_chars = request.data.get('max_chars', 5000)
-        page_range = request.data.get('page_range', None)  # [start, end] or None for all
         
         # Validate parameters
         if not book_id:
@@ -667,158 +860,35 @@ def generate_ai_audio(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Extract text from PDF
-        try:
-            import PyPDF2
-            
-            pdf_path = book.pdf_file.path
-            text_content = ""
-            
-            with open(pdf_path, 'rb') as pdf_file:
-                pdf_reader = PyPDF2.PdfReader(pdf_file)
-                total_pages = len(pdf_reader.pages)
-                
-                # Determine page range
-                if page_range and len(page_range) == 2:
-                    start_page = max(0, page_range[0] - 1)  # Convert to 0-based
-                    end_page = min(total_pages, page_range[1])
-                else:
-                    # Default: first 10 pages or all if less
-                    start_page = 0
-                    end_page = min(10, total_pages)
-                
-                # Extract text from specified pages
-                for page_num in range(start_page, end_page):
-                    try:
-                        page = pdf_reader.pages[page_num]
-                        page_text = page.extract_text()
-                        if page_text.strip():
-                            text_content += page_text + " "
-                    except Exception as page_error:
-                        logger.warning(f"Error reading page {page_num + 1}: {page_error}")
-                        continue
-                
-        except Exception as e:
+        is_staff = request.user.is_superuser or request.user.role in ['Admin', 'Staff']
+        if not is_staff and not check_book_access(request.user, [book.id])[book.id]['access']:
             return Response(
-                {
-                    'success': False,
-                    'error': f'Failed to extract text from PDF: {str(e)}',
-                    'book_id': book.id,
-                    'book_title': book.title
-                },
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {'success': False, 'error': 'Purchase the book to listen to it', 'book_id': book.id},
+                status=status.HTTP_403_FORBIDDEN
             )
-        
-        # Clean and limit text content
-        text_content = text_content.strip()
-        if not text_content:
-            return Response(
-                {
-                    'success': False,
-                    'error': 'No readable text found in PDF',
-                    'book_id': book.id,
-                    'book_title': book.title
-                },
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Limit text length for TTS
-        original_length = len(text_content)
-        if len(text_content) > max_chars:
-            text_content = text_content[:max_chars] + "..."
-        
-        # Generate audio using gTTS
-        try:
-            from gtts import gTTS
-            from django.core.files import File
-            
-            # Create TTS object with parameters
-            tts = gTTS(
-                text=text_content, 
-                lang=voice_lang, 
-                slow=(voice_speed < 0.8)
-            )
-            
-            # Create temporary file
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
-            tts.save(temp_file.name)
-            
-            # Generate filename
-            audio_filename = f'ai_audio_{book_id}_{timezone.now().strftime("%Y%m%d_%H%M%S")}.mp3'
-            
-            # Save to book model (if has audio_file field) or return file
-            try:
-                with open(temp_file.name, 'rb') as audio_file:
-                    # If book model has audio_file field, save it
-                    if hasattr(book, 'audio_file'):
-                        book.audio_file.save(audio_filename, File(audio_file), save=True)
-                        audio_url = book.audio_file.url
-                    else:
-                        # Return file directly
-                        audio_content = audio_file.read()
-                        response = HttpResponse(audio_content, content_type='audio/mpeg')
-                        response['Content-Disposition'] = f'attachment; filename="{audio_filename}"'
-                        return response
-                
-                # Update book metadata
-                if hasattr(book, 'has_audio'):
-                    book.has_audio = True
-                if hasattr(book, 'narrator'):
-                    book.narrator = f"AI Generated Voice ({voice_lang})"
-                book.save()
-                
-            except Exception as save_error:
-                logger.error(f"Error saving audio file: {save_error}")
-                # Return file content directly if saving fails
-                with open(temp_file.name, 'rb') as audio_file:
-                    audio_content = audio_file.read()
-                    response = HttpResponse(audio_content, content_type='audio/mpeg')
-                    response['Content-Disposition'] = f'attachment; filename="{audio_filename}"'
-                    return response
-            
-            # Clean up temp file
-            try:
-                os.unlink(temp_file.name)
-            except:
-                pass
-            
-            return Response({
-                'success': True,
-                'message': 'AI audio generated successfully',
-                'audio_url': audio_url if 'audio_url' in locals() else None,
+
+        # Whole books are rendered by a background job (see api.audiobook)
+        job = active_render_job(book)
+        if job is None:
+            job = jobs.enqueue('render_audiobook', {
                 'book_id': book.id,
-                'book_title': book.title,
-                'audio_details': {
-                    'filename': audio_filename,
-                    'language': voice_lang,
-                    'speed': voice_speed,
-                    'text_length': len(text_content),
-                    'original_text_length': original_length,
-                    'pages_processed': end_page - start_page if 'start_page' in locals() else 0,
-                    'estimated_duration_minutes': len(text_content.split()) // 150  # ~150 words per minute
-                }
-            })
-            
-        except ImportError:
-            return Response(
-                {
-                    'success': False,
-                    'error': 'gTTS library not installed',
-                    'solution': 'Install with: pip install gtts',
-                    'book_id': book.id
-                },
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
-        except Exception as e:
-            return Response(
-                {
-                    'success': False,
-                    'error': f'Failed to generate audio: {str(e)}',
-                    'book_id': book.id,
-                    'book_title': book.title
-                },
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+                'voice_lang': voice_lang,
+                'voice_speed': voice_speed,
+                'force': is_staff and bool(request.data.get('force', False)),
+            }, user=request.user, max_attempts=3)
+        
+        return Response({
+            'success': True,
+            'message': 'Audiobook rendering queued',
+            'book_id': book.id,
+            'book_title': book.title,
+            'job': jobs.serialize_job(job),
+            'chapters_url': request.build_absolute_uri(f'/api/audiobooks/{book.id}/chapters/'),
+            'voice_settings': {
+                'language': voice_lang,
+                'speed': voice_speed
+            }
+        }, status=status.HTTP_202_ACCEPTED)
         
     except Exception as e:
         logger.error(f"Unexpected error in generate_ai_audio: {str(e)}")
@@ -0,0 +1,254 @@
+"""
+Per-page text extraction and in-book search for book PDFs.
+
+``ingest_book`` parses a book's PDF once with PyPDF2 and stores each page as
+a ``BookPage`` row. Requests don't parse inline: ``ingest_job`` queues the
+``ingest_book_text`` background job and the views answer 202 until it is done. Pages are searchable through the database's inverted
+index (FTS5 on SQLite, a GIN ``tsvector`` index on PostgreSQL) using the same
+tokenizer as the catalog search in api.search_index.
+"""
+import hashlib
+import logging
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .jobs import enqueue
+from .models import BackgroundJob, Book, BookPage, BookTextIngest
+from .search_index import (
+    fts5_prefix_query,
+    fts5_table_exists,
+    pg_prefix_tsquery,
+    tokenize,
+    MAX_QUERY_TERMS,
+)
+
+logger = logging.getLogger(__name__)
+
+PAGE_FTS_TABLE = 'api_bookpage_fts'
+SNIPPET_WORDS = 30
+_WORD_RE = re.compile(r'\w+(?:[\'’ʼ]\w+)*')
+
+
+def extract_pages(pdf_path):
+    """Return a list of ``(text, has_error)`` tuples, one per PDF page."""
+    import PyPDF2
+
+    pages = []
+    with open(pdf_path, 'rb') as pdf_file:
+        pdf_reader = PyPDF2.PdfReader(pdf_file)
+        for page_num in range(len(pdf_reader.pages)):
+            try:
+                pages.append(((pdf_reader.pages[page_num].extract_text() or '').strip(), False))
+            except Exception as page_error:
+                logger.warning(f"Error reading page {page_num + 1} of {pdf_path}: {page_error}")
+                pages.append(('', True))
+    return pages
+
+
+def is_ingested(book):
+    """True when the stored pages belong to the book's current PDF."""
+    try:
+        ingest = book.text_ingest
+    except BookTextIngest.DoesNotExist:
+        return False
+    return ingest.status == 'done' and ingest.pdf_name == book.pdf_file.name
+
+
+def file_sha256(path):
+    """Stream a file through SHA-256 without loading it into memory."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _copy_pages(source_book_id):
+    """Page tuples from another book whose PDF has the same content hash."""
+    return [
+        (page.text, page.has_error)
+        for page in BookPage.objects.filter(book_id=source_book_id).only('text', 'has_error').order_by('page_number')
+    ]
+
+
+def ingest_book(book, force=False):
+    """
+    Extract and store per-page text for ``book``.
+
+    Extraction results are keyed by the PDF's content hash: a PDF already
+    ingested for another book (or re-uploaded under a new name) is copied
+    from the stored pages instead of being parsed again.
+
+    Returns the ``BookTextIngest`` record; a failed extraction is recorded
+    with ``status='failed'`` and the exception is re-raised.
+    """
+    if not force and is_ingested(book):
+        return book.text_ingest
+
+    try:
+        content_hash = file_sha256(book.pdf_file.path)
+        source = None
+        if not force:
+            source = BookTextIngest.objects.filter(content_hash=content_hash, status='done').first()
+        if source is not None:
+            pages = _copy_pages(source.book_id)
+        else:
+            pages = extract_pages(book.pdf_file.path)
+    except Exception as e:
+        BookTextIngest.objects.update_or_create(
+            book=book,
+            defaults={'pdf_name': book.pdf_file.name, 'page_count': 0, 'status': 'failed', 'error': str(e)},
+        )
+        raise
+
+    with transaction.atomic():
+        if source is None or source.book_id != book.pk:
+            BookPage.objects.filter(book=book).delete()
+            BookPage.objects.bulk_create([
+                BookPage(
+                    book=book,
+                    page_number=number,
+                    text=text,
+                    search_text=' '.join(tokenize(text)),
+                    has_error=has_error,
+                )
+                for number, (text, has_error) in enumerate(pages, start=1)
+            ])
+        ingest, _ = BookTextIngest.objects.update_or_create(
+            book=book,
+            defaults={
+                'pdf_name': book.pdf_file.name,
+                'content_hash': content_hash,
+                'page_count': len(pages),
+                'status': 'done',
+                'error': '',
+            },
+        )
+    book.text_ingest = ingest
+    return ingest
+
+
+def _jobs(book):
+    return BackgroundJob.objects.filter(kind='ingest_book_text', payload__book_id=book.pk,
+                                        payload__pdf_name=book.pdf_file.name)
+
+
+def ingest_job(book, user=None):
+    """
+    The ``ingest_book_text`` job for ``book``'s current PDF: the queued or
+    running one, else the last failed one, else a newly queued one.
+    """
+    job = _jobs(book).order_by('-created_at').first()
+    if job is None or job.status == 'done':  # done, yet the pages were discarded since
+        job = enqueue('ingest_book_text', {'book_id': book.pk, 'pdf_name': book.pdf_file.name}, user=user, max_attempts=3)
+        job.refresh_from_db()  # eager mode may have run it already
+    return job
+
+
+def run_ingest_book_text_job(job):
+    """Job handler (kind ``ingest_book_text``): payload ``{"book_id": <id>, "pdf_name": <file name>}``."""
+    book = Book.objects.get(pk=job.payload['book_id'])
+    ingest = ingest_book(book)
+    return {'book_id': book.pk, 'page_count': ingest.page_count}
+
+
+def discard_pages(book_id):
+    """Forget extracted pages, e.g. after the book's PDF was replaced."""
+    BookPage.objects.filter(book_id=book_id).delete()
+    BookTextIngest.objects.filter(book_id=book_id).delete()
+
+
+def search_pages(query, book_id=None, limit=50, active_only=False):
+    """
+    Return ``BookPage`` objects matching ``query`` ordered by relevance.
+
+    ``book_id`` and ``active_only`` (pages of active books only) are applied
+    in the query, before ``limit``.
+    """
+    terms = tokenize(query)[:MAX_QUERY_TERMS]
+    if not terms:
+        return []
+
+    book_filter = ''
+    book_params = []
+    if book_id is not None:
+        book_filter += 'AND p.book_id = %s '
+        book_params.append(book_id)
+    if active_only:
+        book_filter += 'AND p.book_id IN (SELECT id FROM api_book WHERE is_active = %s) '
+        book_params.append(True)
+
+    if connection.vendor == 'postgresql':
+        tsquery = pg_prefix_tsquery(terms)
+        sql = (
+            "SELECT p.id FROM api_bookpage p "
+            "WHERE to_tsvector('simple', p.search_text) @@ to_tsquery('simple', %s) " + book_filter +
+            "ORDER BY ts_rank(to_tsvector('simple', p.search_text), to_tsquery('simple', %s)) DESC, "
+            "p.book_id, p.page_number LIMIT %s"
+        )
+        params = [tsquery, *book_params, tsquery, limit]
+    elif fts5_table_exists(PAGE_FTS_TABLE):
+        sql = (
+            f"SELECT p.id FROM {PAGE_FTS_TABLE} f JOIN api_bookpage p ON p.id = f.rowid "
+            f"WHERE {PAGE_FTS_TABLE} MATCH %s " + book_filter +
+            f"ORDER BY bm25({PAGE_FTS_TABLE}), p.book_id, p.page_number LIMIT %s"
+        )
+        params = [fts5_prefix_query(terms), *book_params, limit]
+    else:
+        pages = BookPage.objects.all()
+        if book_id is not None:
+            pages = pages.filter(book_id=book_id)
+        if active_only:
+            pages = pages.filter(book__is_active=True)
+        for term in terms:
+            pages = pages.filter(Q(search_text__contains=term))
+        return list(pages.select_related('book')[:limit])
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        ids = [row[0] for row in cursor.fetchall()]
+    by_id = BookPage.objects.select_related('book').in_bulk(ids)
+    return [by_id[page_id] for page_id in ids if page_id in by_id]
+
+
+def make_snippet(text, query, words=SNIPPET_WORDS):
+    """Return a window of ``text`` around the first query hit with hits wrapped in <mark>."""
+    terms = tokenize(query)[:MAX_QUERY_TERMS]
+    if not text or not terms:
+        return ''
+    matches = list(_WORD_RE.finditer(text))
+
+    def is_hit(word):
+        normalized = ''.join(tokenize(word))
+        return any(normalized == term for term in terms[:-1]) or normalized.startswith(terms[-1])
+
+    hits = [i for i, m in enumerate(matches) if is_hit(m.group())]
+    start = max(0, hits[0] - words // 3) if hits else 0
+    window = matches[start:start + words]
+    if not window:
+        return ''
+
+    # Slice the original text so punctuation survives, marking hits in place
+    parts = []
+    cursor = window[0].start()
+    for m in window:
+        parts.append(text[cursor:m.start()])
+        parts.append(f"<mark>{m.group()}</mark>" if is_hit(m.group()) else m.group())
+        cursor = m.end()
+    snippet = ' '.join(''.join(parts).split())
+    if start > 0:
+        snippet = '… ' + snippet
+    if start + words < len(matches):
+        snippet += ' …'
+    return snippet
+
+
+def serialize_hit(page, query):
+    return {
+        'book_id': page.book_id,
+        'book_title': page.book.title,
+        'page_number': page.page_number,
+        'snippet': make_snippet(page.text, query),
+    }
@@ -0,0 +1,61 @@
+"""
+Django cache backends that count hits and misses in api.metrics.
+
+Drop-in replacements for the built-in backends of the same name
+(``CACHES['default']['BACKEND'] = 'api.cache_backends.LocMemCache'``).
+Only lookups are counted: each key of a ``get``/``get_many`` is one hit or
+miss, including the lookup ``get_or_set`` does first.
+"""
+import threading
+
+from django.core.cache.backends.db import DatabaseCache as BaseDatabaseCache
+from django.core.cache.backends.filebased import FileBasedCache as BaseFileBasedCache
+from django.core.cache.backends.locmem import LocMemCache as BaseLocMemCache
+
+from . import metrics
+
+_MISSING = object()
+# The built-in backends implement get via get_many or the other way round;
+# only the outermost call is counted
+_state = threading.local()
+
+
+class CacheMetricsMixin:
+
+    def get(self, key, default=None, version=None):
+        if getattr(_state, 'active', False):
+            return super().get(key, default, version)
+        _state.active = True
+        try:
+            value = super().get(key, _MISSING, version)
+        finally:
+            _state.active = False
+        metrics.inc('cache_requests', result='miss' if value is _MISSING else 'hit')
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None):
+        if getattr(_state, 'active', False):
+            return super().get_many(keys, version)
+        keys = list(keys)
+        _state.active = True
+        try:
+            found = super().get_many(keys, version)
+        finally:
+            _state.active = False
+        if found:
+            metrics.inc('cache_requests', len(found), result='hit')
+        if len(keys) > len(found):
+            metrics.inc('cache_requests', len(keys) - len(found), result='miss')
+        return found
+
+
+class LocMemCache(CacheMetricsMixin, BaseLocMemCache):
+    pass
+
+
+class DatabaseCache(CacheMetricsMixin, BaseDatabaseCache):
+    pass
+
+
+class FileBasedCache(CacheMetricsMixin, BaseFileBasedCache):
+    pass
@@ -1,19 +1,33 @@
 """
 Chapa Payment Service Integration
 Handles all Chapa payment operations for the book marketplace
+
+All gateway calls go through one pooled ``GatewayClient`` (api.http_client):
+keep-alive connections, a timeout per operation (``CHAPA_TIMEOUTS``),
+retries with backoff for idempotent calls and a circuit breaker.
 """
 import hashlib
 import hmac
 import json
-import requests
 from datetime import datetime
 from decimal import Decimal
 from django.conf import settings
 from django.core.cache import cache
 import logging
 
+from . import exchange_rates
+from .http_client import GatewayClient
+
 logger = logging.getLogger(__name__)
 
+# (connect, read) seconds per operation; override entries with settings.CHAPA_TIMEOUTS
+DEFAULT_TIMEOUTS = {
+    'create_checkout': (3.05, 15),
+    'verify_transaction': (3.05, 10),
+    'process_refund': (3.05, 15),
+    'get_transaction_report': (3.05, 30),
+}
+
 class ChapaService:
     """
     Chapa Payment Service for handling all payment operations
@@ -26,7 +40,16 @@ class ChapaService:
         self.public_key = getattr(settings, 'CHAPA_PUBLIC_KEY', 'CHAPUBK_TEST-v3JKhynQP4agIXoPDws1V5MNDSzfih9l')
         self.secret_key = getattr(settings, 'CHAPA_SECRET_KEY', 'CHASECK_TEST-Usww6shqQXig4c3yMe9H9VKN50iIhYMc')
         self.encryption_key = getattr(settings, 'CHAPA_ENCRYPTION_KEY', 's3c68Acs3dX1j6IGyROcqMvo')
-        
+        self.client = GatewayClient(
+            self.base_url,
+            headers=self._get_headers(),
+            timeouts={**DEFAULT_TIMEOUTS, **getattr(settings, 'CHAPA_TIMEOUTS', {})},
+            max_retries=getattr(settings, 'CHAPA_MAX_RETRIES', 2),
+            backoff=getattr(settings, 'CHAPA_RETRY_BACKOFF', 0.5),
+            breaker_threshold=getattr(settings, 'CHAPA_BREAKER_THRESHOLD', 5),
+            breaker_cooldown=getattr(settings, 'CHAPA_BREAKER_COOLDOWN', 30),
+        )
+
     def _get_headers(self):
         """Get headers for Chapa API requests"""
         return {
@@ -107,8 +130,7 @@ class ChapaService:
             }
             
             # Make request to Chapa API
-            url = f"{self.base_url}/checkout"
-            response = requests.post(url, json=checkout_data, headers=self._get_headers())
+            response = self.client.post('create_checkout', '/checkout', json=checkout_data)
             
             if response.status_code == 200:
                 data = response.json()
@@ -186,8 +208,7 @@ class ChapaService:
                 return test_verification
             
             # Production mode - make actual verification API call
-            url = f"{self.base_url}/transaction/verify/{tx_ref}"
-            response = requests.get(url, headers=self._get_headers())
+            response = self.client.get('verify_transaction', f'/transaction/verify/{tx_ref}')
             
             if response.status_code == 200:
                 data = response.json()
@@ -342,39 +363,13 @@ class ChapaService:
             
         Returns:
             float: Conversion rate
+
+        Raises:
+            ValueError: No rate is known for one of the currencies
         """
-        try:
-            # Cache rates for 1 hour
-            cache_key = f"chapa_rates_{from_currency}_{to_currency}"
-            cached_rate = cache.get(cache_key)
-            
-            if cached_rate:
-                return cached_rate
-            
-            # Make API call to get current rates
-            url = f"{self.base_url}/exchange-rate"
-            response = requests.get(url, params={
-                'from': from_currency,
-                'to': to_currency
-            }, headers=self._get_headers())
-            
-            if response.status_code == 200:
-                data = response.json()
-                rate = float(data.get('rate', 55.0))  # Default fallback rate
-                cache.set(cache_key, rate, 3600)  # Cache for 1 hour
-                return rate
-            else:
-                # Return default rate based on common conversions
-                default_rates = {
-                    ('USD', 'ETB'): 55.0,
-                    ('ETB', 'USD'): 0.018,
-                }
-                return default_rates.get((from_currency, to_currency), 55.0)
-                
-        except Exception as e:
-            logger.error(f"Failed to get conversion rate: {str(e)}")
-            return 55.0  # Default ETB to USD rate
-    
+        # One cached, background-refreshed rate source for all payment paths
+        return float(exchange_rates.get_rate(from_currency, to_currency))
+
     def get_ethiopian_payment_methods(self):
         """
         Get Ethiopian-specific payment methods for testing
@@ -555,8 +550,7 @@ class ChapaService:
             if amount:
                 refund_data['amount'] = f"{amount:.2f}"
             
-            url = f"{self.base_url}/refund"
-            response = requests.post(url, json=refund_data, headers=self._get_headers())
+            response = self.client.post('process_refund', '/refund', json=refund_data)
             
             if response.status_code == 200:
                 data = response.json()
@@ -602,8 +596,7 @@ class ChapaService:
             if end_date:
                 params['end_date'] = end_date
                 
-            url = f"{self.base_url}/transaction/report"
-            response = requests.get(url, params=params, headers=self._get_headers())
+            response = self.client.get('get_transaction_report', '/transaction/report', params=params)
             
             if response.status_code == 200:
                 data = response.json()
@@ -0,0 +1,149 @@
+"""
+Write-behind counters for hot read paths (book views/downloads, project
+views, exam enrolments).
+
+``increment`` only adds to an in-process buffer; a daemon thread flushes the
+buffer every ``COUNTER_FLUSH_INTERVAL`` seconds (default 5) as one
+``UPDATE ... SET field = field + n`` per (model, field, n) group, so
+concurrent requests never lose increments, reads take no row locks and
+``updated_at`` is left alone. The buffer is also flushed when it holds more
+than ``COUNTER_FLUSH_MAX_KEYS`` entries and when the process exits.
+
+``flush()`` writes pending increments immediately (tests, management
+commands). Setting ``COUNTER_FLUSH_INTERVAL = 0`` writes every increment
+straight through.
+
+Each flush sends ``counters_flushed`` per (model, field) with the total that
+was added, for code that mirrors the counters (api.stats).
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.dispatch import Signal
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 5
+DEFAULT_MAX_KEYS = 1000
+
+# sender=model, field=<name>, total=<sum of increments flushed>
+counters_flushed = Signal()
+
+_lock = threading.Lock()
+_pending = defaultdict(int)  # (model, pk, field) -> delta
+_generation = 0  # bumped by every flush
+_flusher = None
+_pid = None
+
+
+def flush_interval():
+    return getattr(settings, 'COUNTER_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+
+
+def increment(instance, field, amount=1):
+    """
+    Count ``amount`` more ``field`` on ``instance`` and return the new value.
+
+    The row is updated by the next flush. ``instance`` is updated in memory
+    right away to its loaded value plus this process's unflushed increments,
+    so responses show the current count.
+    """
+    key = (type(instance), instance.pk, field)
+    with _lock:
+        _ensure_flusher()
+        _pending[key] += amount
+        pending = _pending[key]
+        generation = _generation
+        overflow = len(_pending) > getattr(settings, 'COUNTER_FLUSH_MAX_KEYS', DEFAULT_MAX_KEYS)
+
+    # Remember which unflushed increments the in-memory value already includes,
+    # so repeated calls on one instance don't count them twice
+    included = instance.__dict__.setdefault('_pending_counts', {})
+    seen_generation, seen = included.get(field, (generation, 0))
+    value = (getattr(instance, field) or 0) + pending - (seen if seen_generation == generation else 0)
+    included[field] = (generation, pending)
+    setattr(instance, field, value)
+    if overflow or flush_interval() <= 0:
+        flush()
+    return value
+
+
+def pending(instance, field):
+    """Increments of ``instance.field`` buffered in this process."""
+    with _lock:
+        return _pending.get((type(instance), instance.pk, field), 0)
+
+
+def flush():
+    """Write all buffered increments; returns the number of UPDATE statements run."""
+    global _pending, _generation
+    with _lock:
+        batch, _pending = _pending, defaultdict(int)
+        _generation += 1
+    if not batch:
+        return 0
+
+    # One UPDATE per (model, field, delta): pk__in covers every row with that delta
+    groups = defaultdict(list)
+    for (model, pk, field), delta in batch.items():
+        groups[(model, field, delta)].append(pk)
+
+    statements = 0
+    totals = defaultdict(int)
+    for (model, field, delta), pks in groups.items():
+        try:
+            with transaction.atomic():
+                model._default_manager.filter(pk__in=pks).update(**{field: F(field) + delta})
+        except Exception as e:
+            logger.error(f"Failed to flush {model.__name__}.{field} counters: {str(e)}")
+            with _lock:
+                for pk in pks:
+                    _pending[(model, pk, field)] += delta
+            continue
+        statements += 1
+        totals[(model, field)] += delta * len(pks)
+
+    for (model, field), total in totals.items():
+        counters_flushed.send(sender=model, field=field, total=total)
+    return statements
+
+
+def _ensure_flusher():
+    """Start the flush thread on first use in this process (called with ``_lock`` held)."""
+    global _flusher, _pid
+    if _pid == os.getpid() and _flusher is not None:
+        return
+    if _pid is not None and _pid != os.getpid():
+        # Forked after the parent started counting; its increments are the parent's to flush
+        _pending.clear()
+    _pid = os.getpid()
+    if flush_interval() > 0:
+        _flusher = threading.Thread(target=_flush_loop, name='counter-flush', daemon=True)
+        _flusher.start()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(flush_interval() if flush_interval() > 0 else DEFAULT_FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception as e:
+            logger.error(f"Counter flush failed: {str(e)}")
+        finally:
+            close_old_connections()
+
+
+@atexit.register
+def _flush_at_exit():
+    if _pid == os.getpid():
+        try:
+            flush()
+        except Exception as e:
+            logger.error(f"Counter flush at exit failed: {str(e)}")
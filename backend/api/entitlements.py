@@ -0,0 +1,146 @@
+"""
+Per-user book entitlements (which books a user may open).
+
+A user's entitlements are loaded with one query (permanent purchases and
+unexpired rentals) and cached as ``{book_id: (purchase_type, purchase_id,
+expires_at)}``. The cache entry is dropped whenever one of the user's
+purchases is saved or deleted (api.signals) and never outlives the earliest
+rental expiry it contains, so an expired rental stops granting access on
+time.
+
+``check_access`` answers for any number of books with at most one query for
+the books themselves plus one for the entitlements on a cache miss.
+
+Book files are served by endpoints that run ``check_access`` (the PDF,
+audiobook chapters). Readers open them in iframes, ``<audio>`` elements and
+new tabs, which send no ``Authorization`` header, so their URLs carry a
+``?token=`` signed for the user and book by ``media_token``, valid for
+``BOOK_MEDIA_TOKEN_MAX_AGE`` seconds (default one day); ``media_user``
+resolves it back to the user.
+"""
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Book, User, UserPurchase
+
+DEFAULT_TTL = 300
+MAX_BATCH = 200
+MEDIA_TOKEN_SALT = 'api.entitlements.media'
+DEFAULT_MEDIA_TOKEN_MAX_AGE = 24 * 3600
+
+
+def _cache_key(user_id):
+    return f'entitlements:{user_id}'
+
+
+def load_entitlements(user_id):
+    """``{book_id: (purchase_type, purchase_id, expires_at)}`` for the user's live purchases (one query)."""
+    now = timezone.now()
+    rows = UserPurchase.objects.filter(user_id=user_id).filter(
+        Q(expires_at__isnull=True) | Q(expires_at__gte=now)
+    ).order_by('id').values_list('book_id', 'purchase_type', 'id', 'expires_at')
+
+    entitlements = {}
+    for book_id, purchase_type, purchase_id, expires_at in rows:
+        current = entitlements.get(book_id)
+        # A permanent purchase wins over a rental
+        if current is None or (current[2] is not None and expires_at is None):
+            entitlements[book_id] = (purchase_type, purchase_id, expires_at)
+    return entitlements
+
+
+def get_entitlements(user_id):
+    """The user's entitlements, from the cache when possible."""
+    key = _cache_key(user_id)
+    entitlements = cache.get(key)
+    if entitlements is None:
+        entitlements = load_entitlements(user_id)
+        timeout = getattr(settings, 'ENTITLEMENT_CACHE_TTL', DEFAULT_TTL)
+        expiries = [expires_at for _, _, expires_at in entitlements.values() if expires_at is not None]
+        if expiries:
+            until_expiry = (min(expiries) - timezone.now()).total_seconds()
+            timeout = max(1, min(timeout, int(until_expiry) + 1))
+        cache.set(key, entitlements, timeout)
+    return entitlements
+
+
+def invalidate(user_id):
+    if user_id is not None:
+        cache.delete(_cache_key(user_id))
+
+
+def check_access(user, book_ids):
+    """
+    Access decision for each of ``book_ids``.
+
+    Returns ``{book_id: result}`` where ``result`` matches the single-book
+    check_access response (``access`` plus ``reason``, purchase details or a
+    ``message``).
+    """
+    books = dict(Book.objects.filter(id__in=book_ids).values_list('id', 'is_free'))
+    entitlements = get_entitlements(user.pk) if user.is_authenticated and books else {}
+    now = timezone.now()
+
+    results = {}
+    for book_id in book_ids:
+        if book_id not in books:
+            results[book_id] = {'access': False, 'message': 'Book not found'}
+        elif books[book_id]:
+            # Free books are always accessible
+            results[book_id] = {'access': True, 'reason': 'free_book'}
+        elif book_id in entitlements and (entitlements[book_id][2] is None or entitlements[book_id][2] >= now):
+            purchase_type, purchase_id, expires_at = entitlements[book_id]
+            results[book_id] = {
+                'access': True,
+                'purchase_type': purchase_type,
+                'purchase_id': purchase_id,
+                'expires_at': expires_at,
+            }
+        else:
+            results[book_id] = {'access': False, 'message': 'No purchase found'}
+    return results
+
+
+def media_token(user, book_id):
+    """A signed ``?token=`` value letting ``user`` open ``book_id``'s files without an auth header."""
+    return signing.dumps([user.pk, book_id], salt=MEDIA_TOKEN_SALT)
+
+
+def media_url(url, user, book_id):
+    """``url`` with a ``media_token`` for authenticated ``user``, unchanged otherwise."""
+    if user is None or not user.is_authenticated:
+        return url
+    return f"{url}{'&' if '?' in url else '?'}token={media_token(user, book_id)}"
+
+
+def media_user(request, book_id):
+    """The request's user or, for anonymous requests, the user a valid ``?token=`` for ``book_id`` was signed for."""
+    token = request.GET.get('token')
+    if request.user.is_authenticated or not token:
+        return request.user
+    try:
+        user_id, token_book_id = signing.loads(
+            token, salt=MEDIA_TOKEN_SALT,
+            max_age=getattr(settings, 'BOOK_MEDIA_TOKEN_MAX_AGE', DEFAULT_MEDIA_TOKEN_MAX_AGE),
+        )
+    except (signing.BadSignature, TypeError, ValueError):  # includes SignatureExpired
+        return request.user
+    if token_book_id != book_id:
+        return request.user
+    return User.objects.filter(pk=user_id, is_active=True).first() or request.user
+
+
+def parse_book_ids(value):
+    """Book ids from a list or a comma-separated string; ValueError if malformed or too many."""
+    if isinstance(value, str):
+        value = [part for part in value.split(',') if part.strip()]
+    try:
+        book_ids = list(dict.fromkeys(int(book_id) for book_id in value or []))
+    except (TypeError, ValueError):
+        raise ValueError('book_ids must be a list of integers')
+    if len(book_ids) > MAX_BATCH:
+        raise ValueError(f'At most {MAX_BATCH} book_ids per request')
+    return book_ids
@@ -0,0 +1,151 @@
+"""
+Currency exchange rates for every payment path.
+
+Book prices are in USD and charged in ETB. ``get_rate`` and ``convert``
+serve rates from the shared cache:
+
+* a fresh entry (younger than ``EXCHANGE_RATE_TTL``, default 1 hour) is
+  returned as-is;
+* a stale entry is still returned immediately while one background thread
+  (per cache, guarded by ``cache.add``) fetches new rates, so no payment
+  request waits on the upstream API, and an upstream outage keeps serving
+  the last known rates for up to ``EXCHANGE_RATE_MAX_AGE``;
+* with no usable entry the rates are fetched inline, falling back to
+  ``EXCHANGE_RATE_STATIC_RATES`` if the provider fails.
+
+The provider is pluggable (``EXCHANGE_RATE_PROVIDER``, a dotted path);
+``StaticProvider`` serves the configured table and is used in tests.
+"""
+import logging
+import threading
+import time
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.utils.module_loading import import_string
+
+from .http_client import GatewayClient
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROVIDER = 'api.exchange_rates.ExchangeRateAPIProvider'
+BASE_CURRENCY = 'USD'
+DEFAULT_TTL = 3600
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+DEFAULT_STATIC_RATES = {'USD': 1.0, 'ETB': 55.0}
+REFRESH_LOCK_TIMEOUT = 60
+CACHE_KEY = f'exchange_rates:{BASE_CURRENCY}'
+
+
+class RateProvider:
+    """Base class: ``fetch`` returns ``{currency: units per 1 BASE_CURRENCY}``."""
+    name = 'base'
+
+    def fetch(self):
+        raise NotImplementedError
+
+
+class ExchangeRateAPIProvider(RateProvider):
+    """exchangerate-api.com (no key needed for the v4 endpoint)."""
+    name = 'exchangerate-api'
+
+    def __init__(self):
+        self.client = GatewayClient(
+            getattr(settings, 'EXCHANGE_RATE_API_URL', 'https://api.exchangerate-api.com/v4'),
+            timeouts={'latest': (3.05, 5)},
+            max_retries=1,
+        )
+
+    def fetch(self):
+        response = self.client.get('latest', f'/latest/{BASE_CURRENCY}')
+        response.raise_for_status()
+        rates = response.json().get('rates') or {}
+        if not rates:
+            raise ValueError('Provider returned no rates')
+        return {currency: float(rate) for currency, rate in rates.items()}
+
+
+class StaticProvider(RateProvider):
+    """The fixed ``EXCHANGE_RATE_STATIC_RATES`` table (offline development and tests)."""
+    name = 'static'
+
+    def fetch(self):
+        return dict(getattr(settings, 'EXCHANGE_RATE_STATIC_RATES', DEFAULT_STATIC_RATES))
+
+
+_provider = None
+
+
+def get_provider():
+    global _provider
+    path = getattr(settings, 'EXCHANGE_RATE_PROVIDER', DEFAULT_PROVIDER)
+    if _provider is None or _provider[0] != path:
+        _provider = (path, import_string(path)())
+    return _provider[1]
+
+
+def refresh():
+    """Fetch rates from the provider and store them; returns the new cache entry."""
+    provider = get_provider()
+    entry = {'rates': provider.fetch(), 'fetched_at': time.time(), 'source': provider.name}
+    cache.set(CACHE_KEY, entry, getattr(settings, 'EXCHANGE_RATE_MAX_AGE', DEFAULT_MAX_AGE))
+    return entry
+
+
+def _refresh_in_background():
+    try:
+        refresh()
+        cache.delete(f'{CACHE_KEY}:refreshing')
+    except Exception as e:
+        # The lock stays until it expires: at most one upstream attempt per REFRESH_LOCK_TIMEOUT
+        logger.warning(f"Exchange rate refresh failed, serving stale rates: {str(e)}")
+    finally:
+        close_old_connections()
+
+
+def schedule_refresh():
+    """Start a background refresh unless one is already running; returns the thread or None."""
+    if not cache.add(f'{CACHE_KEY}:refreshing', True, REFRESH_LOCK_TIMEOUT):
+        return None
+    thread = threading.Thread(target=_refresh_in_background, name='exchange-rate-refresh', daemon=True)
+    thread.start()
+    return thread
+
+
+def get_rates():
+    """The current rate entry (``rates``, ``fetched_at``, ``source``), stale-while-revalidate."""
+    entry = cache.get(CACHE_KEY)
+    if entry is not None:
+        if time.time() - entry['fetched_at'] > getattr(settings, 'EXCHANGE_RATE_TTL', DEFAULT_TTL):
+            schedule_refresh()
+        return entry
+    try:
+        return refresh()
+    except Exception as e:
+        logger.error(f"Exchange rate fetch failed, using static rates: {str(e)}")
+        # Stored as already stale, so callers get it at once while a background refresh retries
+        entry = {'rates': StaticProvider().fetch(), 'fetched_at': 0, 'source': 'fallback'}
+        cache.set(CACHE_KEY, entry, REFRESH_LOCK_TIMEOUT)
+        return entry
+
+
+def get_rate(from_currency, to_currency):
+    """Units of ``to_currency`` per 1 ``from_currency``, as a Decimal."""
+    from_currency, to_currency = from_currency.upper(), to_currency.upper()
+    if from_currency == to_currency:
+        return Decimal(1)
+    rates = get_rates()['rates']
+    try:
+        rate = Decimal(str(rates[to_currency])) / Decimal(str(rates[from_currency]))
+    except KeyError as e:
+        raise ValueError(f"No exchange rate for {e.args[0]}")
+    return rate.quantize(Decimal('0.000001'), rounding=ROUND_HALF_UP)
+
+
+def convert(amount, from_currency, to_currency):
+    """``(converted amount rounded to cents, rate)``."""
+    rate = get_rate(from_currency, to_currency)
+    converted = (Decimal(str(amount)) * rate).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    return converted, rate
@@ -0,0 +1,181 @@
+"""
+File delivery with HTTP Range and conditional request support.
+
+``serve_file`` answers a GET/HEAD for a file on disk:
+
+* ``If-None-Match`` / ``If-Modified-Since`` (and ``If-Match`` /
+  ``If-Unmodified-Since``) are evaluated against an ETag built from the
+  file's size and mtime, giving 304/412 without opening the file;
+* a single ``Range: bytes=...`` is answered with 206 and only those bytes
+  (``If-Range`` is honoured); unsatisfiable ranges get 416, and multi-range
+  requests fall back to the whole file as RFC 9110 allows;
+* with ``FILE_DELIVERY_BACKEND`` set to ``'x-accel-redirect'`` (nginx) or
+  ``'x-sendfile'`` (Apache/lighttpd), Django only decides *whether* the file
+  may be served and the front proxy streams the bytes, including ranges.
+
+Whole files in ``'django'`` mode go through ``FileResponse``, which lets the
+WSGI server use ``sendfile()`` where it supports it.
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_safe
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe, quote_etag
+
+from . import ocr, profiling, question_import, thumbnails
+
+CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+BACKENDS = ('django', 'x-accel-redirect', 'x-sendfile')
+
+# MEDIA_ROOT directories serve_media never serves
+PRIVATE_ROOTS = (
+    'books/pdfs',  # book PDFs: GET /api/books/<id>/pdf/, after the entitlement check
+    'uploads',  # UploadedPDF documents, visible to their owner only
+    'audiobooks',  # rendered chapters: GET /api/audiobooks/<id>/chapters/<n>/audio/, after the entitlement check
+    profiling.ROOT,  # request profiles: downloaded through the admin API
+    question_import.UPLOAD_DIR,  # exam papers queued for import
+    ocr.CACHE_ROOT,
+)
+
+
+def get_backend():
+    backend = getattr(settings, 'FILE_DELIVERY_BACKEND', 'django')
+    if backend not in BACKENDS:
+        raise ValueError(f"FILE_DELIVERY_BACKEND must be one of {', '.join(BACKENDS)}")
+    return backend
+
+
+def file_etag(stat):
+    return quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+
+
+def parse_range(header, size):
+    """
+    ``(start, end)`` (inclusive) for a single-range ``Range`` header, ``None``
+    to serve the whole file, or ``False`` if the range is unsatisfiable.
+    """
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        return None  # malformed or multi-range: ignore the header
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        return False
+    return start, end
+
+
+def if_range_matches(request, etag, last_modified):
+    """An ``If-Range`` validator that no longer matches means: send the whole (changed) file."""
+    value = request.META.get('HTTP_IF_RANGE')
+    if not value:
+        return True
+    if value.startswith(('"', 'W/')):
+        return value == etag  # strong comparison
+    return parse_http_date_safe(value) == last_modified
+
+
+def _read_range(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _offload(response, path):
+    backend = get_backend()
+    if backend == 'x-sendfile':
+        response['X-Sendfile'] = path
+    else:
+        relative = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+        if relative.startswith('../'):
+            raise SuspiciousFileOperation(f'{path} is outside MEDIA_ROOT')
+        prefix = getattr(settings, 'FILE_DELIVERY_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + relative
+    # The proxy supplies the real type and length
+    del response['Content-Type']
+    return response
+
+
+def serve_file(request, path, filename=None, as_attachment=False, cache_control='private, no-cache'):
+    """Response for the file at ``path``; see the module docstring. Raises Http404 if it is missing."""
+    try:
+        stat = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404('File not found')
+    if not os.path.isfile(path):
+        raise Http404('File not found')
+
+    etag = file_etag(stat)
+    last_modified = int(stat.st_mtime)
+    filename = filename or os.path.basename(path)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    def finish(response):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Accept-Ranges'] = 'bytes'
+        response['Cache-Control'] = cache_control
+        if response.status_code in (200, 206):
+            response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+        return response
+
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if conditional is not None:
+        return finish(conditional)
+
+    if get_backend() != 'django':
+        return finish(_offload(HttpResponse(content_type=content_type), path))
+
+    byte_range = None
+    if request.method in ('GET', 'HEAD') and 'HTTP_RANGE' in request.META and if_range_matches(request, etag, last_modified):
+        byte_range = parse_range(request.META['HTTP_RANGE'], stat.st_size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+        return finish(response)
+
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+        return finish(response)
+
+    start, end = byte_range
+    response = StreamingHttpResponse(_read_range(path, start, end), status=206, content_type=content_type)
+    response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    response['Content-Length'] = str(end - start + 1)
+    return finish(response)
+
+
+@require_safe
+def serve_media(request, path):
+    """``MEDIA_URL`` view: public uploads with Range/conditional support (replaces ``django.views.static.serve``)."""
+    try:
+        full_path = default_storage.path(path)
+    except SuspiciousFileOperation:
+        raise Http404('File not found')
+    relative = os.path.relpath(full_path, default_storage.location).replace(os.sep, '/')
+    if any(relative.startswith(f'{root}/') for root in PRIVATE_ROOTS):
+        raise Http404('File not found')
+    if path.startswith(f'{thumbnails.ROOT}/'):
+        # Content-addressed image variants (api.thumbnails) never change
+        return serve_file(request, full_path, cache_control='public, max-age=31536000, immutable')
+    return serve_file(request, full_path, cache_control='public, max-age=3600')
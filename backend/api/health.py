@@ -1,8 +1,29 @@
 """
-Health check endpoint for Render
+Health check endpoint for Render, and the Prometheus scrape endpoint
 """
-from django.http import JsonResponse
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
 from django.views.decorators.http import require_http_methods
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from . import metrics
+
+
+def _is_admin(user):
+    return user.is_authenticated and (user.is_staff or user.is_superuser or user.role in ['Admin', 'Staff'])
+
+
+def _jwt_user(request):
+    """The user of a valid ``Authorization: Bearer <access token>``, or None."""
+    try:
+        authenticated = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:  # includes InvalidToken
+        return None
+    return authenticated[0] if authenticated else None
+
 
 @require_http_methods(["GET"])
 def health_check(request):
@@ -12,3 +33,26 @@ def health_check(request):
         'service': 'elibrary-backend',
         'version': '1.0.0'
     })
+
+
+@require_http_methods(["GET"])
+def prometheus_metrics(request):
+    """
+    Metrics of all workers (see api/metrics.py), for ``Authorization: Bearer
+    <METRICS_TOKEN>`` scrapers and for admins (session or JWT access token)
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorization = request.headers.get('Authorization', '')
+    if token and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode()):
+        allowed = True
+    elif _is_admin(request.user):
+        allowed = True
+    else:
+        user = _jwt_user(request)
+        allowed = user is not None and _is_admin(user)
+    if not allowed:
+        return JsonResponse({'error': 'Insufficient permissions'}, status=403)
+    return HttpResponse(
+        metrics.render_prometheus(metrics.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
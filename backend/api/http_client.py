@@ -0,0 +1,186 @@
+"""
+Pooled, time-bounded HTTP client for third-party gateways (e.g. Chapa).
+
+``GatewayClient`` wraps one ``requests.Session`` per process, so connections
+(and their TLS sessions) are kept alive and reused across requests, and adds:
+
+* a (connect, read) timeout on every call, chosen per operation, so a slow
+  gateway can never hold a worker indefinitely;
+* bounded retries with exponential backoff and jitter. Failures where the
+  request never reached the gateway (connection refused, connect timeout)
+  are retried for every call; read timeouts and 502/503/504 responses only
+  for calls marked ``idempotent``, so a payment is never submitted twice;
+* a circuit breaker: after ``breaker_threshold`` consecutive failures the
+  client fails fast with ``CircuitOpenError`` for ``breaker_cooldown``
+  seconds, then lets a single trial call through (half-open) and closes
+  again if it succeeds.
+
+Breaker state is per process: each gunicorn worker learns independently
+that the gateway is degraded, after at most ``breaker_threshold`` calls.
+"""
+import logging
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = (502, 503, 504)
+
+
+class GatewayError(Exception):
+    """The gateway could not be reached or kept failing."""
+
+
+class CircuitOpenError(GatewayError):
+    """Calls are being short-circuited while the gateway is degraded."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open (fail fast) -> half-open (one trial) -> closed."""
+
+    def __init__(self, threshold=5, cooldown=30.0, clock=time.monotonic):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'open' if self.clock() - self.opened_at < self.cooldown else 'half-open'
+
+    def before_call(self):
+        with self.lock:
+            state = self.state
+            if state == 'open' or (state == 'half-open' and self.trial_running):
+                raise CircuitOpenError('Gateway temporarily unavailable')
+            if state == 'half-open':
+                self.trial_running = True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.threshold:
+                if self.opened_at is None or self.trial_running:
+                    logger.warning(f"Circuit opened after {self.failures} consecutive gateway failures")
+                self.opened_at = self.clock()
+            self.trial_running = False
+
+
+def never_sent(exc):
+    """True if ``exc`` happened before the request reached the gateway (safe to retry any call)."""
+    if isinstance(exc, requests.ConnectTimeout):
+        return True
+    reason = getattr(exc.args[0], 'reason', None) if exc.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class GatewayClient:
+    """See the module docstring. ``timeouts`` maps operation names to ``(connect, read)`` seconds."""
+
+    def __init__(self, base_url, headers=None, timeouts=None, default_timeout=(3.05, 10),
+                 max_retries=2, backoff=0.5, max_backoff=4.0, breaker_threshold=5, breaker_cooldown=30.0,
+                 pool_maxsize=10):
+        self.base_url = base_url.rstrip('/')
+        self.headers = headers or {}
+        self.timeouts = timeouts or {}
+        self.default_timeout = default_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+        self.pool_maxsize = pool_maxsize
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    # Retries are handled here, not by urllib3, so they count towards the breaker
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize, max_retries=0)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+        return self._session
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def get_timeout(self, operation):
+        return self.timeouts.get(operation, self.default_timeout)
+
+    def sleep_before_retry(self, attempt):
+        delay = min(self.max_backoff, self.backoff * (2 ** attempt))
+        time.sleep(delay * random.uniform(0.5, 1.0))
+
+    def request(self, operation, method, path, idempotent=False, **kwargs):
+        """
+        Send ``method path`` for ``operation`` and return the ``requests.Response``.
+
+        Raises ``CircuitOpenError`` while the breaker is open and
+        ``GatewayError`` when the gateway is unreachable after the allowed
+        retries. 4xx responses are returned as-is; persistent 502/503/504
+        responses are returned after the retries (and count as failures).
+        """
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        kwargs.setdefault('timeout', self.get_timeout(operation))
+        headers = {**self.headers, **kwargs.pop('headers', {})}
+
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            try:
+                response = self.session.request(method, url, headers=headers, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.breaker.record_failure()
+                if attempt < self.max_retries and (idempotent or never_sent(e)):
+                    logger.info(f"{operation}: retrying after {e.__class__.__name__} (attempt {attempt + 1})")
+                    self.sleep_before_retry(attempt)
+                    attempt += 1
+                    continue
+                raise GatewayError(f"{operation} failed: {e}") from e
+            except requests.RequestException as e:
+                # Not worth retrying (bad URL, redirect loop, broken body), but it must end a half-open trial
+                self.breaker.record_failure()
+                raise GatewayError(f"{operation} failed: {e}") from e
+            except BaseException:
+                self.breaker.record_failure()
+                raise
+
+            if response.status_code >= 500:
+                self.breaker.record_failure()
+                if idempotent and response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                    logger.info(f"{operation}: retrying after HTTP {response.status_code} (attempt {attempt + 1})")
+                    response.close()
+                    self.sleep_before_retry(attempt)
+                    attempt += 1
+                    continue
+            else:
+                self.breaker.record_success()
+            return response
+
+    def get(self, operation, path, **kwargs):
+        return self.request(operation, 'GET', path, idempotent=True, **kwargs)
+
+    def post(self, operation, path, idempotent=False, **kwargs):
+        return self.request(operation, 'POST', path, idempotent=idempotent, **kwargs)
@@ -0,0 +1,194 @@
+"""
+Database-backed background job queue.
+
+Jobs are ``BackgroundJob`` rows processed by ``manage.py run_jobs``; no
+external broker is needed. Each job ``kind`` maps to a handler function
+(dotted path in ``JOB_HANDLERS``) that receives the job, may report progress
+with ``update_progress`` and returns a JSON-serialisable result.
+
+In production the worker runs next to the web workers, started by the
+gunicorn master (see backend/gunicorn.conf.py): handlers read files the web
+requests saved to the local ``MEDIA_ROOT``, which a worker on another
+machine would not see.
+
+Workers claim jobs with a conditional UPDATE, so any number of worker
+processes can poll the same table on SQLite or PostgreSQL. Jobs whose worker
+stops sending heartbeats are put back on the queue by ``requeue_stale``.
+
+Set ``BACKGROUND_JOBS_EAGER = True`` in settings to run jobs inline when they
+are enqueued (useful in tests and single-process development setups).
+"""
+import logging
+import os
+import socket
+import time
+from datetime import timedelta
+from importlib import import_module
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import metrics
+from .models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+JOB_HANDLERS = {
+    'ocr_questions': 'api.question_import.run_ocr_questions_job',
+    'render_audiobook': 'api.audiobook.run_render_audiobook_job',
+    'reconcile_stats': 'api.stats.run_reconcile_stats_job',
+    'aggregate_analytics': 'api.analytics.run_aggregate_analytics_job',
+    'image_derivatives': 'api.thumbnails.run_image_derivatives_job',
+    'payment_events': 'api.payment_events.run_payment_events_job',
+    'analyze_pdf': 'api.pdf_analysis.run_analyze_pdf_job',
+    'ingest_book_text': 'api.book_text.run_ingest_book_text_job',
+}
+
+STALE_AFTER = timedelta(minutes=10)
+POLL_INTERVAL = 2
+
+
+def get_handler(kind):
+    try:
+        path = JOB_HANDLERS[kind]
+    except KeyError:
+        raise ValueError(f"Unknown job kind: {kind}")
+    module_path, func_name = path.rsplit('.', 1)
+    return getattr(import_module(module_path), func_name)
+
+
+def enqueue(kind, payload=None, user=None, total=0, max_attempts=1):
+    """Queue a job and return it; the worker picks it up after the transaction commits."""
+    get_handler(kind)  # fail fast on typos
+    job = BackgroundJob.objects.create(
+        kind=kind,
+        payload=payload or {},
+        user=user if user is not None and user.is_authenticated else None,
+        total=total,
+        max_attempts=max_attempts,
+    )
+    if getattr(settings, 'BACKGROUND_JOBS_EAGER', False):
+        transaction.on_commit(lambda: _run_eager(job.pk))
+    return job
+
+
+def _run_eager(job_id):
+    job = claim(job_id, worker='eager')
+    if job is not None:
+        run_job(job)
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim(job_id, worker):
+    """Atomically move a queued job to running; returns the job or None if another worker won."""
+    now = timezone.now()
+    claimed = BackgroundJob.objects.filter(pk=job_id, status='queued').update(
+        status='running',
+        worker=worker,
+        attempts=F('attempts') + 1,
+        started_at=now,
+        heartbeat_at=now,
+    )
+    if not claimed:
+        return None
+    return BackgroundJob.objects.get(pk=job_id)
+
+
+def claim_next(worker, kinds=None):
+    """Claim the oldest queued job (optionally restricted to ``kinds``)."""
+    queued = BackgroundJob.objects.filter(status='queued')
+    if kinds:
+        queued = queued.filter(kind__in=kinds)
+    for job_id in queued.order_by('created_at').values_list('pk', flat=True)[:10]:
+        job = claim(job_id, worker)
+        if job is not None:
+            return job
+    return None
+
+
+def update_progress(job, progress, total=None):
+    """Record progress (and refresh the heartbeat) for a running job."""
+    job.progress = progress
+    fields = {'progress': progress, 'heartbeat_at': timezone.now()}
+    if total is not None:
+        job.total = total
+        fields['total'] = total
+    BackgroundJob.objects.filter(pk=job.pk).update(**fields)
+
+
+def run_job(job):
+    """Run a claimed job's handler and store its result or error."""
+    started = time.perf_counter()
+    try:
+        result = get_handler(job.kind)(job)
+    except Exception as e:
+        logger.exception(f"Job {job.pk} ({job.kind}) failed")
+        retry = job.attempts < job.max_attempts
+        metrics.inc('jobs_processed', kind=job.kind, outcome='retried' if retry else 'failed')
+        metrics.observe('job_duration_seconds', time.perf_counter() - started, kind=job.kind)
+        BackgroundJob.objects.filter(pk=job.pk).update(
+            status='queued' if retry else 'failed',
+            error=str(e),
+            finished_at=None if retry else timezone.now(),
+        )
+        return False
+
+    metrics.inc('jobs_processed', kind=job.kind, outcome='done')
+    metrics.observe('job_duration_seconds', time.perf_counter() - started, kind=job.kind)
+    BackgroundJob.objects.filter(pk=job.pk).update(
+        status='done',
+        result=result,
+        error='',
+        progress=F('total'),
+        finished_at=timezone.now(),
+    )
+    return True
+
+
+def requeue_stale(stale_after=STALE_AFTER):
+    """Return jobs whose worker died to the queue (or fail them once out of attempts)."""
+    cutoff = timezone.now() - stale_after
+    stale = BackgroundJob.objects.filter(status='running', heartbeat_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', error='Worker stopped responding', finished_at=timezone.now(),
+    )
+    requeued = stale.update(status='queued')
+    return requeued + failed
+
+
+def work(worker=None, kinds=None, once=False, poll_interval=POLL_INTERVAL):
+    """Process jobs until interrupted (or until the queue is empty with ``once``)."""
+    worker = worker or worker_name()
+    metrics.publish('jobs')  # also how the admin system health knows a job worker is up
+    processed = 0
+    while True:
+        requeue_stale()
+        job = claim_next(worker, kinds)
+        if job is None:
+            if once:
+                return processed
+            time.sleep(poll_interval)
+            continue
+        logger.info(f"Worker {worker} running job {job.pk} ({job.kind})")
+        run_job(job)
+        processed += 1
+
+
+def serialize_job(job):
+    return {
+        'job_id': str(job.pk),
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'total': job.total,
+        'percent': job.percent,
+        'error': job.error or None,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
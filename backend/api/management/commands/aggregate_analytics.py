@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from api.analytics import BACKFILL_DAYS, aggregate
+
+
+class Command(BaseCommand):
+    help = 'Recompute the hourly/daily analytics rollups (run periodically, e.g. hourly from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=2,
+                            help=f'Number of days to recompute (use {BACKFILL_DAYS} to backfill)')
+
+    def handle(self, *args, **options):
+        rows = aggregate(days=options['days'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {rows} rollup rows covering {options['days']} days"))
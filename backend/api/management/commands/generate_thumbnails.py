@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from api.response_cache import bump_version
+from api.thumbnails import IMAGE_FIELDS, generate, prune
+
+
+class Command(BaseCommand):
+    help = 'Render the WebP/JPEG variants of uploaded images that do not have them yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Re-render images that already have variants')
+        parser.add_argument('--prune', action='store_true',
+                            help='Also delete variants of images that are no longer referenced')
+
+    def handle(self, *args, **options):
+        generated = failed = 0
+        for model, field in IMAGE_FIELDS:
+            names = (model._default_manager.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+                     .values_list(field, flat=True).distinct())
+            for name in names:
+                try:
+                    generate(name, force=options['force'])
+                    generated += 1
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f'{model.__name__} {name}: {e}')
+            bump_version(model)
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {generated} images ({failed} failed)'))
+        if options['prune']:
+            self.stdout.write(self.style.SUCCESS(f'Pruned {prune()} unreferenced derivative sets'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from api.models import Book
+from api.book_text import ingest_book
+
+
+class Command(BaseCommand):
+    help = 'Extract and index per-page text for every book PDF'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--book', type=int, help='Only ingest the book with this ID')
+        parser.add_argument('--force', action='store_true', help='Re-extract books that are already ingested')
+
+    def handle(self, *args, **options):
+        books = Book.objects.exclude(pdf_file='').exclude(pdf_file__isnull=True)
+        if options['book']:
+            books = books.filter(id=options['book'])
+
+        ingested = failed = 0
+        for book in books.iterator():
+            try:
+                ingest = ingest_book(book, force=options['force'])
+                ingested += 1
+                self.stdout.write(f'{book.title}: {ingest.page_count} pages')
+            except Exception as e:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f'{book.title}: failed ({e})'))
+
+        self.stdout.write(self.style.SUCCESS(f'Ingested {ingested} books, {failed} failed'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from api.payment_events import process_pending
+
+
+class Command(BaseCommand):
+    help = 'Apply pending payment webhook events from the inbox (normally done by the payment_events job)'
+
+    def handle(self, *args, **options):
+        totals = process_pending()
+        summary = ', '.join(f'{count} {outcome}' for outcome, count in sorted(totals.items())) or 'nothing pending'
+        self.stdout.write(self.style.SUCCESS(f'Processed payment events: {summary}'))
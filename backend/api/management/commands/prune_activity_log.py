@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from api.activity_log import prune
+
+
+class Command(BaseCommand):
+    help = 'Delete admin activity feed entries past the retention period or row limit'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Keep this many days (default ACTIVITY_LOG_RETENTION_DAYS)')
+        parser.add_argument('--max-rows', type=int, help='Keep at most this many entries (default ACTIVITY_LOG_MAX_ROWS)')
+
+    def handle(self, *args, **options):
+        deleted = prune(retention_days=options['days'], max_rows=options['max_rows'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} activity entries'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from api.models import Book
+from api.search_index import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for the book catalog'
+
+    def handle(self, *args, **options):
+        count = rebuild_index(Book.objects.all())
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} books'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from api.stats import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Recount the admin dashboard statistics from scratch'
+
+    def handle(self, *args, **options):
+        counters = reconcile()
+        self.stdout.write(self.style.SUCCESS(f'Reconciled {len(counters)} counters'))
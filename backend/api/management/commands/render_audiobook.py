@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.models import Book
+from api import jobs
+
+
+class Command(BaseCommand):
+    help = 'Render whole books into chapter audio segments (resumes unfinished renders)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('book_ids', nargs='*', type=int, help='Books to render (default: all books with a PDF)')
+        parser.add_argument('--lang', default='en', help='Voice language')
+        parser.add_argument('--speed', type=float, default=1.0, help='Voice speed (0.5 to 2.0)')
+        parser.add_argument('--force', action='store_true', help='Re-render segments that are already done')
+        parser.add_argument('--queue', action='store_true', help='Queue jobs for run_jobs workers instead of rendering here')
+
+    def handle(self, *args, **options):
+        books = Book.objects.exclude(pdf_file='').exclude(pdf_file__isnull=True)
+        if options['book_ids']:
+            books = books.filter(id__in=options['book_ids'])
+        if not books.exists():
+            raise CommandError('No matching books with a PDF')
+
+        worker = jobs.worker_name()
+        failed = 0
+        for book in books.iterator():
+            job = jobs.enqueue('render_audiobook', {
+                'book_id': book.id,
+                'voice_lang': options['lang'],
+                'voice_speed': options['speed'],
+                'force': options['force'],
+            }, max_attempts=3)
+            if options['queue']:
+                self.stdout.write(f'{book.title}: queued job {job.pk}')
+                continue
+
+            job = jobs.claim(job.pk, worker)
+            if job is None:  # picked up by a running worker
+                self.stdout.write(f'{book.title}: taken by a worker')
+                continue
+            if jobs.run_job(job):
+                job.refresh_from_db()
+                self.stdout.write(f"{book.title}: {job.result['rendered']} segments rendered, {job.result['skipped']} already done")
+            else:
+                failed += 1
+                job.refresh_from_db()
+                self.stdout.write(self.style.WARNING(f'{book.title}: failed ({job.error})'))
+
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{failed} books failed; run the command again to resume'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Done'))
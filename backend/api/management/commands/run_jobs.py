@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from api import jobs
+
+
+class Command(BaseCommand):
+    help = 'Run the background job worker (see api.jobs)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+        parser.add_argument('--kind', action='append', dest='kinds', help='Only run jobs of this kind (repeatable)')
+        parser.add_argument('--poll', type=float, default=jobs.POLL_INTERVAL, help='Seconds between polls of an empty queue')
+
+    def handle(self, *args, **options):
+        worker = jobs.worker_name()
+        self.stdout.write(f'Worker {worker} started')
+        try:
+            processed = jobs.work(worker, kinds=options['kinds'], once=options['once'], poll_interval=options['poll'])
+        except KeyboardInterrupt:
+            return
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} jobs'))
@@ -0,0 +1,630 @@
+"""
+Runtime metrics aggregated across workers.
+
+Each process records into an in-memory registry:
+
+* ``MetricsMiddleware``: requests per view, method and status, a latency
+  histogram per view, and the number and duration of the SQL queries each
+  view ran;
+* the cache backends in api.cache_backends: lookups, as hits and misses;
+* ``api.jobs``: background job runs by kind and outcome, with durations.
+
+Recording only touches memory. In web workers (from their first request)
+and job workers (``publish``), a daemon thread writes the registry, with
+the process's RSS and CPU time, to the process's ``WorkerMetrics`` row
+every ``METRICS_FLUSH_INTERVAL`` seconds (default 15) and once more at
+exit, so ``collect`` can add up every worker on every host from one table.
+Counters and histograms are summed over all rows, including workers that
+have exited, so totals don't drop when gunicorn recycles a worker. A row
+not written for ``METRICS_WORKER_RETENTION`` seconds (default one day) is
+folded into the ``retired`` row, which keeps the totals of every pruned
+worker, and deleted. Gauges (workers, RSS) only count live rows, written
+within the last three intervals.
+
+``render_prometheus`` formats an aggregate for the ``/metrics`` endpoint
+(see api.health) and ``health_report`` backs the admin system-health view.
+"""
+import atexit
+import logging
+import os
+import shutil
+import socket
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connection, connections, transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from .models import BackgroundJob, User, WorkerMetrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 15
+DEFAULT_WORKER_RETENTION = 24 * 3600
+PRUNE_INTERVAL = 3600
+DEFAULT_KEPT_QUERIES = 200
+RETIRED_WORKER = 'retired'  # WorkerMetrics row holding the totals of pruned workers
+PREFIX = 'elibrary_'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS = {
+    'job_duration_seconds': (0.1, 0.5, 1, 5, 15, 60, 300, 900, 3600),
+}
+HTTP_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+# name -> (type, help); counters are exposed with a ``_total`` suffix
+METRICS = {
+    'http_requests': ('counter', 'HTTP requests served, by view, method and status'),
+    'http_request_duration_seconds': ('histogram', 'Time to produce a response, by view'),
+    'db_queries': ('counter', 'SQL queries run while serving requests, by view'),
+    'db_query_duration_seconds': ('counter', 'Seconds spent in SQL queries while serving requests, by view'),
+    'cache_requests': ('counter', 'Cache lookups, by result (hit or miss)'),
+    'over_budget_requests': ('counter', 'Requests over their SQL query or latency budget (see api.query_budget), by view and reason'),
+    'jobs_processed': ('counter', 'Background jobs run, by kind and outcome'),
+    'job_duration_seconds': ('histogram', 'Background job run time, by kind'),
+}
+
+# Admin health alert thresholds
+ALERT_ERROR_RATE = 0.05
+ALERT_MIN_REQUESTS = 20
+ALERT_P95_SECONDS = 2.0
+ALERT_QUEUE_AGE_SECONDS = 600
+ALERT_DISK_PERCENT = 90
+
+_lock = threading.Lock()
+_counters = defaultdict(float)  # (name, labels) -> value; labels: sorted ((label, value), ...)
+_histograms = {}  # (name, labels) -> [count per bucket..., count above the last bucket, sum]
+_role = 'web'
+_started_at = time.time()
+_flusher = None
+_pid = None
+_published = False
+
+
+def flush_interval():
+    return getattr(settings, 'METRICS_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+
+
+def kept_queries():
+    """How many of a request's queries are kept for api.query_budget's report."""
+    return getattr(settings, 'SQL_BUDGET_KEPT_QUERIES', DEFAULT_KEPT_QUERIES)
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _key(name, labels):
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+def buckets_for(name):
+    return BUCKETS.get(name, LATENCY_BUCKETS)
+
+
+def inc(name, amount=1, **labels):
+    """Add ``amount`` to counter ``name`` with ``labels``."""
+    key = _key(name, labels)
+    with _lock:
+        _check_fork()
+        _counters[key] += amount
+
+
+def observe(name, value, **labels):
+    """Record ``value`` (seconds) in histogram ``name`` with ``labels``."""
+    key = _key(name, labels)
+    buckets = buckets_for(name)
+    with _lock:
+        _check_fork()
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+        histogram[bisect_left(buckets, value)] += 1
+        histogram[-1] += value
+
+
+def publish(role='web'):
+    """Start writing this process's snapshots, labelled ``role`` (``web`` or ``jobs``)."""
+    global _role, _flusher
+    with _lock:
+        _check_fork()
+        _role = role
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True)
+            _flusher.start()
+
+
+def snapshot():
+    """This process's registry as JSON-serialisable lists."""
+    with _lock:
+        return {
+            'counters': [[name, dict(labels), value] for (name, labels), value in _counters.items()],
+            'histograms': [[name, dict(labels), list(values)] for (name, labels), values in _histograms.items()],
+        }
+
+
+class QueryStats:
+    """
+    ``execute_wrapper`` hook counting the queries run and the time spent in
+    them. The first ``keep`` queries are also kept, as ``(sql, params key,
+    seconds)``, for api.query_budget; the key only tells equal parameters
+    apart, the values themselves are not kept.
+    """
+
+    def __init__(self, keep=0):
+        self.count = 0
+        self.duration = 0.0
+        self.keep = keep
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            seconds = time.perf_counter() - started
+            self.count += 1
+            self.duration += seconds
+            if self.count <= self.keep:
+                self.queries.append((sql, None if many else hash(repr(params)), seconds))
+
+
+class MetricsMiddleware:
+    """
+    Records every request's latency and SQL queries under its URL name. The
+    ``QueryStats`` is shared with later middleware as ``request.query_stats``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        publish('web')
+        queries = request.query_stats = QueryStats(keep=kept_queries())
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(queries))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        # URL names keep the label set bounded, unlike raw paths
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else 'unmatched'
+        method = request.method if request.method in HTTP_METHODS else 'other'
+        inc('http_requests', view=view, method=method, status=response.status_code)
+        observe('http_request_duration_seconds', elapsed, view=view)
+        if queries.count:
+            inc('db_queries', queries.count, view=view)
+            inc('db_query_duration_seconds', queries.duration, view=view)
+        return response
+
+
+def process_rss():
+    """Resident set size of this process in bytes (peak RSS where /proc is unavailable)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def flush():
+    """Write this process's snapshot to its ``WorkerMetrics`` row."""
+    times = os.times()
+    WorkerMetrics.objects.update_or_create(
+        worker=worker_name(),
+        defaults={
+            'role': _role,
+            'started_at': datetime.fromtimestamp(_started_at, tz=dt_timezone.utc),
+            'rss_bytes': process_rss(),
+            'cpu_seconds': times.user + times.system,
+            'data': snapshot(),
+        },
+    )
+
+
+def merge_snapshots(snapshots):
+    """``(counters, histograms)`` keyed like the registry, summed over ``snapshots`` (``WorkerMetrics.data``)."""
+    counters, histograms = defaultdict(float), {}
+    for data in snapshots:
+        for name, labels, value in data.get('counters', []):
+            counters[_key(name, labels)] += value
+        for name, labels, values in data.get('histograms', []):
+            key = _key(name, labels)
+            total = histograms.setdefault(key, [0] * len(values))
+            if len(total) == len(values):  # skip snapshots taken with other buckets
+                for i, value in enumerate(values):
+                    total[i] += value
+    return counters, histograms
+
+
+def prune(retention=None):
+    """
+    Fold the rows of workers that stopped writing ``retention`` seconds ago
+    into the ``retired`` row and delete them; returns the count.
+    """
+    retention = retention or getattr(settings, 'METRICS_WORKER_RETENTION', DEFAULT_WORKER_RETENTION)
+    cutoff = timezone.now() - timedelta(seconds=retention)
+    with transaction.atomic():
+        stale = list(
+            WorkerMetrics.objects.select_for_update()
+            .filter(updated_at__lt=cutoff).exclude(worker=RETIRED_WORKER)
+        )
+        if not stale:
+            return 0
+        retired, _ = WorkerMetrics.objects.select_for_update().get_or_create(
+            worker=RETIRED_WORKER, defaults={'role': RETIRED_WORKER, 'started_at': min(row.started_at for row in stale)},
+        )
+        counters, histograms = merge_snapshots([retired.data] + [row.data for row in stale])
+        retired.data = {
+            'counters': [[name, dict(labels), value] for (name, labels), value in counters.items()],
+            'histograms': [[name, dict(labels), values] for (name, labels), values in histograms.items()],
+        }
+        retired.save(update_fields=['data', 'updated_at'])
+        WorkerMetrics.objects.filter(pk__in=[row.pk for row in stale]).delete()
+    return len(stale)
+
+
+def collect():
+    """
+    The aggregate of every worker's latest snapshot (this process's is written
+    first): ``counters`` and ``histograms`` keyed like the registry, the live
+    ``workers`` rows, and job queue depth.
+    """
+    try:
+        flush()
+    except Exception as e:
+        logger.error(f"Metrics flush failed: {str(e)}")
+
+    live_after = timezone.now() - timedelta(seconds=3 * max(flush_interval(), 1))
+    rows = list(WorkerMetrics.objects.order_by('started_at'))
+    counters, histograms = merge_snapshots(row.data for row in rows)
+    workers = [row for row in rows if row.updated_at >= live_after and row.worker != RETIRED_WORKER]
+
+    queue = BackgroundJob.objects.filter(status__in=['queued', 'running'])
+    jobs = dict(queue.values_list('status').annotate(count=Count('id')).order_by())
+    oldest = BackgroundJob.objects.filter(status='queued').aggregate(oldest=Min('created_at'))['oldest']
+    return {
+        'counters': counters,
+        'histograms': histograms,
+        'workers': workers,
+        'jobs': {
+            'queued': jobs.get('queued', 0),
+            'running': jobs.get('running', 0),
+            'oldest_queued_seconds': (timezone.now() - oldest).total_seconds() if oldest else 0,
+        },
+    }
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _sample(name, labels, value):
+    value = int(value) if float(value).is_integer() else repr(float(value))
+    label_text = ','.join(f'{label}="{_escape(v)}"' for label, v in labels)
+    return f'{PREFIX}{name}{{{label_text}}} {value}' if label_text else f'{PREFIX}{name} {value}'
+
+
+def render_prometheus(data):
+    """``data`` (from ``collect``) in the Prometheus text exposition format (0.0.4)."""
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        exposed = f'{name}_total' if kind == 'counter' else name
+        lines += [f'# HELP {PREFIX}{exposed} {help_text}', f'# TYPE {PREFIX}{exposed} {kind}']
+        if kind == 'counter':
+            for (metric, labels), value in sorted(data['counters'].items()):
+                if metric == name:
+                    lines.append(_sample(exposed, labels, value))
+            continue
+        buckets = buckets_for(name)
+        for (metric, labels), values in sorted(data['histograms'].items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), values):
+                cumulative += count
+                lines.append(_sample(f'{name}_bucket', labels + (('le', f'{bound:g}' if bound != '+Inf' else bound),), cumulative))
+            lines.append(_sample(f'{name}_sum', labels, values[-1]))
+            lines.append(_sample(f'{name}_count', labels, cumulative))
+
+    roles = defaultdict(lambda: [0, 0])
+    for row in data['workers']:
+        roles[row.role][0] += 1
+        roles[row.role][1] += row.rss_bytes
+    gauges = [
+        ('workers', 'Live worker processes, by role', [((('role', role),), n) for role, (n, _) in roles.items()]),
+        ('resident_memory_bytes', 'Resident memory of the live workers, by role',
+         [((('role', role),), rss) for role, (_, rss) in roles.items()]),
+        ('background_jobs', 'Background jobs waiting or running, by status',
+         [((('status', status),), data['jobs'][status]) for status in ('queued', 'running')]),
+        ('background_job_oldest_queued_seconds', 'Age of the oldest queued background job',
+         [((), data['jobs']['oldest_queued_seconds'])]),
+    ]
+    for name, help_text, samples in gauges:
+        lines += [f'# HELP {PREFIX}{name} {help_text}', f'# TYPE {PREFIX}{name} gauge']
+        lines += [_sample(name, labels, value) for labels, value in sorted(samples)]
+    return '\n'.join(lines) + '\n'
+
+
+def percentile(histogram, q, buckets=LATENCY_BUCKETS):
+    """Estimate of quantile ``q`` (0-1) of a histogram, interpolated within its bucket."""
+    counts = histogram[:-1]
+    total = sum(counts)
+    if not total:
+        return None
+    rank, seen = q * total, 0
+    for i, count in enumerate(counts):
+        if count and seen + count >= rank:
+            if i == len(buckets):
+                return buckets[-1]  # above the last bound: report the bound
+            lower = buckets[i - 1] if i else 0
+            return lower + (buckets[i] - lower) * (rank - seen) / count
+        seen += count
+    return buckets[-1]
+
+
+def _total(counters, name, **labels):
+    """Sum of counter ``name`` over the series matching ``labels``."""
+    wanted = {label: str(value) for label, value in labels.items()}.items()
+    return sum(value for (metric, metric_labels), value in counters.items()
+               if metric == name and wanted <= dict(metric_labels).items())
+
+
+def _merge(histograms):
+    merged = None
+    for values in histograms:
+        merged = list(values) if merged is None else [a + b for a, b in zip(merged, values)]
+    return merged
+
+
+def endpoint_stats(data, limit=10):
+    """Per-view request totals, errors, latency and queries, busiest (by total time) first."""
+    views = defaultdict(lambda: {'requests': 0, 'errors': 0, 'db_queries': 0, 'db_seconds': 0.0})
+    for (name, labels), value in data['counters'].items():
+        labels = dict(labels)
+        if 'view' not in labels:
+            continue
+        stats = views[labels['view']]
+        if name == 'http_requests':
+            stats['requests'] += value
+            if labels.get('status', '').startswith('5'):
+                stats['errors'] += value
+        elif name == 'db_queries':
+            stats['db_queries'] += value
+        elif name == 'db_query_duration_seconds':
+            stats['db_seconds'] += value
+
+    rows = []
+    for (name, labels), histogram in data['histograms'].items():
+        view = dict(labels).get('view')
+        if name != 'http_request_duration_seconds' or view is None:
+            continue
+        stats = views[view]
+        count = sum(histogram[:-1])
+        rows.append({
+            'view': view,
+            'requests': int(stats['requests']),
+            'errors': int(stats['errors']),
+            'total_seconds': round(histogram[-1], 3),
+            'avg_ms': round(histogram[-1] / count * 1000, 1) if count else None,
+            'p95_ms': round(percentile(histogram, 0.95) * 1000, 1) if count else None,
+            'avg_db_queries': round(stats['db_queries'] / count, 1) if count else None,
+            'avg_db_ms': round(stats['db_seconds'] / count * 1000, 1) if count else None,
+        })
+    rows.sort(key=lambda row: row['total_seconds'], reverse=True)
+    return rows[:limit]
+
+
+def database_size():
+    """Size of the database in bytes, or None where it can't be measured."""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_database_size(current_database())')
+            return cursor.fetchone()[0]
+    if connection.vendor == 'sqlite':
+        name = str(connection.settings_dict['NAME'])
+        return os.path.getsize(name) if os.path.isfile(name) else None
+    return None
+
+
+def _timed_check(check):
+    started = time.perf_counter()
+    try:
+        result = check() or {}
+    except Exception as e:
+        return {'status': 'unhealthy', 'error': str(e)}
+    return {'status': 'healthy', 'latency_ms': round((time.perf_counter() - started) * 1000, 1), **result}
+
+
+def _check_database():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+
+
+def _check_cache():
+    token = f'{worker_name()}:{time.time()}'
+    cache.set('metrics:health', token, 30)
+    if cache.get('metrics:health') != token:
+        raise RuntimeError('Cache did not return the value just written')
+
+
+def _check_storage():
+    root = str(settings.MEDIA_ROOT)
+    if not os.path.isdir(root):
+        raise RuntimeError(f'{root} does not exist')
+    if not os.access(root, os.W_OK):
+        raise RuntimeError(f'{root} is not writable')
+    usage = shutil.disk_usage(root)
+    return {'disk_total_bytes': usage.total, 'disk_free_bytes': usage.free,
+            'disk_used_percent': round(usage.used / usage.total * 100, 1)}
+
+
+def _system_memory():
+    try:
+        with open('/proc/meminfo') as f:
+            return int(next(line for line in f if line.startswith('MemTotal:')).split()[1]) * 1024
+    except (OSError, StopIteration, ValueError):
+        return None
+
+
+def _cpu_load_percent():
+    try:
+        return round(os.getloadavg()[0] / (os.cpu_count() or 1) * 100, 1)
+    except (AttributeError, OSError):  # not available on Windows
+        return None
+
+
+def health_report():
+    """The admin system-health payload: live checks plus the aggregated metrics."""
+    data = collect()
+    checks = {
+        'database': _timed_check(_check_database),
+        'cache': _timed_check(_check_cache),
+        'storage': _timed_check(_check_storage),
+        # Not dialled here: a slow SMTP server would stall the health check
+        'email': {'status': 'configured' if settings.EMAIL_HOST and settings.EMAIL_HOST_USER else 'not_configured'},
+    }
+
+    counters = data['counters']
+    requests = _total(counters, 'http_requests')
+    errors = sum(value for (name, labels), value in counters.items()
+                 if name == 'http_requests' and dict(labels).get('status', '').startswith('5'))
+    latency = _merge(h for (name, _), h in data['histograms'].items() if name == 'http_request_duration_seconds')
+    hits, misses = _total(counters, 'cache_requests', result='hit'), _total(counters, 'cache_requests', result='miss')
+
+    now = timezone.now()
+    workers = data['workers']
+    rss = sum(row.rss_bytes for row in workers)
+    system_memory = _system_memory()
+    try:
+        db_size = database_size()
+    except Exception as e:
+        logger.error(f"Could not measure the database size: {str(e)}")
+        db_size = None
+    p95 = percentile(latency, 0.95) if latency else None
+
+    metrics = {
+        'database_size_bytes': db_size,
+        'logins_24h': User.objects.filter(last_login__gte=now - timedelta(hours=24)).count(),
+        'memory_usage': {
+            'rss_bytes': rss,
+            'percent_of_system': round(rss / system_memory * 100, 1) if system_memory else None,
+        },
+        'cpu_usage': {
+            'load_percent': _cpu_load_percent(),
+            'process_seconds': round(sum(row.cpu_seconds for row in workers), 1),
+        },
+        'disk_usage_percent': checks['storage'].get('disk_used_percent'),
+        'uptime_seconds': int((now - min(row.started_at for row in workers)).total_seconds()) if workers else 0,
+        'requests': int(requests),
+        'error_rate': round(errors / requests, 4) if requests else 0,
+        'latency_ms': {
+            'p50': round(percentile(latency, 0.5) * 1000, 1) if latency else None,
+            'p95': round(p95 * 1000, 1) if p95 is not None else None,
+            'p99': round(percentile(latency, 0.99) * 1000, 1) if latency else None,
+        },
+        'db_queries_per_request': round(_total(counters, 'db_queries') / requests, 2) if requests else 0,
+        'cache_hit_ratio': round(hits / (hits + misses), 4) if hits + misses else None,
+    }
+
+    job_workers = [row for row in workers if row.role == 'jobs']
+    alerts = [f'{name} check failed: {check.get("error")}' for name, check in checks.items()
+              if check['status'] == 'unhealthy']
+    if requests >= ALERT_MIN_REQUESTS and errors / requests > ALERT_ERROR_RATE:
+        alerts.append(f'{errors / requests:.1%} of requests failed with a server error')
+    if p95 is not None and p95 > ALERT_P95_SECONDS:
+        alerts.append(f'95th percentile latency is {p95:.2f}s')
+    if data['jobs']['oldest_queued_seconds'] > ALERT_QUEUE_AGE_SECONDS:
+        alerts.append(f"Oldest queued job has waited {data['jobs']['oldest_queued_seconds'] / 60:.0f} minutes")
+    if (metrics['disk_usage_percent'] or 0) > ALERT_DISK_PERCENT:
+        alerts.append(f"Media disk is {metrics['disk_usage_percent']}% full")
+
+    if checks['database']['status'] != 'healthy':
+        status = 'unhealthy'
+    else:
+        status = 'degraded' if alerts else 'healthy'
+    return {
+        'status': status,
+        'timestamp': now.isoformat(),
+        'checks': checks,
+        'metrics': metrics,
+        'jobs': data['jobs'],
+        'endpoints': endpoint_stats(data),
+        'workers': [
+            {
+                'worker': row.worker,
+                'role': row.role,
+                'rss_bytes': row.rss_bytes,
+                'cpu_seconds': round(row.cpu_seconds, 1),
+                'started_at': row.started_at.isoformat(),
+                'last_seen': row.updated_at.isoformat(),
+            }
+            for row in workers
+        ],
+        'services': {
+            'django': 'running',
+            'database': 'running' if checks['database']['status'] == 'healthy' else 'down',
+            'cache': 'running' if checks['cache']['status'] == 'healthy' else 'down',
+            'job_worker': (
+                'eager' if getattr(settings, 'BACKGROUND_JOBS_EAGER', False)
+                else 'running' if job_workers else 'not_running'
+            ),
+        },
+        'alerts': alerts,
+    }
+
+
+def _check_fork():
+    """Start afresh in a process forked after recording, e.g. with gunicorn --preload (called with ``_lock`` held)."""
+    global _flusher, _pid, _started_at, _published
+    if _pid == os.getpid():
+        return
+    if _pid is not None:
+        _counters.clear()
+        _histograms.clear()
+        _started_at = time.time()
+        _flusher, _published = None, False
+    _pid = os.getpid()
+
+
+def _flush_loop():
+    global _published
+    while True:
+        time.sleep(max(flush_interval(), 1))
+        try:
+            flush()
+            _published = True
+            # One worker per interval drops the rows of long-gone workers
+            if cache.add('metrics:pruned', time.time(), PRUNE_INTERVAL):
+                prune()
+        except Exception as e:
+            logger.error(f"Metrics flush failed: {str(e)}")
+        finally:
+            close_old_connections()
+
+
+@atexit.register
+def _flush_at_exit():
+    # Processes that exit before their first interval (commands, test runs) leave no row
+    if _pid == os.getpid() and _published:
+        try:
+            flush()
+        except Exception as e:
+            logger.error(f"Metrics flush at exit failed: {str(e)}")
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+PG_VECTOR = (
+    "setweight(to_tsvector('simple', title), 'A') || "
+    "setweight(to_tsvector('simple', author), 'B') || "
+    "setweight(to_tsvector('simple', body), 'C')"
+)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS api_booksearch_gin ON api_booksearchdocument USING GIN (({PG_VECTOR}))"
+        )
+    elif vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS api_booksearch_fts "
+                "USING fts5(title, author, body, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        except Exception:
+            # SQLite built without FTS5: api.search_index falls back to substring matching
+            pass
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS api_booksearch_gin")
+    elif vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS api_booksearch_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0024_inventory_order_orderitem_seller_selleranalytics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookSearchDocument',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='api.book')),
+                ('title', models.TextField(blank=True, default='')),
+                ('author', models.TextField(blank=True, default='')),
+                ('body', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
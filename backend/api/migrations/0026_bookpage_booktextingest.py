@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# SQLite: external-content FTS5 table kept in sync with api_bookpage by triggers
+SQLITE_FTS = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS api_bookpage_fts USING fts5("
+    "search_text, content='api_bookpage', content_rowid='id', tokenize = 'unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS api_bookpage_fts_ai AFTER INSERT ON api_bookpage BEGIN "
+    "INSERT INTO api_bookpage_fts(rowid, search_text) VALUES (new.id, new.search_text); END",
+    "CREATE TRIGGER IF NOT EXISTS api_bookpage_fts_ad AFTER DELETE ON api_bookpage BEGIN "
+    "INSERT INTO api_bookpage_fts(api_bookpage_fts, rowid, search_text) VALUES ('delete', old.id, old.search_text); END",
+    "CREATE TRIGGER IF NOT EXISTS api_bookpage_fts_au AFTER UPDATE ON api_bookpage BEGIN "
+    "INSERT INTO api_bookpage_fts(api_bookpage_fts, rowid, search_text) VALUES ('delete', old.id, old.search_text); "
+    "INSERT INTO api_bookpage_fts(rowid, search_text) VALUES (new.id, new.search_text); END",
+]
+
+
+def create_page_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS api_bookpage_gin ON api_bookpage "
+            "USING GIN (to_tsvector('simple', search_text))"
+        )
+    elif vendor == 'sqlite':
+        try:
+            for statement in SQLITE_FTS:
+                schema_editor.execute(statement)
+        except Exception:
+            # SQLite built without FTS5: api.book_text falls back to substring matching
+            pass
+
+
+def drop_page_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS api_bookpage_gin")
+    elif vendor == 'sqlite':
+        for trigger in ('ai', 'ad', 'au'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS api_bookpage_fts_{trigger}")
+        schema_editor.execute("DROP TABLE IF EXISTS api_bookpage_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0025_booksearchdocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookTextIngest',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='text_ingest', serialize=False, to='api.book')),
+                ('pdf_name', models.CharField(max_length=255)),
+                ('page_count', models.PositiveIntegerField(default=0)),
+                ('status', models.CharField(choices=[('done', 'Done'), ('failed', 'Failed')], default='done', max_length=10)),
+                ('error', models.TextField(blank=True, default='')),
+                ('ingested_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BookPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page_number', models.PositiveIntegerField()),
+                ('text', models.TextField(blank=True, default='')),
+                ('search_text', models.TextField(blank=True, default='')),
+                ('has_error', models.BooleanField(default=False)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pages', to='api.book')),
+            ],
+            options={
+                'ordering': ['book', 'page_number'],
+                'unique_together': {('book', 'page_number')},
+            },
+        ),
+        migrations.RunPython(create_page_index, drop_page_index),
+    ]
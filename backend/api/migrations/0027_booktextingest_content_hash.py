@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0026_bookpage_booktextingest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booktextingest',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', help_text='SHA-256 of the PDF', max_length=64),
+        ),
+    ]
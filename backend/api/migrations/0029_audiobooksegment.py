@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:33
+
+import api.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0028_backgroundjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AudioBookSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('title', models.CharField(max_length=200)),
+                ('page_start', models.PositiveIntegerField()),
+                ('page_end', models.PositiveIntegerField()),
+                ('text_hash', models.CharField(help_text='SHA-256 of the rendered text and voice settings', max_length=64)),
+                ('voice_lang', models.CharField(default='en', max_length=10)),
+                ('voice_speed', models.FloatField(default=1.0)),
+                ('audio_file', models.FileField(blank=True, null=True, upload_to=api.models.audiobook_segment_path)),
+                ('duration_seconds', models.FloatField(default=0)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('error', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='audio_segments', to='api.book')),
+            ],
+            options={
+                'ordering': ['book', 'index'],
+                'unique_together': {('book', 'index')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0030_statcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('bucket_start', models.DateTimeField()),
+                ('metric', models.CharField(max_length=50)),
+                ('dimension', models.CharField(blank=True, default='', max_length=50)),
+                ('value', models.FloatField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['granularity', 'bucket_start'], name='api_analyti_granula_7bfad2_idx')],
+                'unique_together': {('granularity', 'bucket_start', 'metric', 'dimension')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0033_imagederivative'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='account_number',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='payment_details',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='phone_number',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+    ]
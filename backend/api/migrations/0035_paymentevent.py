@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0034_payment_details'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=64, unique=True)),
+                ('tx_ref', models.CharField(db_index=True, max_length=100)),
+                ('event', models.CharField(blank=True, default='', max_length=50)),
+                ('status', models.CharField(max_length=20)),
+                ('event_time', models.DateTimeField(blank=True, null=True)),
+                ('payload', models.JSONField(default=dict)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('outcome', models.CharField(blank=True, choices=[('applied', 'Applied'), ('ignored', 'Ignored'), ('unknown_payment', 'Unknown payment'), ('failed', 'Failed')], default='', max_length=20)),
+                ('error', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['processed_at', 'id'], name='api_payment_process_60570b_idx')],
+            },
+        ),
+    ]
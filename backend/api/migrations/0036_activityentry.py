@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:58
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0035_paymentevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(default='System', max_length=150)),
+                ('action', models.CharField(max_length=50)),
+                ('model_name', models.CharField(max_length=50)),
+                ('object_id', models.CharField(blank=True, default='', max_length=64)),
+                ('text', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-id'],
+            },
+        ),
+    ]
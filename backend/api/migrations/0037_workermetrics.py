@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0036_activityentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkerMetrics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('worker', models.CharField(max_length=150, unique=True)),
+                ('role', models.CharField(default='web', max_length=10)),
+                ('started_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+                ('rss_bytes', models.BigIntegerField(default=0)),
+                ('cpu_seconds', models.FloatField(default=0)),
+                ('data', models.JSONField(default=dict)),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0038_profilecapture'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['views', 'id'], name='api_book_views_d53118_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['downloads', 'id'], name='api_book_downloa_d3fc54_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['views'], name='api_project_views_73d3b4_idx'),
+        ),
+    ]
@@ -6,6 +6,7 @@ from ckeditor.fields import RichTextField
 from django.core.exceptions import ValidationError
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
+from django.urls import reverse
 from django.utils import timezone
 from django.core.validators import FileExtensionValidator
 
@@ -223,6 +224,10 @@ class Book(models.Model):
             models.Index(fields=['is_featured', 'is_active']),
             models.Index(fields=['book_type']),
             models.Index(fields=['is_for_sale', 'is_for_rent']),
+            models.Index(fields=['created_at', 'id']),  # keyset pagination (api.pagination)
+            # Most viewed/downloaded (api.analytics) and keyset pages by popularity
+            models.Index(fields=['views', 'id']),
+            models.Index(fields=['downloads', 'id']),
         ]
 
     def __str__(self):
@@ -250,7 +255,8 @@ class Book(models.Model):
         return cats
 
     def get_pdf_url(self):
-        return self.pdf_file.url if self.pdf_file else None
+        # The entitlement-checked endpoint; api.file_delivery does not serve books/pdfs/ publicly
+        return reverse('book_pdf', args=[self.pk]) if self.pdf_file else None
 
     def get_cover_url(self):
         return self.cover_image.url if self.cover_image else None
@@ -313,6 +319,87 @@ class Book(models.Model):
         }
 
 
+class BookSearchDocument(models.Model):
+    """Normalised search text for a book, kept in sync by api.signals (see api.search_index)"""
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    title = models.TextField(blank=True, default='')
+    author = models.TextField(blank=True, default='')
+    body = models.TextField(blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Search document for book {self.book_id}"
+
+
+class BookTextIngest(models.Model):
+    """Tracks per-page text extraction of a book's PDF (see api.book_text)"""
+    STATUS_CHOICES = [
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True, related_name='text_ingest')
+    pdf_name = models.CharField(max_length=255)
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True, help_text="SHA-256 of the PDF")
+    page_count = models.PositiveIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='done')
+    error = models.TextField(blank=True, default='')
+    ingested_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.book_id}: {self.pdf_name} ({self.status})"
+
+
+class BookPage(models.Model):
+    """Extracted text of a single PDF page, indexed for in-book search"""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='pages')
+    page_number = models.PositiveIntegerField()
+    text = models.TextField(blank=True, default='')
+    search_text = models.TextField(blank=True, default='')
+    has_error = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ['book', 'page_number']
+        unique_together = ['book', 'page_number']
+
+    def __str__(self):
+        return f"{self.book_id} p.{self.page_number}"
+
+
+def audiobook_segment_path(instance, filename):
+    return f"audiobooks/{instance.book_id}/{filename}"
+
+
+class AudioBookSegment(models.Model):
+    """A chapter-sized piece of a book rendered to speech (see api.audiobook)"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='audio_segments')
+    index = models.PositiveIntegerField()
+    title = models.CharField(max_length=200)
+    page_start = models.PositiveIntegerField()
+    page_end = models.PositiveIntegerField()
+    text_hash = models.CharField(max_length=64, help_text="SHA-256 of the rendered text and voice settings")
+    voice_lang = models.CharField(max_length=10, default='en')
+    voice_speed = models.FloatField(default=1.0)
+    audio_file = models.FileField(upload_to=audiobook_segment_path, blank=True, null=True)
+    duration_seconds = models.FloatField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    error = models.TextField(blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['book', 'index']
+        unique_together = ['book', 'index']
+
+    def __str__(self):
+        return f"{self.book_id} #{self.index}: {self.title} ({self.status})"
+
+
 class BookTag(models.Model):
     name = models.CharField(max_length=100, unique=True)
     color = models.CharField(max_length=7, default='#6B7280')
@@ -432,6 +519,7 @@ class Project(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [models.Index(fields=['views'])]  # most viewed (api.analytics)
 
     def __str__(self):
         return self.title
@@ -535,6 +623,10 @@ class Payment(models.Model):
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHODS)
     transaction_id = models.CharField(max_length=100, unique=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    phone_number = models.CharField(max_length=20, blank=True, default='')
+    account_number = models.CharField(max_length=50, blank=True, default='')
+    # Gateway data and the exchange rate applied (see api.exchange_rates)
+    payment_details = models.JSONField(default=dict, blank=True)
     
     # Additional fields for rental tracking
     rental_duration_weeks = models.PositiveIntegerField(null=True, blank=True)
@@ -654,4 +746,176 @@ class SellerAnalytics(models.Model):
     last_updated = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"Analytics for {self.seller.business_name or self.seller.user.username}"
\ No newline at end of file
+        return f"Analytics for {self.seller.business_name or self.seller.user.username}"
+
+# -------------------------------
+# Background jobs (see api.jobs)
+# -------------------------------
+class BackgroundJob(models.Model):
+    """A unit of work queued in the database and run by ``manage.py run_jobs``"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=1)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='background_jobs')
+    worker = models.CharField(max_length=100, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    def __str__(self):
+        return f"{self.kind} {self.id} ({self.status})"
+
+    @property
+    def percent(self):
+        if self.status == 'done':
+            return 100
+        return int(self.progress * 100 / self.total) if self.total else 0
+
+
+class StatCounter(models.Model):
+    """A materialised dashboard statistic (see api.stats)"""
+    name = models.CharField(max_length=100, primary_key=True)
+    value = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+
+class AnalyticsRollup(models.Model):
+    """An hourly or daily total of one analytics metric (see api.analytics)"""
+    GRANULARITY_CHOICES = [
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    ]
+
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    bucket_start = models.DateTimeField()
+    metric = models.CharField(max_length=50)
+    dimension = models.CharField(max_length=50, blank=True, default='')
+    value = models.FloatField(default=0)
+
+    class Meta:
+        unique_together = ('granularity', 'bucket_start', 'metric', 'dimension')
+        indexes = [models.Index(fields=['granularity', 'bucket_start'])]
+
+    def __str__(self):
+        return f"{self.metric}[{self.dimension}] {self.granularity} {self.bucket_start:%Y-%m-%d %H:%M} = {self.value}"
+
+
+class ImageDerivative(models.Model):
+    """Resized WebP/JPEG variants of one uploaded image (see api.thumbnails)"""
+    source = models.CharField(max_length=255, unique=True)
+    content_hash = models.CharField(max_length=64, db_index=True)
+    width = models.PositiveIntegerField(default=0)
+    height = models.PositiveIntegerField(default=0)
+    # {format: {width: storage name}}, e.g. {"webp": {"120": "thumbs/ab/abcd.../120.webp"}}
+    variants = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.source} ({self.width}x{self.height})"
+
+
+class PaymentEvent(models.Model):
+    """A payment gateway webhook, stored on receipt and applied later (see api.payment_events)"""
+    OUTCOME_CHOICES = [
+        ('applied', 'Applied'),
+        ('ignored', 'Ignored'),
+        ('unknown_payment', 'Unknown payment'),
+        ('failed', 'Failed'),
+    ]
+
+    event_id = models.CharField(max_length=64, unique=True)
+    tx_ref = models.CharField(max_length=100, db_index=True)
+    event = models.CharField(max_length=50, blank=True, default='')
+    status = models.CharField(max_length=20)
+    event_time = models.DateTimeField(null=True, blank=True)
+    payload = models.JSONField(default=dict)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    outcome = models.CharField(max_length=20, choices=OUTCOME_CHOICES, blank=True, default='')
+    error = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [models.Index(fields=['processed_at', 'id'])]
+
+    def __str__(self):
+        return f"{self.tx_ref} {self.status} ({self.outcome or 'pending'})"
+
+
+class ActivityEntry(models.Model):
+    """One entry of the admin activity feed (see api.activity_log)"""
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    username = models.CharField(max_length=150, default='System')
+    action = models.CharField(max_length=50)
+    model_name = models.CharField(max_length=50)
+    object_id = models.CharField(max_length=64, blank=True, default='')
+    text = models.CharField(max_length=255)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ['-id']
+
+    def __str__(self):
+        return f"{self.created_at:%Y-%m-%d %H:%M} {self.username}: {self.text}"
+
+
+class WorkerMetrics(models.Model):
+    """Latest runtime metrics snapshot of one web or job worker process (see api.metrics)"""
+    worker = models.CharField(max_length=150, unique=True)  # host:pid
+    role = models.CharField(max_length=10, default='web')
+    started_at = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    rss_bytes = models.BigIntegerField(default=0)
+    cpu_seconds = models.FloatField(default=0)
+    data = models.JSONField(default=dict)
+
+    def __str__(self):
+        return f"{self.role} worker {self.worker}"
+
+
+class ProfileCapture(models.Model):
+    """A sampled profile of one request (see api.profiling)"""
+    TRIGGER_CHOICES = [
+        ('sampled', 'Sampled'),
+        ('header', 'Signed header'),
+    ]
+
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    view = models.CharField(max_length=200, blank=True, default='')
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    duration_ms = models.FloatField()
+    samples = models.PositiveIntegerField(default=0)
+    interval_ms = models.FloatField()
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    pstats_file = models.FileField(upload_to='profiles/')
+    collapsed_file = models.FileField(upload_to='profiles/')
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms, {self.samples} samples)"
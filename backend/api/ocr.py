@@ -0,0 +1,288 @@
+"""
+Text extraction for scanned exam papers and lesson PDFs.
+
+PDF pages with an embedded text layer are read directly with PyMuPDF; pages
+without one are rendered and OCR'd with tesseract (optionally after
+binarising them with OpenCV). Rendering and OCR are CPU-bound, so pages are
+spread over a process pool whose workers each open the document once.
+
+OCR output is cached on disk per (document hash, page, DPI, threshold), so
+re-uploading the same paper or re-analysing a PDF never OCRs a page twice.
+The cache lives in ``MEDIA_ROOT/ocr_cache`` inside Django and in
+``~/.cache/elibrary-ocr`` for standalone tools such as ``pdf_processor``.
+It is bounded like the TTS cache: files are touched on every hit, files
+unused for ``OCR_CACHE_MAX_AGE`` seconds (default 90 days) are deleted, and
+the least recently used ones go once it exceeds ``OCR_CACHE_MAX_BYTES``
+(default 200 MB).
+
+This module must stay importable without Django being set up: pool workers
+import it in a fresh process.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import BytesIO
+from multiprocessing import get_context
+
+logger = logging.getLogger(__name__)
+
+OCR_THRESHOLD = 150
+OCR_DPI = 72
+MAX_OCR_WORKERS = 4
+CACHE_ROOT = 'ocr_cache'  # under MEDIA_ROOT
+DEFAULT_CACHE_MAX_BYTES = 200 * 1024 * 1024
+DEFAULT_CACHE_MAX_AGE = 90 * 24 * 3600
+EVICT_INTERVAL = 300  # seconds between cache directory scans per process
+
+# Per-process state of pool workers (see _init_worker)
+_worker_doc = None
+_last_eviction = None
+
+
+def _workers():
+    return max(1, min(MAX_OCR_WORKERS, os.cpu_count() or 1))
+
+
+def _setting(name, default):
+    try:
+        from django.conf import settings
+        if settings.configured:
+            return getattr(settings, name, default)
+    except ImportError:
+        pass
+    return default
+
+
+def cache_dir():
+    media_root = _setting('MEDIA_ROOT', None)
+    if media_root:
+        return os.path.join(media_root, CACHE_ROOT)
+    return os.path.join(os.path.expanduser('~'), '.cache', 'elibrary-ocr')
+
+
+def _cache_path(doc_hash, page_number, dpi, threshold):
+    name = f"p{page_number}-d{dpi}-t{'none' if threshold is None else threshold}.txt"
+    return os.path.join(cache_dir(), doc_hash[:2], doc_hash, name)
+
+
+def cache_get(doc_hash, page_number, dpi, threshold):
+    path = _cache_path(doc_hash, page_number, dpi, threshold)
+    try:
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+    except OSError:
+        return None
+    try:
+        os.utime(path)  # mark as recently used
+    except OSError:
+        pass
+    return text
+
+
+def cache_put(doc_hash, page_number, dpi, threshold, text):
+    path = _cache_path(doc_hash, page_number, dpi, threshold)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write-then-rename so concurrent readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning(f"Could not write OCR cache {path}: {e}")
+
+
+def evict(max_bytes=None, max_age=None):
+    """
+    Delete cached pages unused for ``max_age`` seconds, then the least
+    recently used ones until the cache fits in ``max_bytes``; returns files removed.
+    """
+    if max_bytes is None:
+        max_bytes = _setting('OCR_CACHE_MAX_BYTES', DEFAULT_CACHE_MAX_BYTES)
+    if max_age is None:
+        max_age = _setting('OCR_CACHE_MAX_AGE', DEFAULT_CACHE_MAX_AGE)
+    expired_before = time.time() - max_age
+
+    files = []
+    total = 0
+    for dirpath, _, filenames in os.walk(cache_dir()):
+        for filename in filenames:
+            if not filename.endswith('.txt'):
+                continue
+            path = os.path.join(dirpath, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+    removed = 0
+    for mtime, size, path in sorted(files):
+        if mtime >= expired_before and total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        removed += 1
+        total -= size
+        doc_dir = os.path.dirname(path)
+        for directory in (doc_dir, os.path.dirname(doc_dir)):  # <hash>/ and <hash[:2]>/ once empty
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+    if removed:
+        logger.info(f"Evicted {removed} cached OCR pages")
+    return removed
+
+
+def maybe_evict():
+    """Run ``evict`` at most once every ``EVICT_INTERVAL`` seconds per process."""
+    global _last_eviction
+    now = time.monotonic()
+    if _last_eviction is not None and now - _last_eviction < EVICT_INTERVAL:
+        return 0
+    _last_eviction = now
+    try:
+        return evict()
+    except Exception as e:
+        logger.error(f"OCR cache eviction failed: {str(e)}")
+        return 0
+
+
+def binarize(image, threshold=OCR_THRESHOLD):
+    """Grayscale + fixed threshold, which cleans up photocopied exam pages."""
+    import cv2
+    import numpy as np
+    from PIL import Image
+
+    gray = cv2.cvtColor(np.array(image.convert('RGB')), cv2.COLOR_RGB2GRAY)
+    _, thresh = cv2.threshold(gray, threshold, 255, cv2.THRESH_BINARY)
+    return Image.fromarray(thresh)
+
+
+def ocr_image(image, threshold=OCR_THRESHOLD):
+    """OCR a PIL image; ``threshold=None`` skips binarisation."""
+    import pytesseract
+
+    if threshold is not None:
+        image = binarize(image, threshold)
+    return pytesseract.image_to_string(image)
+
+
+def ocr_bytes(image_bytes, threshold=OCR_THRESHOLD):
+    """OCR an encoded image (PNG, JPEG, ...), cached by its content hash."""
+    from PIL import Image
+
+    doc_hash = hashlib.sha256(image_bytes).hexdigest()
+    text = cache_get(doc_hash, 1, 0, threshold)
+    if text is None:
+        text = ocr_image(Image.open(BytesIO(image_bytes)), threshold)
+        cache_put(doc_hash, 1, 0, threshold, text)
+        maybe_evict()
+    return text
+
+
+def _read(source):
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    with open(source, 'rb') as f:
+        return f.read()
+
+
+def pdf_page_count(source):
+    import fitz
+
+    with fitz.open(stream=_read(source), filetype='pdf') as doc:
+        return doc.page_count
+
+
+def _render_and_ocr(doc, index, dpi, threshold):
+    from PIL import Image
+
+    png = doc[index].get_pixmap(dpi=dpi).tobytes('png')
+    return ocr_image(Image.open(BytesIO(png)), threshold)
+
+
+def _init_worker(data):
+    global _worker_doc
+    import fitz
+
+    _worker_doc = fitz.open(stream=data, filetype='pdf')
+
+
+def _ocr_worker_page(index, dpi, threshold):
+    return _render_and_ocr(_worker_doc, index, dpi, threshold)
+
+
+def pdf_page_texts(source, on_page=None, dpi=OCR_DPI, threshold=OCR_THRESHOLD, max_workers=None):
+    """
+    Return the text of every page of a PDF (``source`` is a path or bytes).
+
+    ``on_page(done, total)`` is called in the calling thread as pages finish,
+    so callers can report progress. Cached pages are never OCR'd again; the
+    rest are OCR'd on a process pool when there is more than one.
+    """
+    import fitz
+
+    data = _read(source)
+    doc_hash = hashlib.sha256(data).hexdigest()
+
+    missing = []
+    with fitz.open(stream=data, filetype='pdf') as doc:
+        total = doc.page_count
+        texts = [''] * total
+        for index, page in enumerate(doc):
+            texts[index] = page.get_text().strip()
+            if not texts[index]:
+                cached = cache_get(doc_hash, index + 1, dpi, threshold)
+                if cached is None:
+                    missing.append(index)
+                else:
+                    texts[index] = cached
+
+        done = total - len(missing)
+        if on_page and done:
+            on_page(done, total)
+
+        workers = min(max_workers or _workers(), len(missing))
+        if workers <= 1:
+            # Not worth starting a pool for a single page
+            for index in missing:
+                texts[index] = _ocr_and_cache(lambda: _render_and_ocr(doc, index, dpi, threshold),
+                                              doc_hash, index, dpi, threshold)
+                done += 1
+                if on_page:
+                    on_page(done, total)
+            if missing:
+                maybe_evict()
+            return texts
+
+    # Spawned workers don't inherit the caller's threads, DB connections or locks
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'),
+                             initializer=_init_worker, initargs=(data,)) as pool:
+        futures = {pool.submit(_ocr_worker_page, index, dpi, threshold): index for index in missing}
+        for future in as_completed(futures):
+            index = futures[future]
+            texts[index] = _ocr_and_cache(future.result, doc_hash, index, dpi, threshold)
+            done += 1
+            if on_page:
+                on_page(done, total)
+    maybe_evict()
+    return texts
+
+
+def _ocr_and_cache(run, doc_hash, index, dpi, threshold):
+    """Run one page's OCR; failures yield '' and are not cached, so they are retried next time."""
+    try:
+        text = run()
+    except Exception as e:
+        logger.warning(f"OCR failed on page {index + 1}: {e}")
+        return ''
+    cache_put(doc_hash, index + 1, dpi, threshold, text)
+    return text
@@ -0,0 +1,118 @@
+"""
+Keyset (cursor) pagination.
+
+``KeysetPagination`` pages through a queryset ordered by one sortable column
+plus the primary key as a tie-breaker, e.g. ``(created_at, id)``. The
+opaque ``cursor`` encodes the last row's ``(value, id)``, so fetching page
+1000 costs the same indexed range scan as page 1, unlike offset pagination.
+
+Pagination is opt-in so existing clients keep receiving plain lists: it is
+applied only when the request has a ``cursor`` or ``page_size`` parameter.
+
+A queryset annotated with ``search_rank`` (``?q=``, see api.search_index)
+is paged in relevance order over ``(search_rank, pk)`` unless the request
+passes an explicit ``ordering``.
+"""
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination over ``(<ordering field>, pk)``; see the module docstring."""
+    page_size = 20
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering_query_param = 'ordering'
+    default_ordering = '-created_at'
+    ordering_fields = ('created_at',)
+    rank_annotation = 'search_rank'
+
+    def get_ordering(self, request, view, queryset=None):
+        ordering = request.query_params.get(self.ordering_query_param)
+        if not ordering and queryset is not None and self.rank_annotation in queryset.query.annotations:
+            return self.rank_annotation
+        ordering = ordering or self.default_ordering
+        ordering = ordering.split(',')[0].strip()
+        allowed = getattr(view, 'keyset_ordering_fields', self.ordering_fields)
+        if ordering.lstrip('-') not in allowed:
+            raise ValidationError({self.ordering_query_param: f"Cursor pagination can order by: {', '.join(allowed)}"})
+        return ordering
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, value, pk):
+        raw = json.dumps([value, pk], separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, cursor, field):
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            return field.to_python(value), int(pk)
+        except (ValueError, TypeError, DjangoValidationError):
+            raise NotFound('Invalid cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+
+        ordering = self.get_ordering(request, view, queryset)
+        name = ordering.lstrip('-')
+        descending = ordering.startswith('-')
+        annotation = queryset.query.annotations.get(name)
+        if annotation is not None:
+            field = annotation.output_field
+        else:
+            try:
+                field = queryset.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                raise ValidationError({self.ordering_query_param: f"Unknown field: {name}"})
+
+        queryset = queryset.order_by(ordering, '-pk' if descending else 'pk')
+        cursor = params.get(self.cursor_query_param)
+        if cursor:
+            value, pk = self.decode_cursor(cursor, field)
+            after = 'lt' if descending else 'gt'
+            queryset = queryset.filter(Q(**{f'{name}__{after}': value}) | Q(**{name: value, f'pk__{after}': pk}))
+
+        page_size = self.get_page_size(request)
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page = rows[:page_size]
+        self.request = request
+        self.next_cursor = None
+        if self.has_next:
+            last = self.page[-1]
+            value = getattr(last, name) if annotation is not None else field.value_to_string(last)
+            self.next_cursor = self.encode_cursor(value, last.pk)
+        return self.page
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'next_cursor': self.next_cursor,
+            'results': data,
+        })
+
+
+class BookKeysetPagination(KeysetPagination):
+    ordering_fields = ('created_at', 'updated_at', 'title', 'author', 'views', 'downloads', 'rating',
+                       'price', 'hard_price', 'soft_price')
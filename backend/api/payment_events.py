@@ -0,0 +1,215 @@
+"""
+Chapa webhook inbox.
+
+The webhook view only validates the callback and appends it to the
+``PaymentEvent`` inbox (``record``), keyed by an event id (the payload's
+``id`` or a hash of the whole payload), so the gateway is acknowledged after
+a single INSERT and a retried delivery of the same event is a no-op.
+
+A ``payment_events`` background job (queued by ``record`` when none is
+waiting, or run with ``manage.py process_payment_events``) then applies the
+inbox in batches (``process_pending``):
+
+* events are applied per payment in event-time order, and a payment's
+  status only moves forward (pending -> failed -> completed -> refunded), so
+  duplicates, late retries and out-of-order deliveries are ignored;
+* payments are written with one ``bulk_update`` per batch (dashboard
+  counters are adjusted with the summed deltas, see api.stats), and the
+  completed ones get their ``UserPurchase`` rows in one bulk create/update.
+
+Batches are claimed with ``SELECT ... FOR UPDATE SKIP LOCKED`` where the
+database supports it, so several workers can drain the inbox.
+"""
+import hashlib
+import json
+import logging
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import entitlements, jobs, stats
+from .models import BackgroundJob, Payment, PaymentEvent, UserPurchase
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+# Chapa status -> Payment.status
+STATUS_MAP = {
+    'pending': 'pending',
+    'failed': 'failed',
+    'cancelled': 'failed',
+    'timeout': 'failed',
+    'success': 'completed',
+}
+# A payment's status never moves to a lower rank
+STATUS_RANK = {'pending': 0, 'failed': 1, 'completed': 2, 'refunded': 3}
+
+
+def event_id_for(payload):
+    if payload.get('id'):
+        return str(payload['id'])[:64]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def record(payload, data):
+    """
+    Append a validated webhook (``data``: ChapaWebhookSerializer output) to the
+    inbox; returns ``(event, created)``. Queues the processing job for new events.
+    """
+    event = PaymentEvent(
+        event_id=event_id_for(payload),
+        tx_ref=data['tx_ref'],
+        event=data.get('event', ''),
+        status=data['status'],
+        event_time=data.get('event_time'),
+        payload=payload,
+    )
+    try:
+        with transaction.atomic():
+            event.save()
+    except IntegrityError:
+        return PaymentEvent.objects.get(event_id=event.event_id), False
+    schedule_processing()
+    return event, True
+
+
+def schedule_processing():
+    # One queued job drains everything received until it runs
+    if not BackgroundJob.objects.filter(kind='payment_events', status='queued').exists():
+        jobs.enqueue('payment_events', max_attempts=3)
+
+
+def run_payment_events_job(job):
+    """Job handler (kind ``payment_events``): apply every pending inbox event."""
+    return process_pending()
+
+
+def process_pending(batch_size=BATCH_SIZE):
+    """Apply pending events batch by batch; returns ``{outcome: count}``."""
+    totals = {}
+    while True:
+        with transaction.atomic():
+            events = list(
+                PaymentEvent.objects.select_for_update(skip_locked=True)
+                .filter(processed_at__isnull=True).order_by('id')[:batch_size]
+            )
+            if not events:
+                return totals
+            try:
+                with transaction.atomic():
+                    apply_events(events)
+            except Exception as e:
+                logger.error(f"Payment event batch failed, applying events one by one: {str(e)}")
+                for event in events:
+                    try:
+                        with transaction.atomic():
+                            apply_events([event])
+                    except Exception as e:
+                        logger.error(f"Payment event {event.event_id} failed: {str(e)}")
+                        event.outcome, event.error, event.processed_at = 'failed', str(e), timezone.now()
+                        event.save(update_fields=['outcome', 'error', 'processed_at'])
+        for event in events:
+            totals[event.outcome] = totals.get(event.outcome, 0) + 1
+
+
+def _event_time(event):
+    return event.event_time or event.received_at
+
+
+def apply_events(events):
+    """Apply ``events`` (any order) to their payments and mark them processed."""
+    payments = {
+        payment.transaction_id: payment
+        for payment in Payment.objects.select_for_update().filter(transaction_id__in={e.tx_ref for e in events})
+    }
+    now = timezone.now()
+    changed, old_contributions = {}, {}
+
+    for event in sorted(events, key=lambda e: (e.tx_ref, _event_time(e), e.pk)):
+        event.processed_at = now
+        payment = payments.get(event.tx_ref)
+        if payment is None:
+            event.outcome = 'unknown_payment'
+            continue
+
+        details = payment.payment_details or {}
+        new_status = STATUS_MAP.get(event.status)
+        last_applied = details.get('last_event_time')
+        if (new_status is None
+                or STATUS_RANK[new_status] <= STATUS_RANK.get(payment.status, 0)
+                or (last_applied and _event_time(event) < datetime.fromisoformat(last_applied))):
+            event.outcome = 'ignored'
+            continue
+
+        old_contributions.setdefault(payment.pk, stats.contributions(payment))
+        payment.status = new_status
+        payment.payment_details = {
+            **details,
+            'chapa_reference': event.payload.get('reference'),
+            'webhook_event': event.event,
+            'webhook_time': event.event_time.isoformat() if event.event_time else None,
+            'customer_phone': event.payload.get('customer_phone_number'),
+            'last_event_time': _event_time(event).isoformat(),
+        }
+        payment.updated_at = now
+        changed[payment.pk] = payment
+        event.outcome = 'applied'
+
+    if changed:
+        Payment.objects.bulk_update(changed.values(), ['status', 'payment_details', 'updated_at'])
+        # bulk_update bypasses the signals that keep the dashboard counters current
+        deltas = {}
+        for pk, payment in changed.items():
+            for name, delta in stats.diff(old_contributions[pk], stats.contributions(payment)).items():
+                deltas[name] = deltas.get(name, 0) + delta
+        stats.apply_deltas(deltas)
+        grant_entitlements([payment for payment in changed.values() if payment.status == 'completed'])
+
+    PaymentEvent.objects.bulk_update(events, ['processed_at', 'outcome'])
+
+
+def purchase_terms(payment):
+    """``(purchase_type, expires_at)`` of the ``UserPurchase`` a completed payment grants."""
+    purchase_type = 'hard' if payment.payment_type == 'purchase_hard' else 'soft'
+    expires_at = None
+    if payment.payment_type == 'rental' and payment.rental_end_date:
+        # Through the last day of the rental
+        expires_at = timezone.make_aware(datetime.combine(payment.rental_end_date + timedelta(days=1), time.min))
+    return purchase_type, expires_at
+
+
+def grant_entitlements(payments):
+    """Create or update the ``UserPurchase`` rows for completed ``payments`` in bulk."""
+    if not payments:
+        return
+    terms = {}
+    for payment in payments:
+        purchase_type, expires_at = purchase_terms(payment)
+        terms[(payment.user_id, payment.book_id, purchase_type)] = (payment, expires_at)
+
+    existing = {
+        (purchase.user_id, purchase.book_id, purchase.purchase_type): purchase
+        for purchase in UserPurchase.objects.filter(
+            user_id__in={key[0] for key in terms}, book_id__in={key[1] for key in terms},
+        )
+    }
+    to_create, to_update = [], []
+    for key, (payment, expires_at) in terms.items():
+        purchase = existing.get(key)
+        if purchase is None:
+            to_create.append(UserPurchase(
+                user_id=key[0], book_id=key[1], purchase_type=key[2], payment=payment, expires_at=expires_at,
+            ))
+        else:
+            purchase.payment = payment
+            if expires_at:
+                purchase.expires_at = expires_at
+            to_update.append(purchase)
+    UserPurchase.objects.bulk_create(to_create)
+    UserPurchase.objects.bulk_update(to_update, ['payment', 'expires_at'])
+
+    # Bulk writes skip the signal that drops cached entitlements
+    for user_id in {key[0] for key in terms}:
+        transaction.on_commit(lambda user_id=user_id: entitlements.invalidate(user_id))
@@ -0,0 +1,48 @@
+"""
+Page and word summary of an uploaded PDF (``GET /api/pdfs/<id>/analyze/``).
+
+Scanned pages have to be OCR'd (see api.ocr), which can take minutes, so the
+summary is built by the ``analyze_pdf`` background job (see api.jobs) rather
+than in the request. The endpoint queues the job and answers 202 with its
+progress until a result exists for the PDF's current file.
+"""
+import os
+
+from . import ocr
+from .jobs import update_progress
+from .models import BackgroundJob, UploadedPDF
+
+PREVIEW_WORDS = 100
+
+
+def summarize(pdf, pages):
+    words = ' '.join(pages).split()
+    return {
+        'id': pdf.id,
+        'filename': os.path.basename(pdf.document.name) if pdf.document else None,
+        'page_count': len(pages),
+        'empty_pages': [number for number, text in enumerate(pages, start=1) if not text.strip()],
+        'word_count': len(words),
+        'preview': ' '.join(words[:PREVIEW_WORDS]),
+    }
+
+
+def _jobs(pdf):
+    return BackgroundJob.objects.filter(kind='analyze_pdf', payload__pdf_id=pdf.pk, payload__document=pdf.document.name)
+
+
+def latest_job(pdf):
+    """The newest ``analyze_pdf`` job for ``pdf``'s current file, or None."""
+    return _jobs(pdf).order_by('-created_at').first()
+
+
+def active_job(pdf):
+    """The queued or running ``analyze_pdf`` job for ``pdf``'s current file, or None."""
+    return _jobs(pdf).filter(status__in=['queued', 'running']).order_by('-created_at').first()
+
+
+def run_analyze_pdf_job(job):
+    """Job handler (kind ``analyze_pdf``): payload ``{"pdf_id": <id>, "document": <file name>}``."""
+    pdf = UploadedPDF.objects.get(pk=job.payload['pdf_id'])
+    pages = ocr.pdf_page_texts(pdf.document.path, on_page=lambda done, total: update_progress(job, done, total))
+    return summarize(pdf, pages)
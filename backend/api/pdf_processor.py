@@ -2,49 +2,45 @@ import os
 import re
 import json
 import random
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
+from functools import lru_cache
 from typing import List, Dict
-import pdfplumber
-import pytesseract
-from PIL import Image, ImageTk
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak, Image as RLImage
-from reportlab.lib.units import inch
-from reportlab.lib.enums import TA_CENTER
-from nltk.tokenize import sent_tokenize, word_tokenize
-from nltk.corpus import stopwords
+
+# tkinter, reportlab and NLTK are imported where they are used, so the text
+# helpers can be imported by headless code without loading them.
+
+try:
+    from .ocr import pdf_page_texts
+except ImportError:  # run directly as a script: python api/pdf_processor.py
+    from ocr import pdf_page_texts
 
 # -----------------------
 # Configuration / Globals
 # -----------------------
-STOP = set(stopwords.words("english"))
+@lru_cache(maxsize=None)
+def stop_words() -> frozenset:
+    from nltk.corpus import stopwords
+    return frozenset(stopwords.words("english"))
+
 DEFAULT_OUTPUT_DIR = "student_ai_output"
 
 # -----------------------
 # Text extraction & helpers
 # -----------------------
 def extract_text(pdf_path: str) -> str:
-    """Extract text from PDF, with OCR fallback for scanned pages."""
-    text = ""
-    with pdfplumber.open(pdf_path) as doc:
-        for p in doc.pages:
-            t = p.extract_text()
-            if not t or not t.strip():
-                # OCR fallback
-                pil_img = p.to_image(resolution=200).original
-                t = pytesseract.image_to_string(pil_img)
-            text += " " + (t or "")
+    """Extract text from PDF, with OCR fallback for scanned pages (parallel and cached, see ocr.py)."""
+    text = " ".join(pdf_page_texts(pdf_path, dpi=200, threshold=None))
     text = re.sub(r"\s+", " ", text).strip()
     return text
 
 def make_summary(text: str, lines: int = 3) -> str:
+    from nltk.tokenize import sent_tokenize
     sents = sent_tokenize(text)
     return " ".join(sents[:lines]) if sents else ""
 
 def make_concepts(text: str, max_terms: int = 10) -> List[str]:
-    words = [w.lower() for w in word_tokenize(text) if w.isalpha() and w.lower() not in STOP]
+    from nltk.tokenize import word_tokenize
+    stop = stop_words()
+    words = [w.lower() for w in word_tokenize(text) if w.isalpha() and w.lower() not in stop]
     freq = {}
     for w in words:
         freq[w] = freq.get(w, 0) + 1
@@ -52,12 +48,14 @@ def make_concepts(text: str, max_terms: int = 10) -> List[str]:
     return sorted_terms[:max_terms]
 
 def make_quiz(text: str, n: int = 8, difficulty: str = "medium") -> List[Dict[str,str]]:
+    from nltk.tokenize import sent_tokenize, word_tokenize
+    stop = stop_words()
     sents = [s for s in sent_tokenize(text) if 6 < len(s.split()) < 35]
     random.shuffle(sents)
     quiz = []
     length_cut = {"easy": 4, "medium": 6, "hard": 8}.get(difficulty, 6)
     for s in sents:
-        words = [w for w in word_tokenize(s) if w.isalpha() and w.lower() not in STOP]
+        words = [w for w in word_tokenize(s) if w.isalpha() and w.lower() not in stop]
         candidates = [w for w in words if len(w) >= length_cut]
         if not candidates:
             continue
@@ -80,6 +78,12 @@ def make_flashcards(concepts: List[str]) -> List[Dict[str,str]]:
 # -----------------------
 def build_pdf(summary: str, quiz: List[Dict[str,str]], concepts: List[str],
               out_pdf: str, logo_path: str = None, color_mode: str = "plain", teacher_mode: bool = False):
+    from reportlab.lib.enums import TA_CENTER
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak, Image as RLImage
+
     doc = SimpleDocTemplate(out_pdf, pagesize=letter,
                             rightMargin=50, leftMargin=50, topMargin=60, bottomMargin=50)
     styles = getSampleStyleSheet()
@@ -127,8 +131,16 @@ def build_pdf(summary: str, quiz: List[Dict[str,str]], concepts: List[str],
 # -----------------------
 # GUI application
 # -----------------------
+def load_gui_modules():
+    """Import tkinter (unavailable on most servers) into this module's globals."""
+    global tk, ttk, filedialog, messagebox
+    import tkinter as tk
+    from tkinter import ttk, filedialog, messagebox
+
+
 class AIStudentAssistantGUI:
     def __init__(self, root):
+        load_gui_modules()
         self.root = root
         root.title("AI Student Assistant")
         root.geometry("720x520")
@@ -331,6 +343,7 @@ class AIStudentAssistantGUI:
 # Run app
 # -----------------------
 def main():
+    load_gui_modules()
     root = tk.Tk()
     app = AIStudentAssistantGUI(root)
     root.mainloop()
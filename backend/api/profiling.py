@@ -0,0 +1,285 @@
+"""
+On-demand sampling profiler for live requests.
+
+``ProfilingMiddleware`` profiles a request when
+
+* it is picked by sampling: a ``PROFILING_SAMPLE_RATE`` fraction of
+  requests (default 0, off), optionally only for the URL names in
+  ``PROFILING_VIEWS``, and at most one at a time per worker; or
+* it carries a valid ``X-Profile-Token`` header, signed for an admin by
+  ``issue_token`` (``POST /api/admin/profiles/token/``) and valid for
+  ``PROFILING_TOKEN_MAX_AGE`` seconds. The response then carries the
+  capture's id in ``X-Profile-Id``.
+
+While the request runs, a sampler thread records the request thread's
+Python stack every ``PROFILING_INTERVAL`` seconds (default 5 ms), so the
+overhead stays small and doesn't depend on how many calls the view makes.
+Each capture is a ``ProfileCapture`` row with two files under
+``MEDIA_ROOT/profiles`` (which api.file_delivery does not serve publicly):
+
+* ``.prof``, a pstats file (``python -m pstats``, snakeviz) built from the
+  samples: times are sample counts times the interval, and call counts are
+  sample counts;
+* ``.collapsed.txt``, one ``frame;frame;... count`` line per distinct stack,
+  the input of flamegraph.pl and speedscope; ``flamegraph_svg`` renders it
+  for the admin download endpoint.
+
+Only the newest ``PROFILING_MAX_CAPTURES`` captures are kept.
+"""
+import logging
+import marshal
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter
+from html import escape
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.base import ContentFile
+from django.urls import Resolver404, resolve, reverse
+
+from .models import ProfileCapture
+
+logger = logging.getLogger(__name__)
+
+ROOT = 'profiles'
+HEADER = 'X-Profile-Token'
+TOKEN_SALT = 'api.profiling'
+DEFAULT_INTERVAL = 0.005
+DEFAULT_TOKEN_MAX_AGE = 3600
+DEFAULT_MAX_CAPTURES = 200
+FORMATS = ('pstats', 'collapsed', 'flamegraph')
+
+# Sampled captures in flight in this process (header captures are always taken)
+_sampling = threading.BoundedSemaphore(1)
+
+
+class Sampler(threading.Thread):
+    """Counts the stacks of thread ``thread_id`` every ``interval`` seconds until ``stop``."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()  # (code key, ...) root first -> samples
+        self.finished = threading.Event()
+
+    def run(self):
+        while not self.finished.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def stop(self):
+        self.finished.set()
+        self.join()
+
+
+def issue_token(user):
+    """A signed ``X-Profile-Token`` value for admin ``user``."""
+    return signing.dumps({'user': user.pk}, salt=TOKEN_SALT)
+
+
+def token_user_id(token):
+    """The id of the admin ``token`` was issued to, or None if it is invalid or expired."""
+    try:
+        data = signing.loads(
+            token, salt=TOKEN_SALT,
+            max_age=getattr(settings, 'PROFILING_TOKEN_MAX_AGE', DEFAULT_TOKEN_MAX_AGE),
+        )
+    except signing.BadSignature:  # includes SignatureExpired
+        return None
+    return data.get('user')
+
+
+def frame_label(key):
+    filename, line, name = key
+    base = str(settings.BASE_DIR)
+    if filename.startswith(base):
+        filename = os.path.relpath(filename, base)
+    elif 'site-packages' in filename:
+        filename = filename.split('site-packages', 1)[1].lstrip(os.sep)
+    return f"{name} ({filename}:{line})".replace(';', ':')
+
+
+def collapsed(stacks):
+    """``stacks`` as collapsed-stack text, one ``frame;frame;... count`` line per stack."""
+    lines = [f"{';'.join(frame_label(key) for key in stack)} {count}" for stack, count in stacks.items()]
+    return '\n'.join(sorted(lines)) + '\n'
+
+
+def parse_collapsed(text):
+    """``{(frame label, ...): samples}`` from collapsed-stack text."""
+    stacks = Counter()
+    for line in text.splitlines():
+        stack, _, count = line.rpartition(' ')
+        if stack:
+            stacks[tuple(stack.split(';'))] += int(count)
+    return stacks
+
+
+def pstats_data(stacks, interval):
+    """A ``pstats.Stats``-loadable dict built from sampled ``stacks`` (see the module docstring)."""
+    stats = {}  # code key -> [primitive calls, calls, own time, cumulative time, {caller: calls}]
+    for stack, count in stacks.items():
+        for key in set(stack):  # recursive frames count once per sample
+            entry = stats.setdefault(key, [0, 0, 0.0, 0.0, {}])
+            entry[0] += count
+            entry[1] += count
+            entry[3] += count * interval
+        stats[stack[-1]][2] += count * interval
+        for caller, callee in set(zip(stack, stack[1:])):
+            callers = stats[callee][4]
+            callers[caller] = callers.get(caller, 0) + count
+    return {key: tuple(entry) for key, entry in stats.items()}
+
+
+def flamegraph_svg(stacks, width=1200, row_height=16):
+    """A flame graph (root at the top) of ``{(frame label, ...): samples}`` as an SVG document."""
+    root = {'value': 0, 'children': {}}
+    for stack, count in stacks.items():
+        root['value'] += count
+        node = root
+        for label in stack:
+            node = node['children'].setdefault(label, {'value': 0, 'children': {}})
+            node['value'] += count
+    total = root['value'] or 1
+
+    rects, depth_reached = [], 0
+    pending = [(root, 0.0, 0)]
+    while pending:
+        node, x, depth = pending.pop()
+        for label, child in sorted(node['children'].items()):
+            w = child['value'] / total * width
+            if w >= 0.5:  # narrower frames would not be visible
+                depth_reached = max(depth_reached, depth + 1)
+                hue = zlib.crc32(label.split(' (')[0].encode())
+                fill = f'rgb({205 + hue % 50},{hue % 200},{55 + hue % 30})'
+                text = label[:int(w / 7)]
+                title = f'{label} ({child["value"]} samples, {child["value"] / total:.1%})'
+                rects.append(
+                    f'<g><title>{escape(title)}</title>'
+                    f'<rect x="{x:.1f}" y="{depth * row_height}" width="{w:.1f}" height="{row_height - 1}" fill="{fill}"/>'
+                    + (f'<text x="{x + 3:.1f}" y="{depth * row_height + 11}">{escape(text)}</text>' if len(text) > 2 else '')
+                    + '</g>'
+                )
+                pending.append((child, x, depth + 1))
+            x += w
+    height = max(depth_reached, 1) * row_height
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'font-family="monospace" font-size="11">{"".join(rects)}</svg>'
+    )
+
+
+def save_capture(request, response, elapsed, sampler, trigger, user_id=None):
+    """Store ``sampler``'s profile of ``request`` and return the ``ProfileCapture``."""
+    match = getattr(request, 'resolver_match', None)
+    name = uuid.uuid4().hex
+    capture = ProfileCapture(
+        method=request.method[:10],
+        path=request.path[:500],
+        view=(match.view_name if match is not None else '')[:200],
+        status_code=response.status_code if response is not None else None,
+        duration_ms=elapsed * 1000,
+        samples=sum(sampler.stacks.values()),
+        interval_ms=sampler.interval * 1000,
+        trigger=trigger,
+        requested_by_id=user_id,
+    )
+    capture.pstats_file.save(f'{name}.prof', ContentFile(marshal.dumps(pstats_data(sampler.stacks, sampler.interval))), save=False)
+    capture.collapsed_file.save(f'{name}.collapsed.txt', ContentFile(collapsed(sampler.stacks).encode('utf-8')), save=False)
+    capture.save()
+    prune()
+    return capture
+
+
+def prune(max_captures=None):
+    """Delete all but the newest ``max_captures`` captures and their files; returns the count."""
+    max_captures = max_captures or getattr(settings, 'PROFILING_MAX_CAPTURES', DEFAULT_MAX_CAPTURES)
+    stale = list(ProfileCapture.objects.order_by('-created_at', '-id')[max_captures:])
+    for capture in stale:
+        capture.pstats_file.delete(save=False)
+        capture.collapsed_file.delete(save=False)
+        capture.delete()
+    return len(stale)
+
+
+def serialize_capture(capture, request):
+    return {
+        'id': capture.id,
+        'created_at': capture.created_at.isoformat(),
+        'method': capture.method,
+        'path': capture.path,
+        'view': capture.view,
+        'status_code': capture.status_code,
+        'duration_ms': round(capture.duration_ms, 1),
+        'samples': capture.samples,
+        'interval_ms': capture.interval_ms,
+        'trigger': capture.trigger,
+        'requested_by': capture.requested_by.username if capture.requested_by else None,
+        'downloads': {
+            fmt: request.build_absolute_uri(reverse('admin-profile-download', args=[capture.id, fmt]))
+            for fmt in FORMATS
+        },
+    }
+
+
+class ProfilingMiddleware:
+    """See the module docstring."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        user_id = token_user_id(request.headers[HEADER]) if HEADER in request.headers else None
+        if user_id is not None:
+            return self.profile(request, 'header', user_id)
+        if self.sampled(request) and _sampling.acquire(blocking=False):
+            try:
+                return self.profile(request, 'sampled')
+            finally:
+                _sampling.release()
+        return self.get_response(request)
+
+    def sampled(self, request):
+        rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0)
+        if not rate or random.random() >= rate:
+            return False
+        views = getattr(settings, 'PROFILING_VIEWS', ())
+        if not views:
+            return True
+        try:
+            return resolve(request.path_info).view_name in views
+        except Resolver404:
+            return False
+
+    def profile(self, request, trigger, user_id=None):
+        sampler = Sampler(threading.get_ident(), getattr(settings, 'PROFILING_INTERVAL', DEFAULT_INTERVAL))
+        sampler.start()
+        started = time.perf_counter()
+        response = None
+        try:
+            response = self.get_response(request)
+        finally:
+            elapsed = time.perf_counter() - started
+            sampler.stop()
+            if trigger == 'header' or sampler.stacks:
+                try:
+                    capture = save_capture(request, response, elapsed, sampler, trigger, user_id)
+                except Exception as e:
+                    logger.error(f"Could not store the profile of {request.path}: {str(e)}")
+                else:
+                    if response is not None and trigger == 'header':
+                        response['X-Profile-Id'] = str(capture.id)
+        return response
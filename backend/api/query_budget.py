@@ -0,0 +1,158 @@
+"""
+Per-request SQL budget.
+
+``QueryBudgetMiddleware`` reads the count and duration of a request's
+queries from the ``QueryStats`` that api.metrics' middleware records them
+in (``request.query_stats``), which also keeps the SQL of the first
+``SQL_BUDGET_KEPT_QUERIES`` queries (default 200). When a request goes over
+its budget, more than
+``SQL_BUDGET_MAX_QUERIES`` queries (default 50) or longer than
+``SQL_BUDGET_MAX_SECONDS`` (default 1), it is logged as a warning on the
+``api.query_budget`` logger with:
+
+* its query fingerprints (literals and ``IN``/``VALUES`` lists collapsed),
+  costliest first, with how often each ran and for how long;
+* repeated queries: one fingerprint run ``SQL_BUDGET_REPEAT_THRESHOLD``
+  times or more (default 5), the usual sign of an N+1 loop, and exact
+  duplicates (same SQL and parameters), which a lookup could have reused.
+
+Only fingerprints are logged, never parameter values, which can hold
+personal data.
+
+Budgets can be raised or lifted per URL name with ``SQL_BUDGET_OVERRIDES``,
+e.g. ``{'seller_orders': {'queries': 100, 'seconds': None}}`` (unnamed
+routes go by their dotted view path); ``None`` means no limit. Requests
+over budget are also counted in api.metrics.
+
+Every response gets a ``Server-Timing`` header (``db`` time with the query
+count, and ``app`` for the whole request) unless
+``SQL_BUDGET_SERVER_TIMING`` is False.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_QUERIES = 50
+DEFAULT_MAX_SECONDS = 1.0
+DEFAULT_REPEAT_THRESHOLD = 5
+REPORTED_FINGERPRINTS = 5
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+_VALUES_LIST = re.compile(r'\bVALUES\s*\([^)]*\)(?:\s*,\s*\([^)]*\))*', re.IGNORECASE)
+_SPACE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """``sql`` with its literals and placeholders as ``?`` and lists collapsed, so a query's runs match."""
+    sql = _STRING.sub('?', sql.replace('%s', '?'))
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    sql = _VALUES_LIST.sub('VALUES (...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def analyse(queries, repeat_threshold=DEFAULT_REPEAT_THRESHOLD):
+    """
+    Summarise ``(sql, params key, seconds)`` queries (see
+    ``metrics.QueryStats``): ``fingerprints`` as ``(fingerprint, count,
+    seconds)`` costliest first, ``repeated`` (run at least
+    ``repeat_threshold`` times) and ``duplicates`` as ``(fingerprint, count)``,
+    counting the runs that repeated an earlier query with the same parameters.
+    """
+    by_fingerprint = {}
+    for sql, _, seconds in queries:
+        stats = by_fingerprint.setdefault(fingerprint(sql), [0, 0.0])
+        stats[0] += 1
+        stats[1] += seconds
+    fingerprints = sorted(
+        ((text, count, seconds) for text, (count, seconds) in by_fingerprint.items()),
+        key=lambda item: item[2], reverse=True,
+    )
+    duplicates = Counter()
+    for (sql, params_key), count in Counter((sql, key) for sql, key, _ in queries if key is not None).items():
+        if count > 1:
+            duplicates[fingerprint(sql)] += count - 1
+    return {
+        'fingerprints': fingerprints,
+        'repeated': [item for item in fingerprints if item[1] >= repeat_threshold],
+        'duplicates': list(duplicates.items()),
+    }
+
+
+def budget_for(view):
+    """``(max queries, max seconds)`` for URL name ``view``; either may be None (no limit)."""
+    budget = {
+        'queries': getattr(settings, 'SQL_BUDGET_MAX_QUERIES', DEFAULT_MAX_QUERIES),
+        'seconds': getattr(settings, 'SQL_BUDGET_MAX_SECONDS', DEFAULT_MAX_SECONDS),
+        **getattr(settings, 'SQL_BUDGET_OVERRIDES', {}).get(view, {}),
+    }
+    return budget['queries'], budget['seconds']
+
+
+def server_timing(query_count, db_seconds, total_seconds):
+    return f'db;dur={db_seconds * 1000:.1f};desc="{query_count} queries", app;dur={total_seconds * 1000:.1f}'
+
+
+class QueryBudgetMiddleware:
+    """See the module docstring."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = getattr(request, 'query_stats', None)
+        started = time.perf_counter()
+        if stats is not None:
+            response = self.get_response(request)
+        else:
+            # api.metrics.MetricsMiddleware is not installed before this one
+            stats = metrics.QueryStats(keep=metrics.kept_queries())
+            with ExitStack() as stack:
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(stats))
+                response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else 'unmatched'
+        max_queries, max_seconds = budget_for(view)
+        reasons = []
+        if max_queries is not None and stats.count > max_queries:
+            reasons.append('queries')
+        if max_seconds is not None and elapsed > max_seconds:
+            reasons.append('latency')
+        if reasons:
+            self.report(request, view, reasons, stats, elapsed)
+
+        if getattr(settings, 'SQL_BUDGET_SERVER_TIMING', True):
+            response['Server-Timing'] = server_timing(stats.count, stats.duration, elapsed)
+        return response
+
+    def report(self, request, view, reasons, stats, elapsed):
+        for reason in reasons:
+            metrics.inc('over_budget_requests', view=view, reason=reason)
+        summary = analyse(stats.queries, getattr(settings, 'SQL_BUDGET_REPEAT_THRESHOLD', DEFAULT_REPEAT_THRESHOLD))
+        lines = [
+            f"{request.method} {request.path} ({view}) over budget ({', '.join(reasons)}): "
+            f"{stats.count} queries, {stats.duration * 1000:.1f} ms in SQL, {elapsed * 1000:.1f} ms total"
+        ]
+        if len(stats.queries) < stats.count:
+            lines.append(f"  (breakdown of the first {len(stats.queries)} queries)")
+        lines += [
+            f"  {count}x {seconds * 1000:.1f} ms  {text}"
+            for text, count, seconds in summary['fingerprints'][:REPORTED_FINGERPRINTS]
+        ]
+        lines += [f"  repeated {count}x (N+1?): {text}" for text, count, _ in summary['repeated']]
+        lines += [f"  duplicate {count}x (same parameters): {text}" for text, count in summary['duplicates']]
+        logger.warning('\n'.join(lines))
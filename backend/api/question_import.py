@@ -0,0 +1,150 @@
+"""
+Import multiple-choice questions from uploaded exam papers (PDFs or images).
+
+Uploads are stored under ``MEDIA_ROOT/ocr_uploads/`` and processed by the
+``ocr_questions`` background job (see api.jobs) so OCR never runs inside a
+web request. The parsed questions are returned in the job result for review
+before being saved through ``SaveEditedQuestionsAPIView``.
+"""
+import logging
+import mimetypes
+import re
+import uuid
+
+from django.core.files.storage import default_storage
+from django.utils.text import get_valid_filename
+
+from . import ocr
+from .jobs import update_progress
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = 'ocr_uploads'
+
+
+def file_kind(name):
+    """'pdf', 'image' or None for unsupported uploads."""
+    mime_type, _ = mimetypes.guess_type(name)
+    if mime_type and 'pdf' in mime_type:
+        return 'pdf'
+    if mime_type and mime_type.startswith('image/'):
+        return 'image'
+    return None
+
+
+def store_uploads(files):
+    """Save supported uploads to storage; returns their storage names."""
+    batch = uuid.uuid4().hex
+    names = []
+    for file in files:
+        if file_kind(file.name) is None:
+            continue
+        file.seek(0)
+        names.append(default_storage.save(f"{UPLOAD_DIR}/{batch}/{get_valid_filename(file.name)}", file))
+    return names
+
+
+def parse_questions(text, subject_id):
+    # Normalize bullet points
+    text = re.sub(r'[•·●]', '-', text)
+
+    # Split text into question blocks
+    question_blocks = re.split(r'\n?\s*\d+[\.\)]\s+', '\n' + text)[1:]
+
+    parsed_questions = []
+
+    for block in question_blocks:
+        lines = [line.strip() for line in block.strip().split('\n') if line.strip()]
+        if not lines:
+            continue
+
+        question_text = lines[0]
+        options = []
+        correct_option = ""
+        explanation = ""
+
+        for line in lines[1:]:
+            opt_match = re.match(r'^([A-Da-d][\.\)])\s*(.*)', line)
+            if opt_match:
+                options.append(opt_match.group(2).strip())
+            elif 'answer' in line.lower():
+                ans_text = line.split(':')[-1].strip()
+                # Handle single-letter answers or full option text
+                if len(ans_text) == 1 and ans_text.upper() in ['A', 'B', 'C', 'D']:
+                    idx = ord(ans_text.upper()) - ord('A')
+                    if 0 <= idx < len(options):
+                        correct_option = options[idx]
+                        explanation = f"Answer: {ans_text.upper()} - {correct_option}"
+                    else:
+                        explanation = f"Answer {ans_text} not matched."
+                else:
+                    # Attempt to match by option text
+                    try:
+                        idx = options.index(ans_text)
+                        correct_option = options[idx]
+                        explanation = f"Answer matched by text: {correct_option}"
+                    except ValueError:
+                        explanation = f"Answer {ans_text} not found in options."
+
+        if question_text and len(options) >= 2:
+            parsed_questions.append({
+                "id": None,
+                "subject": subject_id,
+                "question_text": question_text,
+                "options": options,
+                "correct_option": correct_option,
+                "explain": explanation
+            })
+
+    return parsed_questions
+
+
+def run_ocr_questions_job(job):
+    """
+    Job handler: OCR every stored upload and parse questions from the text.
+
+    Progress counts pages across all files (an image is one page).
+    """
+    subject_id = job.payload['subject_id']
+    names = job.payload.get('files', [])
+
+    contents = []
+    for name in names:
+        with default_storage.open(name, 'rb') as f:
+            data = f.read()
+        kind = file_kind(name)
+        pages = ocr.pdf_page_count(data) if kind == 'pdf' else 1
+        contents.append((name, kind, data, pages))
+
+    total = sum(pages for _, _, _, pages in contents)
+    update_progress(job, 0, total)
+
+    questions = []
+    failed = []
+    offset = 0
+    for name, kind, data, pages in contents:
+        try:
+            if kind == 'pdf':
+                texts = ocr.pdf_page_texts(
+                    data,
+                    on_page=lambda done, _total, base=offset: update_progress(job, base + done),
+                )
+                text = '\n' + '\n'.join(texts)
+            else:
+                text = ocr.ocr_bytes(data)
+        except Exception as e:
+            logger.warning(f"OCR failed for {name}: {e}")
+            failed.append({'file': name.rsplit('/', 1)[-1], 'error': str(e)})
+            text = ''
+        offset += pages
+        update_progress(job, offset)
+        questions.extend(parse_questions(text, subject_id))
+
+    for name in names:
+        default_storage.delete(name)
+
+    return {
+        'message': f"{len(questions)} questions parsed.",
+        'questions': questions,
+        'failed_files': failed,
+    }
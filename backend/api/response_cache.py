@@ -0,0 +1,193 @@
+"""
+Shared response cache with conditional GET for reference-data endpoints.
+
+Every model listed in ``CACHED_MODELS`` has a version token in the cache
+(the time of its last change), replaced by api.signals whenever a row is
+saved or deleted. Models in ``PER_OWNER_MODELS`` (per-user rows such as
+subject progress) also have a version per user or anonymous session, so
+one user's write only invalidates that user's responses; they must be
+cached with ``per_user=True``. A cached endpoint's ETag is a hash of the request (path,
+query string, host and, for per-user responses, the user or the anonymous
+visitor's session) and the versions
+of the models it reads, and its Last-Modified is the newest of those
+versions. So:
+
+* ``If-None-Match`` / ``If-Modified-Since`` are answered with 304 from the
+  version lookup alone (a single ``get_many`` on the versions cache), without
+  querying any model table. Versions live in the cache alias named by
+  ``RESPONSE_CACHE_VERSIONS_ALIAS``, which should not be database-backed
+  or the 304 path still costs a query;
+* full responses are served from the cached ``response.data`` keyed by the
+  ETag; a change to any of the models yields a new ETag and so a miss.
+
+Use ``@cached_response(Model, ...)`` on an APIView ``get`` method, or
+``CachedResponseMixin`` with ``cache_models`` on a viewset (list/retrieve).
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import (
+    AboutUs,
+    BookCatagory,
+    QCategory,
+    Questions,
+    SignWord,
+    SubBookCategory,
+    Subject,
+    TeamMember,
+    Testimonial,
+    UserSubjectProgress,
+)
+
+DEFAULT_TTL = 3600
+
+# Models whose saves/deletes invalidate cached responses (connected in api.signals)
+CACHED_MODELS = (
+    AboutUs, BookCatagory, QCategory, Questions, SignWord, SubBookCategory, Subject, TeamMember, Testimonial,
+    UserSubjectProgress,
+)
+
+
+# Models with a version per owner (see owner_of) on top of the model-wide one
+PER_OWNER_MODELS = (UserSubjectProgress,)
+
+
+def _versions_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_VERSIONS_ALIAS', 'default')]
+
+
+def _version_key(model, owner=''):
+    key = f'model_version:{model._meta.label_lower}'
+    return f'{key}:{owner}' if owner else key
+
+
+def owner_of(instance):
+    """The ``requester`` a per-owner row belongs to, or '' for other rows."""
+    if type(instance) not in PER_OWNER_MODELS:
+        return ''
+    if instance.user_id:
+        return f'user:{instance.user_id}'
+    return f'session:{instance.session_key}' if instance.session_key else ''
+
+
+def bump_version(model, owner=''):
+    """
+    Invalidate every cached response that depends on ``model`` (a no-op for other models).
+
+    With ``owner`` only that owner's responses are invalidated.
+    """
+    if model not in CACHED_MODELS:
+        return
+    _versions_cache().set(_version_key(model, owner), f'{time.time():.6f}', None)
+
+
+def get_versions(models, owner=''):
+    """
+    ``{model: version}`` in one cache round trip; missing versions start now.
+
+    For ``PER_OWNER_MODELS`` the version is the newer of the model-wide one
+    and ``owner``'s own.
+    """
+    store = _versions_cache()
+    keys = {}
+    for model in models:
+        keys[_version_key(model)] = model
+        if owner and model in PER_OWNER_MODELS:
+            keys[_version_key(model, owner)] = model
+    found = store.get_many(list(keys))
+    versions = {}
+    for key, model in keys.items():
+        if key not in found:
+            found[key] = f'{time.time():.6f}'
+            # Another worker may have set it meanwhile; use whichever won
+            if not store.add(key, found[key], None):
+                found[key] = store.get(key, found[key])
+        if model not in versions or float(found[key]) > float(versions[model]):
+            versions[model] = found[key]
+    return versions
+
+
+def requester(request):
+    """Who a per-user response belongs to: the user, else the session, else '' (shared by anonymous visitors)."""
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    session = getattr(request, 'session', None)
+    session_key = session.session_key if session is not None else None
+    return f'session:{session_key}' if session_key else ''
+
+
+def compute_etag(request, versions, per_user=False):
+    parts = [
+        request.get_host(),
+        request.scheme,
+        request.path,
+        request.META.get('QUERY_STRING', ''),
+        requester(request) if per_user else '',
+    ]
+    parts.extend(f'{model._meta.label_lower}={versions[model]}' for model in sorted(versions, key=lambda m: m._meta.label))
+    return hashlib.sha1('\0'.join(parts).encode('utf-8')).hexdigest()
+
+
+def cached_response(*models, per_user=False):
+    """
+    Cache a DRF view method's 200 responses until one of ``models`` changes.
+
+    ``per_user`` keeps a separate entry per user (or anonymous session) for
+    responses that include user-specific data.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_method(self, request, *args, **kwargs)
+
+            versions = get_versions(models, requester(request) if per_user else '')
+            etag = compute_etag(request, versions, per_user)
+            last_modified = int(max(float(version) for version in versions.values()))
+
+            not_modified = get_conditional_response(request, etag=quote_etag(etag), last_modified=last_modified)
+            if not_modified is not None and not_modified.status_code == status.HTTP_304_NOT_MODIFIED:
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                body_key = f'response:{etag}'
+                data = cache.get(body_key)
+                if data is not None:
+                    response = Response(data)
+                else:
+                    response = view_method(self, request, *args, **kwargs)
+                    if response.status_code != status.HTTP_200_OK:
+                        return response
+                    cache.set(body_key, response.data, getattr(settings, 'RESPONSE_CACHE_TTL', DEFAULT_TTL))
+
+            response['ETag'] = quote_etag(etag)
+            response['Last-Modified'] = http_date(last_modified)
+            # Clients may keep the body but must revalidate it (cheaply, via 304)
+            response['Cache-Control'] = 'private, no-cache' if per_user else 'public, no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+class CachedResponseMixin:
+    """Viewset mixin: cache ``list`` and ``retrieve`` until one of ``cache_models`` changes."""
+    cache_models = ()
+
+    def list(self, request, *args, **kwargs):
+        return cached_response(*self.cache_models)(type(self)._uncached_list)(self, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return cached_response(*self.cache_models)(type(self)._uncached_retrieve)(self, request, *args, **kwargs)
+
+    def _uncached_list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    def _uncached_retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
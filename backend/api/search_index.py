@@ -0,0 +1,234 @@
+"""
+Full-text search index for the Book catalog.
+
+Books are normalised into a ``BookSearchDocument`` row on save and indexed by
+the database's own inverted index:
+
+* PostgreSQL - a GIN index over a weighted ``tsvector`` expression
+* SQLite     - an FTS5 shadow table (``api_booksearch_fts``)
+
+Any other backend falls back to substring matching over the normalised document.
+Text is tokenised in Python first so Amharic/Tigrinya (Ethiopic script) and
+Oromo/Somali (Latin script) titles match regardless of spelling variants.
+"""
+import re
+import unicodedata
+import logging
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from rest_framework import filters
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'api_booksearch_fts'
+PG_VECTOR = (
+    "setweight(to_tsvector('simple', title), 'A') || "
+    "setweight(to_tsvector('simple', author), 'B') || "
+    "setweight(to_tsvector('simple', body), 'C')"
+)
+
+MAX_RESULTS = 500
+MAX_QUERY_TERMS = 8
+
+# (database name, table) -> whether the FTS5 table exists; tables only come and go with migrations
+_fts5_tables = {}
+
+# Ethiopic homophone series that Amharic writers use interchangeably.
+# Each maps the 8 vowel orders of a series onto the canonical series.
+ETHIOPIC_FOLDS = {
+    0x1210: 0x1200,  # ሐ -> ሀ
+    0x1280: 0x1200,  # ኀ -> ሀ
+    0x1220: 0x1230,  # ሠ -> ሰ
+    0x12D0: 0x12A0,  # ዐ -> አ
+    0x1340: 0x1338,  # ፀ -> ጸ
+}
+_ETHIOPIC_TABLE = {
+    src + order: dst + order
+    for src, dst in ETHIOPIC_FOLDS.items()
+    for order in range(8)
+}
+# The 1st and 4th orders of the h/glottal series are pronounced alike (ሀ/ሃ, አ/ኣ).
+_ETHIOPIC_TABLE.update({0x1203: 0x1200, 0x1213: 0x1200, 0x1283: 0x1200, 0x12A3: 0x12A0, 0x12D3: 0x12A0})
+
+# Oromo and Somali write the glottal stop (hudhaa) with an apostrophe inside
+# words ("ba'aa"); keep those words whole instead of splitting on it.
+_GLOTTAL_RE = re.compile(r"(?<=\w)['’ʼ](?=\w)")
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def normalize_text(text):
+    """Case-fold, strip Latin diacritics and fold Ethiopic homophones."""
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKD', str(text).casefold())
+    text = ''.join(ch for ch in text if unicodedata.category(ch) != 'Mn')
+    text = _GLOTTAL_RE.sub('', text)
+    return text.translate(_ETHIOPIC_TABLE)
+
+
+def tokenize(text):
+    """Split text into normalised index terms (Ethiopic punctuation separates words)."""
+    return _TOKEN_RE.findall(normalize_text(text))
+
+
+def _tags_text(tags):
+    if isinstance(tags, (list, tuple)):
+        return ' '.join(str(tag) for tag in tags)
+    return str(tags or '')
+
+
+def build_document(book):
+    """Return the normalised (title, author, body) triple for a book."""
+    return (
+        ' '.join(tokenize(book.title)),
+        ' '.join(tokenize(book.author)),
+        ' '.join(tokenize(f"{book.description or ''} {_tags_text(book.tags)}")),
+    )
+
+
+def fts5_table_exists(table):
+    """True when running on SQLite and the FTS5 table was created by its migration."""
+    if connection.vendor != 'sqlite':
+        return False
+    key = (connection.settings_dict['NAME'], table)
+    if key not in _fts5_tables:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE name = %s", [table])
+            _fts5_tables[key] = cursor.fetchone() is not None
+    return _fts5_tables[key]
+
+
+def fts5_prefix_query(terms):
+    """FTS5 MATCH expression: all terms required, the last one as a prefix."""
+    match = ' '.join(f'"{term}"' for term in terms[:-1])
+    return f'{match} "{terms[-1]}"*'.strip()
+
+
+def pg_prefix_tsquery(terms):
+    """to_tsquery('simple', ...) text: all terms required, the last one as a prefix."""
+    return ' & '.join(terms[:-1] + [f"{terms[-1]}:*"])
+
+
+def index_book(book):
+    """Insert or refresh the search document for a single book."""
+    from .models import BookSearchDocument
+
+    title, author, body = build_document(book)
+    BookSearchDocument.objects.update_or_create(
+        book_id=book.pk,
+        defaults={'title': title, 'author': author, 'body': body},
+    )
+    if fts5_table_exists(FTS_TABLE):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [book.pk])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, author, body) VALUES (%s, %s, %s, %s)",
+                [book.pk, title, author, body],
+            )
+
+
+def remove_book(book_id):
+    """Drop a book from the index (the document row cascades with the book)."""
+    if fts5_table_exists(FTS_TABLE):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [book_id])
+
+
+def rebuild_index(queryset=None):
+    """Re-index every book; returns the number of books indexed."""
+    from .models import Book
+
+    count = 0
+    for book in (queryset if queryset is not None else Book.objects.all()).iterator():
+        index_book(book)
+        count += 1
+    return count
+
+
+def search_book_ids(query, limit=MAX_RESULTS, queryset=None):
+    """
+    Return book ids matching ``query`` ordered by relevance.
+
+    Every term must match; the last term of the query also matches as a
+    prefix so results update while the user is still typing. With a Book
+    ``queryset`` only its books are searched, so ``limit`` counts matches
+    that survive its filters (e.g. ``is_active``).
+    """
+    terms = tokenize(query)[:MAX_QUERY_TERMS]
+    if not terms:
+        return []
+    subquery, within_params = None, []
+    if queryset is not None:
+        subquery, within_params = queryset.order_by().values('pk').query.sql_with_params()
+
+    def within(column):
+        return f"AND {column} IN ({subquery}) " if subquery else ''
+
+    if connection.vendor == 'postgresql':
+        tsquery = pg_prefix_tsquery(terms)
+        sql = (
+            f"SELECT book_id FROM api_booksearchdocument "
+            f"WHERE ({PG_VECTOR}) @@ to_tsquery('simple', %s) "
+            f"{within('book_id')}"
+            f"ORDER BY ts_rank({PG_VECTOR}, to_tsquery('simple', %s)) DESC, book_id DESC "
+            f"LIMIT %s"
+        )
+        params = [tsquery, *within_params, tsquery, limit]
+    elif fts5_table_exists(FTS_TABLE):
+        match = fts5_prefix_query(terms)
+        sql = (
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+            f"{within('rowid')}"
+            f"ORDER BY bm25({FTS_TABLE}, 10.0, 5.0, 1.0), rowid DESC LIMIT %s"
+        )
+        params = [match, *within_params, limit]
+    else:
+        return _fallback_search(terms, limit, queryset)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _fallback_search(terms, limit, queryset=None):
+    from .models import BookSearchDocument
+
+    docs = BookSearchDocument.objects.all()
+    if queryset is not None:
+        docs = docs.filter(book_id__in=queryset.order_by().values('pk'))
+    for term in terms:
+        docs = docs.filter(Q(title__contains=term) | Q(author__contains=term) | Q(body__contains=term))
+    title_hit = Case(When(title__contains=terms[0], then=Value(0)), default=Value(1), output_field=IntegerField())
+    return list(docs.annotate(title_hit=title_hit).order_by('title_hit', '-book_id').values_list('book_id', flat=True)[:limit])
+
+
+def filter_by_search(queryset, query):
+    """Restrict ``queryset`` to books matching ``query``, annotated with ``search_rank``."""
+    ids = search_book_ids(query, queryset=queryset)
+    if not ids:
+        return queryset.none()
+    rank = Case(
+        *[When(pk=book_id, then=Value(position)) for position, book_id in enumerate(ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(pk__in=ids).annotate(search_rank=rank)
+
+
+class BookFullTextFilter(filters.BaseFilterBackend):
+    """
+    ``?q=`` full-text mode for book list views.
+
+    Results are ordered by relevance unless the client passes an explicit
+    ``?ordering=``. Must come after ``OrderingFilter`` in ``filter_backends``.
+    """
+    search_param = 'q'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        queryset = filter_by_search(queryset, query)
+        if request.query_params.get(filters.OrderingFilter.ordering_param):
+            return queryset
+        return queryset.order_by('search_rank')
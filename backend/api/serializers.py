@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from django.conf import settings
+from django.db.models import Count, Prefetch
 from .models import (AboutUs, Book, BookCatagory, BookTag, Payment, Project, SignWord, 
                     SubBookCategory, Subject, Questions, Quiz, QCategory, SignWord, 
                     TeamMember, Testimonial, UploadedPDF, UserPurchase, UserSubjectProgress)
@@ -8,6 +9,9 @@ from django.contrib.auth import get_user_model
 import random
 import string
 
+from . import thumbnails
+from .entitlements import media_url
+
 
 User = get_user_model()
 
@@ -16,6 +20,58 @@ def generate_password_from_lastname_phone(last_name, phone_number, extra_length=
     phone_part = phone_number[-4:] if phone_number else "0000"
     return f"{name_part}{phone_part}"
 
+
+def book_pdf_url(book, request=None):
+    """
+    Absolute URL of ``book``'s entitlement-checked PDF endpoint
+    (``Book.get_pdf_url``), signed for the requesting user so it also opens
+    in iframes and new tabs (see api.entitlements.media_token).
+    """
+    url = book.get_pdf_url()
+    if not url or request is None:
+        return url
+    return request.build_absolute_uri(media_url(url, request.user, book.pk))
+
+
+class BookPdfField(serializers.FileField):
+    """A book's PDF: accepts uploads, reads back as ``book_pdf_url`` (``/media/books/pdfs/`` is not served)."""
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        return book_pdf_url(value.instance, self.context.get('request'))
+
+
+class ImageVariantsField(serializers.Field):
+    """
+    Read-only srcset-style map of an image field's resized WebP/JPEG variants
+    (see api.thumbnails.describe). In a list, the derivatives of every item
+    are loaded with a single query on first use.
+    """
+
+    def __init__(self, image_field, **kwargs):
+        self.image_field = image_field
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, obj):
+        fieldfile = getattr(obj, self.image_field)
+        if not fieldfile:
+            return None
+        loaded = self.context.setdefault('_image_derivatives', {})
+        if fieldfile.name not in loaded:
+            names = (self.sibling_names() | {fieldfile.name}) - set(loaded)
+            found = thumbnails.load(names)
+            loaded.update({name: found.get(name) for name in names})
+        return thumbnails.describe(fieldfile, loaded[fieldfile.name], self.context.get('request'))
+
+    def sibling_names(self):
+        list_serializer = getattr(self.parent, 'parent', None)
+        if not isinstance(list_serializer, serializers.ListSerializer) or list_serializer.instance is None:
+            return set()
+        return {getattr(item, self.image_field).name for item in list_serializer.instance}
+
 # ================================
 # Enhanced Book Serializers
 # ================================
@@ -28,6 +84,7 @@ class EnhancedBookSerializer(serializers.ModelSerializer):
     available_for_soft = serializers.ReadOnlyField()
     available_for_rent = serializers.ReadOnlyField()
     cover_url = serializers.SerializerMethodField()
+    cover_image_variants = ImageVariantsField('cover_image')
     pdf_url = serializers.SerializerMethodField()
     category_name = serializers.CharField(source='category.name', read_only=True)
     sub_category_name = serializers.CharField(source='sub_category.name', read_only=True)
@@ -37,7 +94,7 @@ class EnhancedBookSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'title', 'author', 'description', 'category', 'category_name', 
             'sub_category', 'sub_category_name', 'book_type', 'delivery_method', 
-            'cover_url', 'pdf_url', 'published_date', 'page_count', 'language', 
+            'cover_url', 'cover_image_variants', 'pdf_url', 'published_date', 'page_count', 'language', 
             'grade_level', 'hard_price', 'soft_price', 'rental_price_per_week',
             'price', 'is_for_sale', 'is_for_rent', 'is_free', 'is_premium',
             'is_featured', 'is_active', 'rating', 'views', 'downloads',
@@ -50,7 +107,7 @@ class EnhancedBookSerializer(serializers.ModelSerializer):
         return obj.get_cover_url()
     
     def get_pdf_url(self, obj):
-        return obj.get_pdf_url()
+        return book_pdf_url(obj, self.context.get('request')) if obj.pdf_file else None
     
     def get_price_by_type(self, obj):
         return obj.price_by_type
@@ -58,6 +115,7 @@ class EnhancedBookSerializer(serializers.ModelSerializer):
 
 class BookCreateUpdateSerializer(serializers.ModelSerializer):
     """Serializer for creating/updating books with validation"""
+    pdf_file = BookPdfField(required=False, allow_null=True)
     
     class Meta:
         model = Book
@@ -229,7 +287,7 @@ class EnhancedUserPurchaseSerializer(serializers.ModelSerializer):
     def get_book_pdf(self, obj):
         request = self.context.get('request')
         if obj.book.pdf_file:
-            return request.build_absolute_uri(obj.book.pdf_file.url) if request else obj.book.pdf_file.url
+            return book_pdf_url(obj.book, request)
         return None
 
 
@@ -238,6 +296,8 @@ class EnhancedUserPurchaseSerializer(serializers.ModelSerializer):
 # ================================
 
 class UserRegisterSerializer(serializers.ModelSerializer):
+    profile_image_variants = ImageVariantsField('profile_image')
+
     class Meta:
         model = User
         fields = [
@@ -259,6 +319,7 @@ class UserRegisterSerializer(serializers.ModelSerializer):
             'emergency_contact_name',
             'emergency_contact_phone',
             'profile_image',
+            'profile_image_variants',
             'student_admin_id',
             'user_type',
         ]
@@ -305,12 +366,34 @@ class UserRegisterSerializer(serializers.ModelSerializer):
         return user
 
 
-class BookSerializer(serializers.ModelSerializer):
+class FieldsProjectionMixin:
+    """
+    Limit the output to the fields named in ``?fields=id,title,...`` on GET
+    requests (unknown names are ignored), so unrequested method fields are
+    never computed. Nested uses are unaffected: they have no request at
+    construction time.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        fields = getattr(request, 'query_params', {}).get('fields') if request is not None else None
+        if not fields or request.method != 'GET':
+            return
+        requested = {name.strip() for name in fields.split(',')}
+        if requested & set(self.fields):
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+
+class BookSerializer(FieldsProjectionMixin, serializers.ModelSerializer):
     """Backward compatible book serializer"""
+    pdf_file = BookPdfField(required=False, allow_null=True)
     category_name = serializers.CharField(source='category.name', read_only=True)
     sub_category_name = serializers.CharField(source='sub_category.name', read_only=True)
     pdf_file_url = serializers.SerializerMethodField()
     cover_image_url = serializers.SerializerMethodField()
+    cover_image_variants = ImageVariantsField('cover_image')
     display_categories = serializers.SerializerMethodField()
     # Enhanced fields
     price_by_type = serializers.SerializerMethodField()
@@ -324,7 +407,7 @@ class BookSerializer(serializers.ModelSerializer):
             'category', 'category_name',
             'sub_category', 'sub_category_name',
             'pdf_file', 'pdf_file_url',
-            'cover_image', 'cover_image_url',
+            'cover_image', 'cover_image_url', 'cover_image_variants',
             'published_date', 'page_count',
             'language', 'grade_level', 'price',
             'hard_price', 'soft_price', 'rental_price_per_week',
@@ -341,7 +424,7 @@ class BookSerializer(serializers.ModelSerializer):
         """Returns absolute URL for PDF file if available."""
         request = self.context.get('request')
         if obj.pdf_file:
-            return request.build_absolute_uri(obj.pdf_file.url) if request else obj.pdf_file.url
+            return book_pdf_url(obj, request)
         return None
 
     def get_cover_image_url(self, obj):
@@ -358,6 +441,11 @@ class BookSerializer(serializers.ModelSerializer):
     def get_price_by_type(self, obj):
         return obj.price_by_type
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        # category_name, sub_category_name and display_categories read both relations
+        return queryset.select_related('category', 'sub_category')
+
 
 # Questions and Subjects
 class QuestionsSerializer(serializers.ModelSerializer):
@@ -391,7 +479,16 @@ class SubjectSerializer(serializers.ModelSerializer):
         model = Subject
         fields = ['name', 'QCategory', 'desc', 'questions', 'category_name', 'category_color', 'category_icon', 'questions_count']
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Load categories, questions and question counts in a constant number of queries."""
+        return queryset.select_related('QCategory').prefetch_related('questions').annotate(
+            num_questions=Count('questions', distinct=True)
+        )
+
     def get_questions_count(self, obj):
+        if hasattr(obj, 'num_questions'):
+            return obj.num_questions
         return obj.questions.count()
 
 
@@ -404,6 +501,13 @@ class QCategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'description', 'icon', 'cover_image', 'enrolled', 
                   'created_at', 'updated_at', 'subjects', 'total_questions']
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Prefetch subjects with their questions and annotated question counts."""
+        return queryset.prefetch_related(
+            Prefetch('general', queryset=SubjectSerializer.setup_eager_loading(Subject.objects.all()))
+        )
+
     def get_subjects(self, obj):
         subjects = obj.general.all()
         serializer = SubjectWithProgressSerializer(subjects, many=True, context=self.context)
@@ -411,7 +515,10 @@ class QCategorySerializer(serializers.ModelSerializer):
 
     def get_total_questions(self, obj):
         # Total questions across all subjects in this category
-        return sum(sub.questions.count() for sub in obj.general.all())
+        return sum(
+            sub.num_questions if hasattr(sub, 'num_questions') else sub.questions.count()
+            for sub in obj.general.all()
+        )
 
 
 class UserSubjectProgressSerializer(serializers.ModelSerializer):
@@ -428,6 +535,20 @@ class UserSubjectProgressSerializer(serializers.ModelSerializer):
         read_only_fields = ['user', 'session_key', 'last_accessed', 'created_at']
 
 
+def progress_by_subject(request):
+    """Map subject id -> ``UserSubjectProgress`` for the request's user or session."""
+    if request is None:
+        return {}
+    if request.user.is_authenticated:
+        progress = UserSubjectProgress.objects.filter(user=request.user)
+    else:
+        session_key = request.session.session_key
+        if not session_key:
+            return {}
+        progress = UserSubjectProgress.objects.filter(session_key=session_key)
+    return {row.subject_id: row for row in progress.select_related('subject')}
+
+
 class SubjectWithProgressSerializer(SubjectSerializer):
     user_progress = serializers.SerializerMethodField()
     difficulty = serializers.SerializerMethodField()
@@ -443,33 +564,19 @@ class SubjectWithProgressSerializer(SubjectSerializer):
         ]
 
     def get_user_progress(self, obj):
-        request = self.context.get('request')
-        if not request:
-            return None
-            
-        # Try to get progress for authenticated user
-        if request.user.is_authenticated:
-            try:
-                progress = UserSubjectProgress.objects.get(
-                    user=request.user, 
-                    subject=obj
-                )
-                return UserSubjectProgressSerializer(progress).data
-            except UserSubjectProgress.DoesNotExist:
-                return None
-        # Try to get progress for session user
-        else:
-            session_key = request.session.session_key
-            if session_key:
-                try:
-                    progress = UserSubjectProgress.objects.get(
-                        session_key=session_key, 
-                        subject=obj
-                    )
-                    return UserSubjectProgressSerializer(progress).data
-                except UserSubjectProgress.DoesNotExist:
-                    return None
-        return None
+        progress = self._progress_by_subject().get(obj.id)
+        return UserSubjectProgressSerializer(progress).data if progress else None
+
+    def _progress_by_subject(self):
+        """
+        The requesting user's (or session's) progress rows keyed by subject id.
+
+        Loaded with one query and kept in the serializer context, which nested
+        serializers share, so a whole category listing costs a single lookup.
+        """
+        if '_subject_progress' not in self.context:
+            self.context['_subject_progress'] = progress_by_subject(self.context.get('request'))
+        return self.context['_subject_progress']
 
     def get_difficulty(self, obj):
         # Mock difficulty based on subject ID
@@ -507,10 +614,11 @@ class BookTagSerializer(serializers.ModelSerializer):
 
 class BookCatagorySerializer(serializers.ModelSerializer):
     image_path = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField('image_path')
 
     class Meta:
         model = BookCatagory
-        fields = ['name', 'image_path','id']
+        fields = ['name', 'image_path', 'image_variants', 'id']
 
     def get_image_path(self, obj):
         request = self.context.get('request')
@@ -521,22 +629,25 @@ class BookCatagorySerializer(serializers.ModelSerializer):
 
 class ProjectSerializer(serializers.ModelSerializer):
     profile_username = serializers.CharField(source='profile.username', read_only=True)
+    image_variants = ImageVariantsField('image')
 
     class Meta:
         model = Project
         fields = [
             'id', 'title', 'summary', 'full_description',
             'profile', 'profile_username', 'date', 'badge',
-            'image', 'pdf', 'views', 'rating',
+            'image', 'image_variants', 'pdf', 'views', 'rating',
             'tags', 'is_pro' ,'created_at', 'updated_at'
         ]
         read_only_fields = ['views', 'created_at', 'updated_at']
 
 
 class SignWordSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField('image')
+
     class Meta:
         model = SignWord
-        fields = ['id', 'word', 'video', 'image']
+        fields = ['id', 'word', 'video', 'image', 'image_variants']
 
 
 class UserLoginSerializer(serializers.Serializer):
@@ -644,7 +755,7 @@ class UserPurchaseSerializer(serializers.ModelSerializer):
     def get_book_pdf(self, obj):
         request = self.context.get('request')
         if obj.book.pdf_file:
-            return request.build_absolute_uri(obj.book.pdf_file.url) if request else obj.book.pdf_file.url
+            return book_pdf_url(obj.book, request)
         return None
 
 
@@ -0,0 +1,146 @@
+"""
+Model signal handlers for the api app (connected in ApiConfig.ready).
+"""
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Book, BookTextIngest, UserPurchase
+from . import analytics, book_text, entitlements, jobs, response_cache, search_index, stats, thumbnails
+from .counters import counters_flushed
+
+logger = logging.getLogger(__name__)
+
+# Fields that feed the search document; saves touching only other fields
+# (e.g. ``update_fields=['views']``) skip re-indexing.
+SEARCH_FIELDS = {'title', 'author', 'description', 'tags'}
+
+
+@receiver(post_save, sender=Book)
+def index_book_on_save(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw or (update_fields and not SEARCH_FIELDS.intersection(update_fields)):
+        return
+    try:
+        search_index.index_book(instance)
+    except Exception as e:
+        logger.error(f"Failed to index book {instance.pk}: {str(e)}")
+
+
+@receiver(post_delete, sender=Book)
+def unindex_book_on_delete(sender, instance, **kwargs):
+    try:
+        search_index.remove_book(instance.pk)
+    except Exception as e:
+        logger.error(f"Failed to remove book {instance.pk} from search index: {str(e)}")
+
+
+@receiver(post_save, sender=Book)
+def discard_stale_pages_on_save(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw or (update_fields and 'pdf_file' not in update_fields):
+        return
+    stale = BookTextIngest.objects.filter(book=instance).exclude(pdf_name=instance.pdf_file.name or '')
+    if stale.exists():
+        book_text.discard_pages(instance.pk)
+
+
+# -----------------------
+# Dashboard counters (api.stats)
+# -----------------------
+def capture_stat_contributions(sender, instance, update_fields=None, raw=False, **kwargs):
+    instance._stat_contributions = None
+    if raw or instance.pk is None or not stats.tracks_change(sender, update_fields):
+        return
+    old = sender._default_manager.filter(pk=instance.pk).first()
+    instance._stat_contributions = stats.contributions(old) if old is not None else None
+
+
+def update_stat_counters_on_save(sender, instance, created=False, update_fields=None, raw=False, **kwargs):
+    if raw or not (created or stats.tracks_change(sender, update_fields)):
+        return
+    old = getattr(instance, '_stat_contributions', None)
+    try:
+        stats.apply_deltas(stats.diff(old or {}, stats.contributions(instance)))
+    except Exception as e:
+        logger.error(f"Failed to update dashboard counters for {sender.__name__} {instance.pk}: {str(e)}")
+
+
+def update_stat_counters_on_delete(sender, instance, **kwargs):
+    try:
+        stats.apply_deltas(stats.diff(stats.contributions(instance), {}))
+    except Exception as e:
+        logger.error(f"Failed to update dashboard counters for {sender.__name__} {instance.pk}: {str(e)}")
+
+
+for model in stats.TRACKED_MODELS:
+    pre_save.connect(capture_stat_contributions, sender=model, dispatch_uid=f'stats_pre_save_{model.__name__}')
+    post_save.connect(update_stat_counters_on_save, sender=model, dispatch_uid=f'stats_post_save_{model.__name__}')
+    post_delete.connect(update_stat_counters_on_delete, sender=model, dispatch_uid=f'stats_post_delete_{model.__name__}')
+
+
+@receiver(counters_flushed)
+def update_stat_counters_on_flush(sender, field, total, **kwargs):
+    name = stats.FLUSHED_SUMS.get((sender, field))
+    if name is None:
+        return
+    try:
+        stats.apply_deltas({name: total})
+    except Exception as e:
+        logger.error(f"Failed to update dashboard counter {name}: {str(e)}")
+
+
+@receiver(counters_flushed)
+def record_analytics_on_flush(sender, field, total, **kwargs):
+    metric = analytics.EVENT_METRICS.get((sender, field))
+    if metric is None:
+        return
+    try:
+        analytics.record_event(metric, total)
+    except Exception as e:
+        logger.error(f"Failed to record {metric} rollup: {str(e)}")
+
+
+@receiver(post_save, sender=UserPurchase)
+@receiver(post_delete, sender=UserPurchase)
+def invalidate_entitlements(sender, instance, **kwargs):
+    entitlements.invalidate(instance.user_id)
+
+
+# -----------------------
+# Response cache versions (api.response_cache)
+# -----------------------
+def bump_response_cache_version(sender, instance, **kwargs):
+    owner = response_cache.owner_of(instance)
+    # After commit, so no request can cache pre-commit data under the new version
+    transaction.on_commit(lambda: response_cache.bump_version(sender, owner))
+
+
+for model in response_cache.CACHED_MODELS:
+    post_save.connect(bump_response_cache_version, sender=model, dispatch_uid=f'response_cache_save_{model.__name__}')
+    post_delete.connect(bump_response_cache_version, sender=model, dispatch_uid=f'response_cache_delete_{model.__name__}')
+
+
+@receiver(counters_flushed)
+def bump_response_cache_on_flush(sender, **kwargs):
+    # e.g. QCategory.enrolled, which write-behind counters update without save()
+    response_cache.bump_version(sender)
+
+
+# -----------------------
+# Image derivatives (api.thumbnails)
+# -----------------------
+def queue_image_derivatives(sender, instance, update_fields=None, raw=False, **kwargs):
+    field = dict(thumbnails.IMAGE_FIELDS)[sender]
+    if raw or (update_fields and field not in update_fields):
+        return
+    name = getattr(instance, field).name
+    try:
+        if thumbnails.needs_derivatives(name):
+            jobs.enqueue('image_derivatives', {'source': name, 'model': sender._meta.label}, max_attempts=3)
+    except Exception as e:
+        logger.error(f"Failed to queue image derivatives for {sender.__name__} {instance.pk}: {str(e)}")
+
+
+for model, _ in thumbnails.IMAGE_FIELDS:
+    post_save.connect(queue_image_derivatives, sender=model, dispatch_uid=f'thumbnails_post_save_{model.__name__}')
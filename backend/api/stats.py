@@ -0,0 +1,369 @@
+"""
+Materialised statistics for the admin dashboard.
+
+Every statistic is a ``StatCounter`` row. Counters are kept current
+incrementally: api.signals computes each saved or deleted object's
+contribution (``contributions``) before and after the change and applies the
+difference in a single UPDATE. Writes that bypass signals (``QuerySet.update``)
+and 30-day windows are corrected by ``reconcile``, a full recount run by the
+``reconcile_stats`` job or management command.
+
+``dashboard_data`` serves the assembled payload from the cache for
+``DASHBOARD_STATS_TTL`` seconds (default 60), so a dashboard load is a single
+cache read.
+"""
+import logging
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.utils import timezone
+
+from .models import (
+    BackgroundJob,
+    Book,
+    BookCatagory,
+    Payment,
+    Project,
+    Questions,
+    SignWord,
+    StatCounter,
+    SubBookCategory,
+    Subject,
+    TeamMember,
+    Testimonial,
+)
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+CACHE_KEY = 'dashboard_stats'
+DEFAULT_TTL = 60
+DEFAULT_RECONCILE_INTERVAL = 3600
+RECONCILED_AT = 'meta.reconciled_at'
+
+
+# -----------------------
+# Per-object contributions
+# -----------------------
+def _book(book):
+    return {
+        'books': 1,
+        'books.both': book.book_type == 'both',
+        'books.rental': book.is_for_rent,
+        'books.hard_copy': book.book_type in ('hard', 'both') and (book.hard_price or 0) > 0 and book.is_for_sale,
+        'books.soft_copy': book.book_type in ('soft', 'both') and (book.soft_price or 0) > 0 and book.is_for_sale,
+        'books.free': book.is_free,
+        'books.premium': book.is_premium,
+        'books.featured': book.is_featured,
+        f'books.language.{book.language}': 1,
+        f'books.grade.{book.grade_level}': 1,
+        'books.views_sum': book.views or 0,
+        'books.downloads_sum': book.downloads or 0,
+        'books.rating_sum': book.rating or 0,
+    }
+
+
+def _project(project):
+    return {
+        'projects': 1,
+        f'projects.badge.{project.badge}': 1,
+        'projects.views_sum': project.views or 0,
+        'projects.rating_sum': project.rating or 0,
+    }
+
+
+def _user(user):
+    return {
+        'users': 1,
+        f'users.role.{user.role}': 1,
+        'users.superusers': user.is_superuser,
+    }
+
+
+def _payment(payment):
+    counters = {
+        'payments': 1,
+        f'payments.status.{payment.status}': 1,
+    }
+    if payment.status == 'completed':
+        counters[f'payments.completed_type.{payment.payment_type}'] = 1
+        counters['payments.revenue'] = payment.amount or 0
+    return counters
+
+
+# Models that only contribute to a row count
+TOTALS = {
+    Subject: 'subjects',
+    Questions: 'questions',
+    BookCatagory: 'categories',
+    SubBookCategory: 'subcategories',
+    SignWord: 'sign_words',
+    Testimonial: 'testimonials',
+    TeamMember: 'team_members',
+}
+
+# model -> (contribution function, fields it depends on)
+TRACKED_MODELS = {
+    Book: (_book, {'book_type', 'is_for_rent', 'hard_price', 'soft_price', 'is_for_sale', 'is_free', 'is_premium',
+                   'is_featured', 'language', 'grade_level', 'views', 'downloads', 'rating'}),
+    Project: (_project, {'badge', 'views', 'rating'}),
+    User: (_user, {'role', 'is_superuser'}),
+    Payment: (_payment, {'status', 'payment_type', 'amount'}),
+}
+TRACKED_MODELS.update({model: (lambda obj, name=name: {name: 1}, set()) for model, name in TOTALS.items()})
+
+
+# Counter fields updated in bulk by api.counters (which bypasses save signals)
+FLUSHED_SUMS = {
+    (Book, 'views'): 'books.views_sum',
+    (Book, 'downloads'): 'books.downloads_sum',
+    (Project, 'views'): 'projects.views_sum',
+}
+
+
+def contributions(instance):
+    """The counters ``instance`` adds to, e.g. ``{'books': 1, 'books.views_sum': 42}``."""
+    func, _ = TRACKED_MODELS[type(instance)]
+    return {name: float(value) for name, value in func(instance).items() if value}
+
+
+def tracks_change(model, update_fields):
+    """False when a save of an existing row can't change any counter (see api.signals)."""
+    fields = TRACKED_MODELS[model][1]
+    if not fields:
+        return False  # plain row counts only change on create and delete
+    if not update_fields:
+        return True
+    return bool(fields.intersection(update_fields))
+
+
+def diff(old, new):
+    names = set(old) | set(new)
+    return {name: new.get(name, 0) - old.get(name, 0) for name in names if new.get(name, 0) != old.get(name, 0)}
+
+
+def apply_deltas(deltas):
+    """
+    Add ``deltas`` to the counters in one UPDATE (a no-op until the first
+    reconciliation created them).
+    """
+    if not deltas:
+        return
+    updated = StatCounter.objects.filter(name__in=deltas).update(value=F('value') + Case(
+        *[When(name=name, then=Value(float(delta))) for name, delta in deltas.items()],
+        default=Value(0.0), output_field=FloatField(),
+    ))
+    if updated < len(deltas) and StatCounter.objects.filter(name=RECONCILED_AT).exists():
+        # New category values (e.g. a language nobody used before)
+        existing = set(StatCounter.objects.filter(name__in=deltas).values_list('name', flat=True))
+        for name in deltas.keys() - existing:
+            StatCounter.objects.get_or_create(name=name, defaults={'value': deltas[name]})
+
+
+# -----------------------
+# Full recount
+# -----------------------
+def _grouped(queryset, field, prefix):
+    return {f'{prefix}.{value}': count for value, count in queryset.values_list(field).annotate(count=Count('pk'))}
+
+
+def compute_counters():
+    """Recount every statistic from scratch (about 15 queries)."""
+    now = timezone.now()
+    thirty_days_ago = now - timedelta(days=30)
+    counters = {}
+
+    books = Book.objects.aggregate(
+        total=Count('id'),
+        both=Count('id', filter=Q(book_type='both')),
+        rental=Count('id', filter=Q(is_for_rent=True)),
+        hard_copy=Count('id', filter=Q(book_type__in=['hard', 'both'], hard_price__gt=0, is_for_sale=True)),
+        soft_copy=Count('id', filter=Q(book_type__in=['soft', 'both'], soft_price__gt=0, is_for_sale=True)),
+        free=Count('id', filter=Q(is_free=True)),
+        premium=Count('id', filter=Q(is_premium=True)),
+        featured=Count('id', filter=Q(is_featured=True)),
+        views_sum=Sum('views'),
+        downloads_sum=Sum('downloads'),
+        rating_sum=Sum('rating'),
+        added_30d=Count('id', filter=Q(created_at__gte=thirty_days_ago)),
+    )
+    counters['books'] = books.pop('total')
+    counters['window.books_30d'] = books.pop('added_30d')
+    counters.update({f'books.{name}': value or 0 for name, value in books.items()})
+    counters.update(_grouped(Book.objects.all(), 'language', 'books.language'))
+    counters.update(_grouped(Book.objects.all(), 'grade_level', 'books.grade'))
+
+    projects = Project.objects.aggregate(
+        total=Count('id'),
+        views_sum=Sum('views'),
+        rating_sum=Sum('rating'),
+        added_30d=Count('id', filter=Q(created_at__gte=thirty_days_ago)),
+    )
+    counters['projects'] = projects['total']
+    counters['projects.views_sum'] = projects['views_sum'] or 0
+    counters['projects.rating_sum'] = projects['rating_sum'] or 0
+    counters['window.projects_30d'] = projects['added_30d']
+    counters.update(_grouped(Project.objects.all(), 'badge', 'projects.badge'))
+
+    users = User.objects.aggregate(
+        total=Count('id'),
+        superusers=Count('id', filter=Q(is_superuser=True)),
+        joined_30d=Count('id', filter=Q(date_joined__gte=thirty_days_ago)),
+    )
+    counters['users'] = users['total']
+    counters['users.superusers'] = users['superusers']
+    counters['window.users_30d'] = users['joined_30d']
+    counters.update(_grouped(User.objects.all(), 'role', 'users.role'))
+
+    payments = Payment.objects.aggregate(
+        total=Count('id'),
+        completed_30d=Count('id', filter=Q(status='completed', created_at__gte=thirty_days_ago)),
+        revenue=Sum('amount', filter=Q(status='completed')),
+    )
+    counters['payments'] = payments['total']
+    counters['payments.revenue'] = payments['revenue'] or 0
+    counters['window.payments_completed_30d'] = payments['completed_30d']
+    counters.update(_grouped(Payment.objects.all(), 'status', 'payments.status'))
+    counters.update(_grouped(Payment.objects.filter(status='completed'), 'payment_type', 'payments.completed_type'))
+
+    counters['window.questions_30d'] = Questions.objects.filter(subject__created_at__gte=thirty_days_ago).count()
+    for model, name in TOTALS.items():
+        counters[name] = model.objects.count()
+    return counters
+
+
+def reconcile():
+    """Replace all counters with a fresh recount and drop the cached payload."""
+    counters = compute_counters()
+    counters[RECONCILED_AT] = time.time()
+    with transaction.atomic():
+        StatCounter.objects.all().delete()
+        StatCounter.objects.bulk_create([StatCounter(name=name, value=value) for name, value in counters.items()])
+    cache.delete(CACHE_KEY)
+    return counters
+
+
+def run_reconcile_stats_job(job):
+    counters = reconcile()
+    return {'counters': len(counters)}
+
+
+def _schedule_reconcile():
+    if not BackgroundJob.objects.filter(kind='reconcile_stats', status__in=['queued', 'running']).exists():
+        from . import jobs
+        jobs.enqueue('reconcile_stats')
+
+
+# -----------------------
+# Dashboard payload
+# -----------------------
+def _prefixed(counters, prefix):
+    return {name[len(prefix):]: int(value) for name, value in counters.items() if name.startswith(prefix) and value}
+
+
+def build_payload(counters):
+    c = lambda name: int(counters.get(name, 0))
+    books, projects = c('books'), c('projects')
+    return {
+        # Basic counts
+        "total_books": books,
+        "total_courses": c('subjects'),
+        "total_exams": c('questions'),
+        "research_papers": c('projects.badge.featured'),
+        "active_students": c('users.role.Student'),
+        "ongoing_projects": projects,
+        "total_users": c('users'),
+        "total_categories": c('categories'),
+        "total_subcategories": c('subcategories'),
+        "total_sign_words": c('sign_words'),
+        "total_testimonials": c('testimonials'),
+        "total_team_members": c('team_members'),
+
+        # Enhanced book type statistics
+        "books_by_type": {
+            "hard_copy": c('books.hard_copy'),
+            "soft_copy": c('books.soft_copy'),
+            "both_available": c('books.both'),
+            "rental_available": c('books.rental'),
+        },
+
+        # Recent activity (last 30 days, as of the last reconciliation)
+        "books_added_last_30_days": c('window.books_30d'),
+        "users_registered_last_30_days": c('window.users_30d'),
+        "projects_added_last_30_days": c('window.projects_30d'),
+        "questions_added_last_30_days": c('window.questions_30d'),
+
+        # User role distribution
+        "user_roles": {
+            "students": c('users.role.Student'),
+            "staff": c('users.role.Staff'),
+            "admins": c('users.role.Admin'),
+            "superusers": c('users.superusers'),
+        },
+
+        # Content distribution
+        "content_stats": {
+            "books": {
+                "total": books,
+                "free": c('books.free'),
+                "premium": c('books.premium'),
+                "featured": c('books.featured'),
+            },
+            "projects": {
+                "total": projects,
+                "featured": c('projects.badge.featured'),
+                "top_rated": c('projects.badge.top-rated'),
+                "new": c('projects.badge.new'),
+            },
+            "books_by_language": _prefixed(counters, 'books.language.'),
+            "books_by_grade": _prefixed(counters, 'books.grade.'),
+        },
+
+        # Performance metrics
+        "performance": {
+            "total_book_views": c('books.views_sum'),
+            "total_project_views": c('projects.views_sum'),
+            "avg_book_rating": counters.get('books.rating_sum', 0) / books if books else 0,
+            "avg_project_rating": counters.get('projects.rating_sum', 0) / projects if projects else 0,
+            "total_book_downloads": c('books.downloads_sum'),
+        },
+
+        # Payment statistics
+        "payment_stats": {
+            "total_payments": c('payments'),
+            "completed_payments": c('payments.status.completed'),
+            "payments_this_month": c('window.payments_completed_30d'),
+            "total_revenue": round(counters.get('payments.revenue', 0), 2),
+            "payment_types": _prefixed(counters, 'payments.completed_type.'),
+        },
+
+        "stats_reconciled_at": datetime.fromtimestamp(
+            counters.get(RECONCILED_AT, time.time()), tz=dt_timezone.utc
+        ).isoformat(),
+    }
+
+
+def dashboard_data():
+    """The dashboard payload: one cache read, or one counter query on a cache miss."""
+    data = cache.get(CACHE_KEY)
+    if data is not None:
+        return data
+
+    counters = dict(StatCounter.objects.values_list('name', 'value'))
+    if RECONCILED_AT not in counters:
+        counters = reconcile()
+    elif time.time() - counters[RECONCILED_AT] > getattr(settings, 'DASHBOARD_STATS_RECONCILE_INTERVAL', DEFAULT_RECONCILE_INTERVAL):
+        try:
+            _schedule_reconcile()
+        except Exception as e:
+            logger.error(f"Could not schedule stats reconciliation: {str(e)}")
+
+    data = build_payload(counters)
+    cache.set(CACHE_KEY, data, getattr(settings, 'DASHBOARD_STATS_TTL', DEFAULT_TTL))
+    return data
@@ -1,3 +1,1524 @@
-from django.test import TestCase
+import json
+import marshal
+import os
+import pstats
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import activity_log, counters, exchange_rates, jobs, metrics, payment_events, profiling, query_budget, search_index
+from .chapa_service import ChapaService
+from .models import ActivityEntry, BackgroundJob, Book, BookCatagory, BookPage, ImageDerivative, Payment, PaymentEvent, ProfileCapture, Project, QCategory, Questions, Subject, User, UserPurchase, UserSubjectProgress, WorkerMetrics
+
+
+class BookSearchIndexTests(TestCase):
+    """?q= search folds spelling variants, ranks title hits first and prefix-matches the last term."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def search(self, query):
+        return search_index.search_book_ids(query)
+
+    def test_tokenizer_folds_spelling_variants(self):
+        self.assertEqual(search_index.tokenize('ሐበሻ'), search_index.tokenize('ሀበሻ'))
+        self.assertEqual(search_index.tokenize('ሃገር'), search_index.tokenize('ሀገር'))
+        self.assertEqual(search_index.tokenize("Ba'aa Café"), ['baaa', 'cafe'])
+        self.assertEqual(search_index.tokenize('ሰላም፡ዓለም።'), ['ሰላም', 'አለም'])
+
+    def test_ranking_and_prefix_matching(self):
+        body_hit = Book.objects.create(title='Gardening', author='A', description='A chapter on chemistry')
+        title_hit = Book.objects.create(title='Organic Chemistry', author='B')
+        other = Book.objects.create(title='Chemist Tales', author='C')
+
+        self.assertEqual(self.search('chemistry'), [title_hit.pk, body_hit.pk])
+        # Only the last term matches as a prefix
+        self.assertEqual(set(self.search('chemi')), {title_hit.pk, body_hit.pk, other.pk})
+        self.assertEqual(self.search('chemist organ'), [])
+        self.assertEqual(self.search('organic chem'), [title_hit.pk])
+        self.assertEqual(search_index.pg_prefix_tsquery(['organic', 'chem']), 'organic & chem:*')
+
+        results = self.client.get('/api/adminbooks/?q=chemistry').json()
+        results = results['results'] if isinstance(results, dict) else results
+        self.assertEqual([book['id'] for book in results], [title_hit.pk, body_hit.pk])
+
+    def test_signals_keep_index_in_sync(self):
+        book = Book.objects.create(title='Old Title', author='Author')
+        self.assertEqual(self.search('old'), [book.pk])
+
+        book.title = 'New Title'
+        book.save()
+        self.assertEqual(self.search('old'), [])
+        self.assertEqual(self.search('new'), [book.pk])
+
+        # Saves of unrelated fields leave the document alone
+        with CaptureQueriesContext(connection) as queries:
+            Book.objects.get(pk=book.pk).save(update_fields=['views'])
+        self.assertFalse([q for q in queries if 'booksearch' in q['sql']])
+
+        book.delete()
+        self.assertEqual(self.search('new'), [])
+
+    def test_limit_applies_after_the_queryset_filters(self):
+        Book.objects.create(title='Chemistry', author='A', is_active=False)
+        active = Book.objects.create(title='Chemistry Notes', author='B')
+
+        self.assertEqual(search_index.search_book_ids('chemistry', limit=1, queryset=Book.objects.filter(is_active=True)),
+                         [active.pk])
+        with CaptureQueriesContext(connection) as queries:
+            self.search('chemistry')
+        self.assertFalse([q for q in queries if 'sqlite_master' in q['sql']])  # table lookup is cached
+
+    def test_keyset_pages_keep_relevance_order(self):
+        Book.objects.create(title='Gardening', author='A', description='chemistry notes')
+        Book.objects.create(title='Chemistry', author='B')
+        Book.objects.create(title='Cooking', author='C', description='kitchen chemistry')
+        Book.objects.create(title='Applied Chemistry', author='D')
+        Book.objects.create(title='Unrelated', author='E')
+
+        seen, url = [], '/api/adminbooks/?q=chemistry&page_size=2'
+        while url:
+            page = self.client.get(url).json()
+            seen += [book['id'] for book in page['results']]
+            url = page['next']
+        self.assertEqual(seen, self.search('chemistry'))
+        self.assertEqual(len(seen), 4)
+
+
+class BookTextSearchTests(TestCase):
+    """In-book search ranks pages through the page index and filters before the result limit."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def add_pages(self, book, texts):
+        BookPage.objects.bulk_create([
+            BookPage(book=book, page_number=number, text=text, search_text=' '.join(search_index.tokenize(text)))
+            for number, text in enumerate(texts, start=1)
+        ])
+
+    def test_search_pages_and_snippets(self):
+        from .book_text import make_snippet, search_pages
+
+        book = Book.objects.create(title='Biology', author='Author')
+        other = Book.objects.create(title='Physics', author='Author')
+        self.add_pages(book, ['Cells and tissues', 'Photosynthesis in plant cells', 'Genetics'])
+        self.add_pages(other, ['Photons'])
+
+        self.assertEqual([(p.book_id, p.page_number) for p in search_pages('plant cell', book_id=book.pk)], [(book.pk, 2)])
+        self.assertEqual({p.book_id for p in search_pages('photo')}, {book.pk, other.pk})
+        self.assertEqual(make_snippet('Photosynthesis in plant cells', 'plant cell'), 'Photosynthesis in <mark>plant</mark> <mark>cells</mark>')
+
+    def test_inactive_books_do_not_crowd_out_results(self):
+        hidden = Book.objects.create(title='Withdrawn', author='Author', is_active=False)
+        visible = Book.objects.create(title='Current', author='Author')
+        self.add_pages(hidden, ['Thermodynamics'] * 120)
+        self.add_pages(visible, ['Thermodynamics'])
+
+        data = self.client.get('/api/audiobooks/search-inside/?q=thermodynamics').json()
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(data['results'][0]['book_id'], visible.pk)
+
+
+class PdfTextExtractionTests(TestCase):
+    """PDF text is extracted once per content hash and served in validated page windows."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=media_root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.client = APIClient()
+
+    def pdf(self, name, pages):
+        import fitz
+
+        doc = fitz.open()
+        for text in pages:
+            doc.new_page().insert_text((72, 72), text)
+        return SimpleUploadedFile(name, doc.tobytes(), content_type='application/pdf')
+
+    def test_page_windows(self):
+        book = Book.objects.create(title='Reader', author='Author', pdf_file=self.pdf('reader.pdf', [f'Page text {n}' for n in range(1, 8)]))
+        url = f'/api/audiobooks/extract-text/{book.pk}/'
+
+        # The first request queues the extraction instead of parsing inline
+        queued = self.client.get(url, {'from': 1})
+        self.assertEqual(queued.status_code, 202)
+        self.assertEqual(queued.json()['job']['kind'], 'ingest_book_text')
+        self.assertEqual(self.client.get(url).json()['job']['job_id'], queued.json()['job']['job_id'])
+        self.assertEqual(jobs.work('test-worker', once=True), 1)
+
+        window = self.client.get(url, {'from': 3, 'to': 5}).json()
+        self.assertEqual([page['page_number'] for page in window['pages']], [3, 4, 5])
+        self.assertEqual(window['pages'][0]['text'], 'Page text 3')
+        self.assertEqual((window['has_more'], window['next_from']), (True, 6))
+
+        last = self.client.get(url, {'from': 6}).json()
+        self.assertEqual((last['from'], last['to'], last['has_more'], last['next_from']), (6, 7, False, None))
+        self.assertEqual(self.client.get(url).json()['page_count'], 7)
+
+        for bad in ({'from': 5, 'to': 3}, {'from': 0}, {'from': 'x'}, {'from': 9}):
+            self.assertEqual(self.client.get(url, bad).status_code, 400, bad)
+
+        etag = self.client.get(url, {'from': 1, 'to': 2})['ETag']
+        self.assertEqual(self.client.get(url, {'from': 1, 'to': 2}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertNotEqual(self.client.get(url, {'from': 2, 'to': 3})['ETag'], etag)
+
+        # Metadata in the response (title, cover, links) changes the ETag too
+        book.title = 'Reader, 2nd edition'
+        book.save()
+        changed = self.client.get(url, {'from': 1, 'to': 2}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.json()['book_title'], 'Reader, 2nd edition')
+
+    def test_identical_pdfs_are_extracted_once(self):
+        from . import book_text
+
+        pages = ['Shared chapter one', 'Shared chapter two']
+        first = Book.objects.create(title='First', author='Author', pdf_file=self.pdf('first.pdf', pages))
+        ingest = book_text.ingest_book(first)
+        self.assertEqual(ingest.page_count, 2)
+
+        second = Book.objects.create(title='Second', author='Author', pdf_file=SimpleUploadedFile('second.pdf', first.pdf_file.read()))
+        with mock.patch.object(book_text, 'extract_pages', side_effect=AssertionError('parsed again')):
+            copied = book_text.ingest_book(second)
+            self.assertIs(book_text.ingest_book(second), second.text_ingest)
+        self.assertEqual(copied.content_hash, ingest.content_hash)
+        self.assertEqual(list(second.pages.values_list('text', flat=True)), pages)
+
+        # A replaced PDF drops the stored pages
+        second.pdf_file = self.pdf('replacement.pdf', ['Different'])
+        second.save()
+        self.assertFalse(book_text.is_ingested(second))
+        self.assertEqual(second.pages.count(), 0)
+
+
+class ExamUploadJobTests(TestCase):
+    """Exam-paper uploads are queued as jobs that only the uploader and staff can read."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=media_root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.subject = Subject.objects.create(name='Maths', QCategory=QCategory.objects.create(name='Exams'), desc='desc')
+        self.client = APIClient()
+
+    def upload(self):
+        paper = SimpleUploadedFile('paper.pdf', b'%PDF-1.4', content_type='application/pdf')
+        return self.client.post('/api/upload-parse/', {'file': paper, 'subject_id': self.subject.pk}, format='multipart')
+
+    def test_job_visible_to_uploader_and_staff_only(self):
+        self.assertEqual(self.upload().status_code, 401)
+
+        uploader = User.objects.create_user(username='teacher', password='pass12345')
+        self.client.force_authenticate(uploader)
+        response = self.upload()
+        self.assertEqual(response.status_code, 202)
+        url = f"/api/upload-parse/{response.json()['job_id']}/"
+        self.assertEqual(BackgroundJob.objects.get().user, uploader)
+        self.assertEqual(self.client.get(url).json()['status'], 'queued')
+
+        self.client.force_authenticate(User.objects.create_user(username='other', password='pass12345'))
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.force_authenticate(User.objects.create_user(username='staff', password='pass12345', role='Staff'))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class PdfAnalysisTests(TestCase):
+    """PDF analysis runs as a background job and the OCR page cache stays bounded."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=media_root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.client = APIClient()
+
+    def test_analysis_is_queued_and_polled(self):
+        import fitz
+        from .models import UploadedPDF
+
+        doc = fitz.open()
+        doc.new_page().insert_text((72, 72), 'Seven words on the very first page')
+        doc.new_page()
+        owner = User.objects.create_user(username='uploader', password='pass12345')
+        pdf = UploadedPDF.objects.create(user=owner, document=SimpleUploadedFile('notes.pdf', doc.tobytes()))
+        url = f'/api/pdfs/{pdf.pk}/analyze/'
+
+        # Only the uploader (and staff) can see the summary
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_authenticate(User.objects.create_user(username='someone', password='pass12345'))
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.force_authenticate(owner)
+
+        queued = self.client.get(url)
+        self.assertEqual(queued.status_code, 202)
+        self.assertEqual(self.client.get(url).json()['job_id'], queued.json()['job_id'])
+        self.assertEqual(self.client.get(url, {'refresh': 1}).json()['job_id'], queued.json()['job_id'])
+
+        self.assertEqual(jobs.work('test-worker', once=True), 1)
+        done = self.client.get(url)
+        self.assertEqual(done.status_code, 200)
+        self.assertEqual((done.json()['page_count'], done.json()['word_count'], done.json()['empty_pages']), (2, 7, [2]))
+        refreshed = self.client.get(url, {'refresh': 1})
+        self.assertEqual(refreshed.status_code, 202)
+        self.assertEqual(self.client.get(url, {'refresh': 1}).json()['job_id'], refreshed.json()['job_id'])
+        self.assertEqual(BackgroundJob.objects.filter(kind='analyze_pdf').count(), 2)
+
+        listed = self.client.get('/api/pdfs/').json()
+        self.assertEqual([row['id'] for row in listed], [pdf.pk])
+        self.assertEqual(self.client.get(listed[0]['url']).status_code, 200)
+        self.client.force_authenticate(User.objects.get(username='someone'))
+        self.assertEqual(self.client.get('/api/pdfs/').json(), [])
+        self.assertEqual(self.client.get(listed[0]['url']).status_code, 404)
+
+    def test_ocr_cache_eviction(self):
+        from . import ocr
+
+        for page in range(1, 5):
+            ocr.cache_put('ab' * 32, page, 72, 150, 'x' * 100)
+        ocr.cache_put('cd' * 32, 1, 72, 150, 'old page')
+        old = time.time() - 100 * 24 * 3600
+        os.utime(ocr._cache_path('cd' * 32, 1, 72, 150), (old, old))
+        os.utime(ocr._cache_path('ab' * 32, 1, 72, 150), (old + 60, old + 60))
+        self.assertEqual(ocr.cache_get('ab' * 32, 1, 72, 150), 'x' * 100)  # a hit marks the page as used
+
+        # Pages unused for longer than max_age go first
+        self.assertEqual(ocr.evict(max_bytes=10 ** 6, max_age=90 * 24 * 3600), 1)
+        self.assertIsNone(ocr.cache_get('cd' * 32, 1, 72, 150))
+        self.assertFalse(os.path.exists(os.path.join(ocr.cache_dir(), 'cd')))
+        # Then the least recently used, until the cache fits
+        os.utime(ocr._cache_path('ab' * 32, 2, 72, 150), (old + 120, old + 120))
+        self.assertEqual(ocr.evict(max_bytes=300, max_age=10 ** 9), 1)
+        self.assertIsNone(ocr.cache_get('ab' * 32, 2, 72, 150))
+        self.assertEqual(ocr.cache_get('ab' * 32, 1, 72, 150), 'x' * 100)
+
+
+class TTSCacheTests(TestCase):
+    """Synthesized chunks are cached by content and each chunk is synthesized once, even under concurrency."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=media_root, TTS_BACKEND='api.tts_backends.SilentBackend')
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def test_hits_and_misses(self):
+        from . import tts_cache
+
+        name, cached = tts_cache.get_or_synthesize('Hello   there world')
+        self.assertFalse(cached)
+        self.assertEqual(tts_cache.get_or_synthesize('Hello there world'), (name, True))
+        self.assertNotEqual(tts_cache.get_or_synthesize('Hello there world', speed=1.5)[0], name)
+        self.assertTrue(default_storage.exists(name))
+
+        results = tts_cache.get_or_synthesize_many(['Hello there world', 'Second chunk'])
+        self.assertEqual([cached for _, cached in results], [True, False])
+
+    def test_speeds_the_engine_renders_alike_share_entries(self):
+        from . import tts_cache
+        from .tts_backends import GTTSBackend
+
+        gtts = GTTSBackend()
+        self.assertEqual(tts_cache.cache_key('Hello', 'en', 1.0, gtts), tts_cache.cache_key('Hello', 'en', 1.25, gtts))
+        self.assertNotEqual(tts_cache.cache_key('Hello', 'en', 1.0, gtts), tts_cache.cache_key('Hello', 'en', 0.5, gtts))
+
+    def test_chunk_urls_are_bounded(self):
+        from . import tts_cache
+
+        client, url = APIClient(), '/api/accessibility/tts-stream/'
+        text = ' '.join(f'word{n}' for n in range(60))
+        data = client.post(url, {'text': text, 'chunk_size': 1}, format='json').json()
+        self.assertEqual(data['total_chunks'], len(tts_cache.chunk_text(text, 50)))
+
+        self.assertEqual(client.post(url, {'text': 'x' * 100001}, format='json').status_code, 400)
+        self.assertEqual(client.post(url, {'text': 'x', 'chunk_size': 'big'}, format='json').status_code, 400)
+
+    def test_concurrent_misses_synthesize_once(self):
+        from . import tts_cache
+
+        calls = []
+        synthesize = tts_cache.synthesize
+
+        def slow_synthesize(*args):
+            calls.append(args[0])
+            time.sleep(0.05)
+            synthesize(*args)
+
+        with mock.patch.object(tts_cache, 'synthesize', slow_synthesize):
+            threads = [threading.Thread(target=tts_cache.get_or_synthesize, args=('Same passage',)) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(calls, ['Same passage'])
+        self.assertEqual(tts_cache._key_locks, {})
+
+    def test_streamed_audio_is_chunks_in_order(self):
+        from . import tts_cache
+        from .tts_backends import SilentBackend
+
+        text = ' '.join(f'word{n}' for n in range(60))
+        response = self.client.get('/api/accessibility/tts-stream/audio/', {'text': text, 'chunk_size': 50})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'audio/mpeg')
+
+        chunks = tts_cache.chunk_text(text, 50)
+        self.assertEqual(response['X-TTS-Chunks'], str(len(chunks)))
+        self.assertEqual(b''.join(response.streaming_content), b''.join(SilentBackend().synthesize(chunk) for chunk in chunks))
+        self.assertTrue(all(cached for _, cached in tts_cache.get_or_synthesize_many(chunks)))
+
+        # Chunks synthesized out of order are still streamed in order
+        def marked(backend, text, lang='en', speed=1.0):
+            time.sleep(0.02 if text.startswith('first') else 0)
+            return f'[{text}]'.encode()
+
+        text = 'first ' + ' '.join(f'later{n}' for n in range(40))
+        with mock.patch.object(SilentBackend, 'synthesize', marked):
+            response = self.client.get('/api/accessibility/tts-stream/audio/', {'text': text, 'chunk_size': 50})
+            streamed = b''.join(response.streaming_content).decode()
+        self.assertEqual(streamed, ''.join(f'[{chunk}]' for chunk in tts_cache.chunk_text(text, 50)))
+
+        self.assertEqual(self.client.get('/api/accessibility/tts-stream/audio/').status_code, 400)
+        self.assertEqual(self.client.get('/api/accessibility/tts-stream/audio/', {'text': 'x', 'voice_speed': 'fast'}).status_code, 400)
+
+    def test_eviction_drops_least_recently_used(self):
+        from . import tts_cache
+
+        old, _ = tts_cache.get_or_synthesize('An old chunk')
+        new, _ = tts_cache.get_or_synthesize('A newer chunk')
+        path = os.path.join(settings.MEDIA_ROOT, old)
+        os.utime(path, (time.time() - 3600, time.time() - 3600))
+        self.assertEqual(tts_cache.evict(max_bytes=os.path.getsize(path)), 1)
+        self.assertFalse(default_storage.exists(old))
+        self.assertTrue(default_storage.exists(new))
+
+
+class AudiobookRenderTests(TestCase):
+    """Books render into ordered chapter segments in a background job, resuming where a failed run stopped."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=media_root, TTS_BACKEND='api.tts_backends.SilentBackend', BACKGROUND_JOBS_EAGER=True)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.client = APIClient()
+
+        import fitz
+
+        doc = fitz.open()
+        for text in ('Chapter 1\nBeginnings\nThe story starts here.', 'It goes on for a while.',
+                     'Chapter 2\nMiddle\nThings happen.', 'Chapter 3\nEnding\nAll is resolved.'):
+            doc.new_page().insert_text((72, 72), text)
+        self.book = Book.objects.create(
+            title='Novel', author='Author', soft_price=5, pdf_file=SimpleUploadedFile('novel.pdf', doc.tobytes()),
+        )
+        self.reader = User.objects.create_user(username='listener', password='pass12345')
+
+    def test_job_renders_chapters_in_order(self):
+        from .tts_backends import SilentBackend
+
+        synthesize = SilentBackend.synthesize
+
+        def first_chapter_last(backend, text, lang='en', speed=1.0):
+            time.sleep(0.1 if 'Beginnings' in text else 0)
+            return synthesize(backend, text, lang, speed)
+
+        url = '/api/audiobooks/generate-audio/'
+        self.assertEqual(self.client.post(url, {'book_id': self.book.pk}, format='json').status_code, 401)
+        self.client.force_authenticate(self.reader)
+        self.assertEqual(self.client.post(url, {'book_id': self.book.pk}, format='json').status_code, 403)
+
+        payment = Payment.objects.create(user=self.reader, book=self.book, amount=5, payment_method='chapa', transaction_id='tx-audio')
+        UserPurchase.objects.create(user=self.reader, book=self.book, payment=payment, purchase_type='soft')
+        with mock.patch.object(SilentBackend, 'synthesize', first_chapter_last), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {'book_id': self.book.pk}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertNotIn('audio_url', response.json())
+
+        data = self.client.get(f'/api/audiobooks/{self.book.pk}/chapters/').json()
+        self.assertEqual(data['rendering']['status'], 'done')
+        self.assertEqual([c['title'] for c in data['chapters']], ['Chapter 1: Beginnings', 'Chapter 2: Middle', 'Chapter 3: Ending'])
+        self.assertEqual([(c['page_start'], c['page_end']) for c in data['chapters']], [(1, 2), (3, 3), (4, 4)])
+        self.assertTrue(all(c['duration_seconds'] > 0 and c['audio_url'] for c in data['chapters']))
+
+        # Chapter audio goes through the entitlement check; the signed link works in an <audio> element
+        audio_url = data['chapters'][0]['audio_url']
+        anonymous = APIClient()
+        self.assertEqual(anonymous.get(audio_url).status_code, 200)
+        self.assertEqual(anonymous.get(audio_url.split('?')[0]).status_code, 403)
+        self.assertEqual(anonymous.get(f'/media/audiobooks/{self.book.pk}/001.mp3').status_code, 404)
+
+    def test_queued_render_is_reused(self):
+        self.client.force_authenticate(User.objects.create_user(username='staff', password='pass12345', role='Staff'))
+        url = '/api/audiobooks/generate-audio/'
+        with override_settings(BACKGROUND_JOBS_EAGER=False):
+            first = self.client.post(url, {'book_id': self.book.pk, 'force': True}, format='json').json()['job']
+            second = self.client.post(url, {'book_id': self.book.pk, 'force': True}, format='json').json()['job']
+        self.assertEqual(first['job_id'], second['job_id'])
+        self.assertEqual(BackgroundJob.objects.filter(kind='render_audiobook').count(), 1)
+        self.assertTrue(BackgroundJob.objects.get(kind='render_audiobook').payload['force'])
+
+    def test_failed_segments_resume(self):
+        from . import audiobook
+        from .models import AudioBookSegment
+        from .tts_backends import SilentBackend
+
+        synthesize = SilentBackend.synthesize
+
+        def fail_middle(backend, text, lang='en', speed=1.0):
+            if 'Middle' in text:
+                raise IOError('TTS service unavailable')
+            return synthesize(backend, text, lang, speed)
+
+        with mock.patch.object(SilentBackend, 'synthesize', fail_middle):
+            with self.assertRaises(RuntimeError):
+                audiobook.render_book(self.book)
+        self.assertEqual(list(AudioBookSegment.objects.filter(book=self.book).values_list('status', flat=True)), ['done', 'failed', 'done'])
+        first_audio = AudioBookSegment.objects.get(book=self.book, index=1).audio_file.name
+
+        self.assertEqual(audiobook.render_book(self.book), (1, 2))
+        self.assertEqual(audiobook.render_book(self.book), (0, 3))
+        self.assertEqual(AudioBookSegment.objects.get(book=self.book, index=1).audio_file.name, first_audio)
+        # Other voice settings change every segment's hash
+        self.assertEqual(audiobook.render_book(self.book, speed=1.5), (3, 0))
+
+
+class DashboardStatsTests(TestCase):
+    """Dashboard counters follow saves and deletes through signals and agree with a full recount."""
+
+    def setUp(self):
+        cache.clear()
+        from . import stats
+
+        self.stats = stats
+        self.user = User.objects.create_user(username='buyer', password='pass12345')
+        Book.objects.create(title='Existing', author='Author', is_free=True)
+        stats.reconcile()
+
+    def counters(self):
+        from .models import StatCounter
+
+        return {name: value for name, value in StatCounter.objects.values_list('name', 'value')
+                if value and not name.startswith(('window.', 'meta.'))}
+
+    def recount(self):
+        return {name: float(value) for name, value in self.stats.compute_counters().items()
+                if value and not name.startswith('window.')}
+
+    def test_signals_keep_counters_in_step_with_recount(self):
+        book = Book.objects.create(title='New', author='Author', language='french', soft_price=5, is_for_sale=True, views=3)
+        book.is_featured = True
+        book.language = 'german'
+        book.save()
+        Payment.objects.create(user=self.user, book=book, amount=Decimal('12.50'), payment_method='chapa',
+                               transaction_id='tx-1', status='completed')
+        pending = Payment.objects.create(user=self.user, book=book, amount=5, payment_method='chapa', transaction_id='tx-2')
+        pending.status = 'failed'
+        pending.save(update_fields=['status'])
+        Subject.objects.create(name='Maths', QCategory=QCategory.objects.create(name='Exams'), desc='desc')
+        Book.objects.get(title='Existing').delete()
+
+        counters = self.counters()
+        self.assertEqual(counters, self.recount())
+        self.assertEqual(counters['books.language.german'], 1)
+        self.assertNotIn('books.language.french', counters)
+        self.assertEqual(counters['payments.revenue'], 12.5)
+
+        data = self.stats.dashboard_data()
+        self.assertEqual(data['total_books'], 1)
+        self.assertEqual(data['payment_stats']['completed_payments'], 1)
+
+    def test_untracked_saves_skip_the_lookup(self):
+        book = Book.objects.get(title='Existing')
+        subject = Subject.objects.create(name='Maths', QCategory=QCategory.objects.create(name='Exams'), desc='desc')
+        with CaptureQueriesContext(connection) as queries:
+            book.save(update_fields=['is_active'])
+            self.user.save(update_fields=['last_login'])
+            subject.name = 'Algebra'
+            subject.save()
+        lookups = ('SELECT "api_book".', 'SELECT "api_user".', 'SELECT "api_subject".')
+        self.assertFalse([q for q in queries if q['sql'].startswith(lookups)])
+
+        with CaptureQueriesContext(connection) as queries:
+            book.save(update_fields=['is_free'])
+        self.assertEqual(len([q for q in queries if q['sql'].startswith(lookups)]), 1)
+
+    def test_each_save_updates_the_counters_in_one_statement(self):
+        with CaptureQueriesContext(connection) as queries:
+            Book.objects.create(title='New', author='Author', language='english', is_for_sale=True, soft_price=5)
+        writes = [q for q in queries if 'api_statcounter' in q['sql'] and not q['sql'].startswith('SELECT')]
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(self.counters(), self.recount())
+
+    def test_reconcile_corrects_bulk_updates(self):
+        Book.objects.update(is_premium=True)  # bypasses signals
+        self.assertNotIn('books.premium', self.counters())
+        self.stats.reconcile()
+        self.assertEqual(self.counters()['books.premium'], 1)
+        self.assertEqual(self.counters(), self.recount())
+
+
+class AnalyticsRollupTests(TestCase):
+    """Analytics are read from hourly/daily rollups that background jobs keep up to date."""
+
+    def setUp(self):
+        cache.clear()
+        from . import analytics
+
+        self.analytics = analytics
+        self.admin = User.objects.create_user(username='admin', password='pass12345', role='Admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_aggregate_and_events(self):
+        from .models import AnalyticsRollup
+
+        now = timezone.now()
+        book = Book.objects.create(title='Book', author='Author')
+        Book.objects.filter(pk=book.pk).update(created_at=now - timedelta(days=1))
+        for n, method in enumerate(['chapa', 'chapa', 'telebir']):
+            Payment.objects.create(book=book, amount=10, payment_method=method, transaction_id=f'tx-{n}', status='completed')
+        Payment.objects.create(book=book, amount=99, payment_method='chapa', transaction_id='tx-pending')
+
+        self.analytics.aggregate(days=3, now=now)
+        self.analytics.aggregate(days=3, now=now)  # idempotent
+        self.analytics.record_event('book_views', 4)
+        daily = lambda metric: sum(AnalyticsRollup.objects.filter(granularity='day', metric=metric).values_list('value', flat=True))
+        self.assertEqual(daily('books_added'), 1)
+        self.assertEqual(daily('payments'), 4)
+        self.assertEqual(daily('revenue'), 30)
+        self.assertEqual(daily('book_views'), 4)
+        self.assertEqual(daily('signups'), 1)
+
+        dates, values = self.analytics.read_series(7, now)
+        self.assertEqual(len(dates), 7)
+        self.assertEqual(self.analytics._by_dimension(values, 'revenue', dates), {'chapa': 20, 'telebir': 10})
+
+    def test_backfill_is_queued_not_run_inline(self):
+        Book.objects.create(title='Book', author='Author')
+
+        with CaptureQueriesContext(connection) as queries:
+            pending = self.client.get('/api/admin/analytics/?range=7d').json()
+        self.assertFalse([q for q in queries if 'INSERT INTO "api_analyticsrollup"' in q['sql']])
+        self.assertEqual(pending['rollups']['status'], 'pending')
+        self.assertEqual(pending['content_analytics']['books']['in_range'], 0)
+        job = BackgroundJob.objects.get(kind='aggregate_analytics')
+        self.assertEqual(job.payload, {'days': self.analytics.BACKFILL_DAYS})
+
+        self.client.get('/api/admin/analytics/?range=7d')
+        self.assertEqual(BackgroundJob.objects.filter(kind='aggregate_analytics').count(), 1)
+
+        jobs.work('test-worker', once=True)
+        ready = self.client.get('/api/admin/analytics/?range=7d').json()
+        self.assertEqual(ready['rollups'], {'status': 'ready', 'job': None})
+        self.assertEqual(ready['content_analytics']['books']['in_range'], 1)
+
+        # Later refreshes are incremental, once the last run is older than the interval
+        BackgroundJob.objects.update(created_at=timezone.now() - timedelta(hours=1))
+        cache.clear()
+        self.client.get('/api/admin/analytics/?range=7d')
+        self.assertEqual(BackgroundJob.objects.filter(kind='aggregate_analytics', status='queued').get().payload, {'days': 2})
+        self.assertEqual(self.client.get('/api/admin/analytics/?range=2y').status_code, 400)
+
+
+class QCategoryQueryCountTests(TestCase):
+    """Listing exam categories must not issue queries per category, subject or question."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_categories(self, count, subjects_per_category=3, questions_per_subject=4):
+        start = QCategory.objects.count()
+        for c in range(start, start + count):
+            category = QCategory.objects.create(name=f'Category {c}')
+            for s in range(subjects_per_category):
+                subject = Subject.objects.create(name=f'Subject {c}-{s}', QCategory=category, desc='desc')
+                Questions.objects.bulk_create([
+                    Questions(subject=subject, question_text=f'Q{q}', options=['a', 'b'], correct_option='a')
+                    for q in range(questions_per_subject)
+                ])
+                UserSubjectProgress.objects.create(user=self.user, subject=subject, progress=50, status='in_progress')
+
+    def count_queries(self, url):
+        cache.clear()  # measure the uncached path of cached endpoints (api.response_cache)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_qcategories_list_uses_constant_queries(self):
+        self.add_categories(2)
+        small, _ = self.count_queries('/api/qcategories/')
+
+        self.add_categories(5, subjects_per_category=4, questions_per_subject=6)
+        large, response = self.count_queries('/api/qcategories/')
+
+        self.assertEqual(small, large)
+        # categories, subjects (+ question counts), questions, the user's progress
+        self.assertLessEqual(large, 4)
+
+        category = response.json()[0]
+        self.assertEqual(category['total_questions'], 24)
+        self.assertEqual(category['subjects'][0]['user_progress']['progress'], 50)
+        self.assertEqual(len(category['subjects'][0]['questions']), 6)
+
+    def test_qcategory_view_and_subjects_list_use_constant_queries(self):
+        self.add_categories(2)
+        small_categories, _ = self.count_queries('/api/qcategory/')
+        small_subjects, _ = self.count_queries('/api/subjects/')
+
+        self.add_categories(4)
+        large_categories, _ = self.count_queries('/api/qcategory/')
+        large_subjects, _ = self.count_queries('/api/subjects/')
+
+        self.assertEqual(small_categories, large_categories)
+        self.assertEqual(small_subjects, large_subjects)
+
+
+@override_settings(COUNTER_FLUSH_INTERVAL=60)
+class WriteBehindCounterTests(TestCase):
+    """Views, downloads and enrolments are buffered and flushed as F() updates."""
+
+    def setUp(self):
+        counters.flush()
+        self.addCleanup(counters.flush)
+        self.user = User.objects.create_user(username='reader', password='pass12345')
+        self.client = APIClient()
+
+    def test_increments_are_buffered_until_flush(self):
+        book = Book.objects.create(title='Counted', author='Author')
+        updated_at = book.updated_at
+        for expected in range(1, 4):
+            self.assertEqual(counters.increment(book, 'views'), expected)
+        counters.increment(book, 'downloads')
+        self.assertEqual(Book.objects.get(pk=book.pk).views, 0)
+
+        other = Book.objects.create(title='Other', author='Author')
+        counters.increment(other, 'views', 3)
+        with CaptureQueriesContext(connection) as queries:
+            counters.flush()
+        updates = [q for q in queries if q['sql'].startswith('UPDATE "api_book"')]
+        # views +3 for both books in one statement, downloads +1 in another
+        self.assertEqual(len(updates), 2)
+
+        book.refresh_from_db()
+        self.assertEqual((book.views, book.downloads), (3, 1))
+        self.assertEqual(book.updated_at, updated_at)
+        self.assertEqual(Book.objects.get(pk=other.pk).views, 3)
+
+    def test_project_views_and_enrolments(self):
+        project = Project.objects.create(
+            title='P', summary='s', full_description='f', profile=self.user, date='2024-01-01',
+        )
+        category = QCategory.objects.create(name='Exams')
+        self.client.force_authenticate(self.user)
+        for _ in range(2):
+            response = self.client.get(f'/api/projects/{project.pk}/')
+            self.client.post(f'/api/qcategories/{category.pk}/enroll/')
+        self.assertEqual(response.json()['views'], 2)
+
+        counters.flush()
+        self.assertEqual(Project.objects.get(pk=project.pk).views, 2)
+        self.assertEqual(QCategory.objects.get(pk=category.pk).enrolled, 2)
+
+
+class BatchAccessCheckTests(TestCase):
+    """A shelf of books is checked in one request using the cached entitlement set."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='buyer', password='pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.books = [Book.objects.create(title=f'Book {i}', author='Author', soft_price=5) for i in range(50)]
+        self.free = Book.objects.create(title='Free', author='Author')
+
+    def purchase(self, book, expires_at=None, purchase_type='soft'):
+        payment = Payment.objects.create(
+            user=self.user, book=book, amount=10, payment_method='chapa', transaction_id=f'tx-{book.pk}-{purchase_type}',
+        )
+        return UserPurchase.objects.create(
+            user=self.user, book=book, payment=payment, purchase_type=purchase_type, expires_at=expires_at,
+        )
+
+    def check(self, book_ids):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/user-purchases/check-access-batch/', {'book_ids': book_ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.json()['results']
+
+    def test_batch_check_uses_cached_entitlements(self):
+        owned = self.purchase(self.books[0])
+        self.purchase(self.books[1], expires_at=timezone.now() + timedelta(days=7))
+        self.purchase(self.books[2], expires_at=timezone.now() - timedelta(days=1))
+        book_ids = [book.pk for book in self.books] + [self.free.pk, 999999]
+
+        cold, results = self.check(book_ids)
+        warm, _ = self.check(book_ids)
+        self.assertLessEqual(cold, 2)
+        self.assertEqual(warm, 1)
+
+        self.assertEqual(results[str(self.books[0].pk)]['purchase_id'], owned.pk)
+        self.assertTrue(results[str(self.books[1].pk)]['access'])
+        self.assertFalse(results[str(self.books[2].pk)]['access'])
+        self.assertEqual(results[str(self.free.pk)]['reason'], 'free_book')
+        self.assertEqual(results['999999']['message'], 'Book not found')
+
+    def test_new_purchase_invalidates_cache(self):
+        book = self.books[3]
+        self.assertFalse(self.check([book.pk])[1][str(book.pk)]['access'])
+        self.purchase(book)
+        self.assertTrue(self.check([book.pk])[1][str(book.pk)]['access'])
+
+        response = self.client.get(f'/api/user-purchases/check-access/{book.pk}/')
+        self.assertEqual(response.json()['purchase_type'], 'soft')
+
+
+class BookKeysetPaginationTests(TestCase):
+    """Book listings page by (created_at, id) and honour ?fields= projections."""
+
+    def setUp(self):
+        self.client = APIClient()
+        Book.objects.bulk_create([Book(title=f'Book {i:02d}', author='Author', views=i % 3) for i in range(25)])
+        # Many rows share a timestamp: the id tie-breaker must keep pages disjoint
+        Book.objects.filter(id__lte=Book.objects.order_by('id')[9].id).update(created_at=timezone.now())
+
+    def walk(self, url):
+        ids, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(book['id'] for book in response.json()['results'])
+            url = response.json()['next']
+            pages += 1
+        return ids, pages
+
+    def test_cursor_pages_cover_every_book_once(self):
+        for ordering in ('-created_at', 'views', 'title'):
+            ids, pages = self.walk(f'/api/books/?page_size=10&ordering={ordering}')
+            self.assertEqual(sorted(ids), sorted(Book.objects.values_list('id', flat=True)), ordering)
+            self.assertEqual(pages, 3)
+
+        titles = [book['title'] for book in self.client.get('/api/books/?page_size=5&ordering=title').json()['results']]
+        self.assertEqual(titles, sorted(titles))
+
+    def test_unpaginated_list_and_projection(self):
+        response = self.client.get('/api/books/')
+        self.assertEqual(len(response.json()), 25)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/books/?page_size=20&fields=id,title,author,cover_image_url')
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'title', 'author', 'cover_image_url'})
+
+        self.assertEqual(self.client.get('/api/books/?cursor=garbage').status_code, 404)
+        self.assertEqual(self.client.get('/api/books/?page_size=5&ordering=description').status_code, 400)
+
+
+class ResponseCacheTests(TestCase):
+    """Reference-data endpoints answer revalidations with 304 and are invalidated by writes."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        BookCatagory.objects.create(name='Science')
+
+    def test_etag_revalidation_and_invalidation(self):
+        first = self.client.get('/api/categories/')
+        etag = first['ETag']
+        self.assertEqual(first.status_code, 200)
+
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.client.get('/api/categories/')
+            not_modified = self.client.get('/api/categories/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(cached.json(), first.json())
+        self.assertEqual(not_modified.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BookCatagory.objects.create(name='History')
+        changed = self.client.get('/api/categories/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+        self.assertEqual(len(changed.json()), 2)
+
+    def test_per_user_entries_are_kept_per_anonymous_session(self):
+        from django.contrib.sessions.backends.db import SessionStore
+
+        category = QCategory.objects.create(name='Exams')
+        subject = Subject.objects.create(name='Physics', QCategory=category, desc='desc')
+        clients, sessions = [], []
+        for progress in (30, 80):
+            session = SessionStore()
+            session.create()
+            sessions.append(session.session_key)
+            UserSubjectProgress.objects.create(session_key=session.session_key, subject=subject, progress=progress)
+            client = APIClient()
+            client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+            clients.append(client)
+
+        first, second = (client.get('/api/qcategory/') for client in clients)
+        self.assertNotEqual(first['ETag'], second['ETag'])
+        progress = [response.json()[0]['subjects'][0]['user_progress']['progress'] for response in (first, second)]
+        self.assertEqual(progress, [30, 80])
+        self.assertEqual(clients[1].get('/api/qcategory/', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+        # Another visitor's progress write leaves this visitor's entry valid
+        with self.captureOnCommitCallbacks(execute=True):
+            progress = UserSubjectProgress.objects.get(session_key=sessions[1])
+            progress.progress = 90
+            progress.save()
+        self.assertEqual(clients[0].get('/api/qcategory/', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        self.assertEqual(clients[1].get('/api/qcategory/', HTTP_IF_NONE_MATCH=second['ETag']).status_code, 200)
+
+
+class ImageDerivativeTests(TestCase):
+    """Uploads get content-addressed WebP/JPEG variants that serializers expose as a srcset map."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=media_root, BACKGROUND_JOBS_EAGER=True, THUMBNAIL_WIDTHS=(120, 240))
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        cache.clear()
+
+    def upload(self, name, size=(400, 300)):
+        from PIL import Image
+
+        buffer = BytesIO()
+        Image.new('RGBA', size, (200, 30, 30, 128)).save(buffer, format='PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_variants_generated_on_upload_and_listed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = BookCatagory.objects.create(name='Science', image_path=self.upload('science.png'))
+            BookCatagory.objects.create(name='Maths', image_path=self.upload('maths.png'))
+            BookCatagory.objects.create(name='Tiny', image_path=self.upload('tiny.png', size=(80, 60)))
+
+        derivative = ImageDerivative.objects.get(source=first.image_path.name)
+        self.assertEqual((derivative.width, derivative.height), (400, 300))
+        self.assertEqual(set(derivative.variants['webp']), {'120', '240'})
+        for names in derivative.variants.values():
+            for name in names.values():
+                self.assertTrue(default_storage.exists(name))
+        # Identical bytes share the same content-addressed files
+        twin = ImageDerivative.objects.get(source__startswith='category_covers/maths')
+        self.assertEqual(twin.variants, derivative.variants)
+        self.assertEqual(ImageDerivative.objects.get(source__startswith='category_covers/tiny').variants['jpeg'].keys(), {'80'})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/categories/')
+        self.assertEqual(len(queries), 2)  # categories + one derivative lookup
+        variants = {row['name']: row['image_variants'] for row in response.json()}['Science']
+        self.assertTrue(variants['webp']['120'].endswith('/120.webp'))
+        self.assertEqual(variants['srcset']['jpeg'].count('w,'), 1)
+
+        # Saving without touching the image does not queue more work
+        first.name = 'Physics'
+        first.save()
+        self.assertEqual(ImageDerivative.objects.count(), 3)
+
+    def test_missing_source_is_skipped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            job = jobs.enqueue('image_derivatives', {'source': 'category_covers/gone.png', 'model': 'api.BookCatagory'})
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.result, {'source': 'category_covers/gone.png', 'skipped': 'missing'})
+        self.assertFalse(ImageDerivative.objects.exists())
+
+
+class FileDeliveryTests(TestCase):
+    """Book PDFs are served after the entitlement check, with Range and conditional request support."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=media_root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        cache.clear()
+        self.content = bytes(range(256)) * 40
+        self.book = Book.objects.create(
+            title='Textbook', author='Author', soft_price=5,
+            pdf_file=SimpleUploadedFile('textbook.pdf', self.content, content_type='application/pdf'),
+        )
+        self.user = User.objects.create_user(username='reader', password='pass12345')
+        self.client = APIClient()
+        self.url = f'/api/books/{self.book.pk}/pdf/'
+
+    def entitle(self):
+        payment = Payment.objects.create(user=self.user, book=self.book, amount=5, payment_method='chapa', transaction_id='tx-pdf')
+        UserPurchase.objects.create(user=self.user, book=self.book, payment=payment, purchase_type='soft')
+        self.client.force_authenticate(self.user)
+
+    def test_entitlement_range_and_conditional(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+        self.entitle()
+        full = self.client.get(self.url)
+        self.assertEqual(full.status_code, 200)
+        self.assertEqual(b''.join(full.streaming_content), self.content)
+        self.assertEqual(full['Accept-Ranges'], 'bytes')
+
+        partial = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(b''.join(partial.streaming_content), self.content[100:200])
+
+        suffix = self.client.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(suffix.streaming_content), self.content[-10:])
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-').status_code, 416)
+        # A stale If-Range validator gets the whole file
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"').status_code, 200)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=full['ETag']).status_code, 304)
+
+    @override_settings(FILE_DELIVERY_BACKEND='x-accel-redirect', FILE_DELIVERY_ACCEL_PREFIX='/protected/')
+    def test_proxy_offload(self):
+        self.entitle()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected/{self.book.pdf_file.name}')
+        self.assertEqual(response.content, b'')
+
+    def test_private_media_is_not_served(self):
+        self.assertEqual(self.client.get(f'/media/{self.book.pdf_file.name}').status_code, 404)
+        self.assertEqual(self.client.get(f'/media/books/covers/../pdfs/{os.path.basename(self.book.pdf_file.name)}').status_code, 404)
+        for name in ('uploads/paper.pdf', 'ocr_uploads/scan.png'):
+            default_storage.save(name, SimpleUploadedFile(name, b'private'))
+            self.assertEqual(self.client.get(f'/media/{name}').status_code, 404)
+        default_storage.save('books/covers/cover.png', SimpleUploadedFile('cover.png', b'public'))
+        self.assertEqual(self.client.get('/media/books/covers/cover.png').status_code, 200)
+
+        book = self.client.get(f'/api/adminbooks/{self.book.pk}/').json()
+        self.assertTrue(book['pdf_file_url'].endswith(self.url))
+        self.assertEqual(book['pdf_file'], book['pdf_file_url'])
+
+    def test_signed_links_open_without_auth_header(self):
+        self.entitle()
+        link = self.client.get(f'/api/adminbooks/{self.book.pk}/').json()['pdf_file']
+        self.assertIn(f'{self.url}?token=', link)
+
+        # An iframe or new tab sends no Authorization header
+        anonymous = APIClient()
+        response = anonymous.get(link)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(anonymous.get(f'{link}x').status_code, 403)
+        other = Book.objects.create(title='Other', author='Author', soft_price=5, pdf_file=SimpleUploadedFile('other.pdf', b'%PDF'))
+        token = link.split('token=')[1]
+        self.assertEqual(anonymous.get(f'/api/books/{other.pk}/pdf/?token={token}').status_code, 403)
+
+
+class FakeChapaHandler(BaseHTTPRequestHandler):
+    """Local stand-in for the Chapa API: replies from ``server.script`` and records each call."""
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def handle_one_request(self):
+        self.server.connections.add(self.client_address)
+        super().handle_one_request()
+
+    def reply(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        self.server.calls.append((self.command, self.path.split('?')[0]))
+        status, data = self.server.script.pop(0) if self.server.script else (200, {'status': 'success', 'data': {}})
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = reply
+
+    def log_message(self, *args):
+        pass
+
+
+class ChapaClientTests(TestCase):
+    """ChapaService reuses connections, retries only idempotent calls and stops calling a failing gateway."""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeChapaHandler)
+        self.server.script, self.server.calls, self.server.connections = [], [], set()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        base_url = f'http://127.0.0.1:{self.server.server_address[1]}/v1'
+        with override_settings(CHAPA_BASE_URL=base_url, CHAPA_RETRY_BACKOFF=0, CHAPA_BREAKER_THRESHOLD=3):
+            self.chapa = ChapaService()
+        self.chapa.disable_test_mode()
+        self.addCleanup(self.chapa.client.close)
+
+    def test_keep_alive_and_idempotent_retries(self):
+        verified = (200, {'data': {'status': 'success', 'tx_ref': 'tx-1', 'amount': '10'}})
+        self.server.script = [(503, {}), verified, verified]
+        self.assertEqual(self.chapa.verify_transaction('tx-1')['status'], 'success')
+        self.assertTrue(self.chapa.verify_transaction('tx-1')['success'])
+        self.assertEqual(len(self.server.calls), 3)
+        self.assertEqual(len(self.server.connections), 1)
+
+        # A refund is not retried: a 503 may still have been applied upstream
+        self.server.script = [(503, {}), (200, {'data': {'status': 'success'}})]
+        self.assertFalse(self.chapa.process_refund('tx-1', amount=5)['success'])
+        self.assertEqual(self.server.calls[-1], ('POST', '/v1/refund'))
+        self.assertEqual(len(self.server.calls), 4)
+
+    def test_circuit_breaker_fails_fast(self):
+        self.server.script = [(503, {})] * 3
+        self.assertFalse(self.chapa.verify_transaction('tx-2')['success'])  # three attempts, breaker opens
+        self.assertEqual(self.chapa.client.breaker.state, 'open')
+
+        result = self.chapa.verify_transaction('tx-2')
+        self.assertIn('temporarily unavailable', result['error'])
+        self.assertEqual(len(self.server.calls), 3)
+
+        # After the cooldown a single successful trial closes the circuit again
+        self.chapa.client.breaker.opened_at -= self.chapa.client.breaker.cooldown
+        self.server.script = [(200, {'data': {'status': 'success'}})]
+        self.assertTrue(self.chapa.verify_transaction('tx-2')['success'])
+        self.assertEqual(self.chapa.client.breaker.state, 'closed')
+
+    def test_any_error_ends_the_half_open_trial(self):
+        import requests
+        from .http_client import GatewayError
+
+        breaker = self.chapa.client.breaker
+        for error in (requests.TooManyRedirects('redirect loop'), RuntimeError('adapter bug')):
+            breaker.opened_at = breaker.clock() - breaker.cooldown
+            with mock.patch.object(self.chapa.client.session, 'request', side_effect=error):
+                with self.assertRaises(GatewayError if isinstance(error, requests.RequestException) else RuntimeError):
+                    self.chapa.client.get('verify', 'transaction/verify/tx-3')
+            self.assertFalse(breaker.trial_running)
+            self.assertEqual(breaker.state, 'open')
+
+        # The next trial after the cooldown is let through and closes the circuit
+        breaker.opened_at -= breaker.cooldown
+        self.assertTrue(self.chapa.verify_transaction('tx-3')['success'])
+        self.assertEqual(breaker.state, 'closed')
+
+
+class CountingRateProvider(exchange_rates.StaticProvider):
+    """Static rates that count fetches and can be made to fail."""
+    fetches = 0
+    fail = False
+
+    def fetch(self):
+        type(self).fetches += 1
+        if self.fail:
+            raise ConnectionError('upstream down')
+        return super().fetch()
+
+
+@override_settings(EXCHANGE_RATE_PROVIDER='api.tests.CountingRateProvider', EXCHANGE_RATE_TTL=60,
+                   EXCHANGE_RATE_STATIC_RATES={'USD': 1.0, 'ETB': 120.0})
+class ExchangeRateTests(TestCase):
+    """Rates are cached, refreshed in the background and served stale while the provider is down."""
+
+    def setUp(self):
+        cache.clear()
+        CountingRateProvider.fetches = 0
+        CountingRateProvider.fail = False
+
+    def age_cached_rates(self):
+        entry = cache.get(exchange_rates.CACHE_KEY)
+        entry['fetched_at'] -= 61
+        cache.set(exchange_rates.CACHE_KEY, entry)
+
+    def wait_for_refresh(self):
+        for thread in threading.enumerate():
+            if thread.name == 'exchange-rate-refresh':
+                thread.join(5)
+
+    def test_stale_while_revalidate(self):
+        self.assertEqual(exchange_rates.get_rate('USD', 'ETB'), 120)
+        self.assertEqual(exchange_rates.convert(2.5, 'ETB', 'USD')[0], Decimal('0.02'))
+        self.assertEqual(ChapaService().calculate_conversion_rate('USD', 'ETB'), 120)
+        with self.assertRaises(ValueError):
+            ChapaService().calculate_conversion_rate('USD', 'XYZ')
+        self.assertEqual(CountingRateProvider.fetches, 1)
+
+        # Upstream down: stale rates keep being served, with one refresh attempt per lock period
+        self.age_cached_rates()
+        CountingRateProvider.fail = True
+        self.assertEqual(exchange_rates.get_rate('USD', 'ETB'), 120)
+        self.wait_for_refresh()
+        self.assertEqual(exchange_rates.get_rate('USD', 'ETB'), 120)
+        self.wait_for_refresh()
+        self.assertEqual(CountingRateProvider.fetches, 2)
+
+        # Upstream back: the next background refresh picks up the new rate
+        CountingRateProvider.fail = False
+        cache.delete(f'{exchange_rates.CACHE_KEY}:refreshing')
+        with override_settings(EXCHANGE_RATE_STATIC_RATES={'USD': 1.0, 'ETB': 125.0}):
+            exchange_rates.get_rate('USD', 'ETB')
+            self.wait_for_refresh()
+            self.assertEqual(exchange_rates.get_rate('USD', 'ETB'), 125)
+
+    def test_payment_uses_cached_rate(self):
+        book = Book.objects.create(title='Priced', author='Author', soft_price=5)
+        response = APIClient().post('/api/payments/process_payment/', {
+            'book_id': book.pk, 'payment_method': 'telebirr', 'payment_type': 'purchase_soft',
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        payment = Payment.objects.get(book=book)
+        self.assertEqual(payment.local_amount, Decimal('600.00'))
+        self.assertEqual(payment.payment_details['exchange_rate'], 120.0)
+
+
+class PaymentWebhookInboxTests(TestCase):
+    """Webhooks are acknowledged after one insert and applied later, once and in order."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='payer', password='pass12345')
+        self.payments = []
+        for i in range(3):
+            book = Book.objects.create(title=f'Sale {i}', author='Author', soft_price=5)
+            self.payments.append(Payment.objects.create(
+                user=self.user, book=book, amount=5, payment_method='chapa', transaction_id=f'TXN-sale-{i}',
+            ))
+        self.client = APIClient()
+
+    def webhook(self, tx_ref, status, minute):
+        return self.client.post('/api/payments/chapa/webhook/', {
+            'event': f'charge.{status}', 'event_time': f'2026-10-18T12:{minute:02d}:00Z', 'tx_ref': tx_ref,
+            'amount': '275.00', 'currency': 'ETB', 'status': status, 'reference': f'ref-{tx_ref}',
+            'customer_email': 'payer@example.com', 'customer_name': 'Payer', 'customer_phone_number': '0911000000',
+        }, format='json')
+
+    def test_inbox_dedupes_and_applies_in_order(self):
+        with CaptureQueriesContext(connection) as queries:
+            first = self.webhook('TXN-sale-0', 'success', 10)
+        self.assertEqual(first.json(), {'status': 'received'})
+        self.assertLessEqual(len(queries), 6)  # insert + job check/enqueue; no payment work
+        self.assertEqual(self.webhook('TXN-sale-0', 'success', 10).json(), {'status': 'duplicate'})
+        self.webhook('TXN-sale-0', 'failed', 5)  # an earlier attempt's event, delivered late
+        self.webhook('TXN-sale-1', 'success', 11)
+        self.webhook('TXN-sale-2', 'pending', 11)
+        self.webhook('TXN-unknown', 'success', 12)
+        self.assertEqual(PaymentEvent.objects.count(), 5)
+        self.assertEqual(BackgroundJob.objects.filter(kind='payment_events', status='queued').count(), 1)
+        self.assertEqual(Payment.objects.get(transaction_id='TXN-sale-0').status, 'pending')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            totals = payment_events.process_pending()
+        # Applied in event-time order (failed, then success); pending -> pending is a no-op
+        self.assertEqual(totals, {'applied': 3, 'ignored': 1, 'unknown_payment': 1})
+        statuses = dict(Payment.objects.values_list('transaction_id', 'status'))
+        self.assertEqual(statuses, {'TXN-sale-0': 'completed', 'TXN-sale-1': 'completed', 'TXN-sale-2': 'pending'})
+        self.assertEqual(UserPurchase.objects.filter(user=self.user).count(), 2)
+
+        # A late failure never downgrades a completed payment
+        self.webhook('TXN-sale-1', 'failed', 30)
+        self.assertEqual(payment_events.process_pending(), {'ignored': 1})
+        self.assertEqual(Payment.objects.get(transaction_id='TXN-sale-1').status, 'completed')
+
+
+@override_settings(ACTIVITY_LOG_FLUSH_INTERVAL=60, ACTIVITY_LOG_FLUSH_MAX=100)
+class ActivityLogTests(TestCase):
+    """The activity feed is a shared table written in batches and read by cursor."""
+
+    def setUp(self):
+        self.addCleanup(activity_log.flush)
+        self.admin = User.objects.create_user(username='admin', password='pass12345', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_batched_appends_cursor_reads_and_retention(self):
+        with CaptureQueriesContext(connection) as queries:
+            for i in range(25):
+                activity_log.log_activity(self.admin, 'create', 'project', i)
+        self.assertEqual(len(queries), 0)  # buffered, not written per call
+
+        first = self.client.get('/api/recent-activities/').json()  # the read flushes this worker's buffer
+        self.assertEqual([a['object_id'] for a in first], [str(i) for i in range(24, 14, -1)])
+        older = self.client.get(f"/api/recent-activities/?before={first[-1]['id']}&limit=100").json()
+        self.assertEqual(len(older), 15)
+        activity_log.log_activity(None, 'delete', 'book', 7)
+        newer = self.client.get(f"/api/recent-activities/?after={first[0]['id']}").json()
+        self.assertEqual([(a['user'], a['text']) for a in newer], [('System', 'Delete Book with ID 7')])
+
+        self.assertEqual(activity_log.prune(max_rows=20), 6)
+        self.assertEqual(len(activity_log.get_recent_activities(limit=100)), 20)
+
+    @override_settings(ACTIVITY_LOG_FLUSH_MAX=5, ACTIVITY_LOG_BUFFER_MAX=8)
+    def test_failed_write_backs_off_and_caps_the_buffer(self):
+        self.addCleanup(setattr, activity_log, '_failures', 0)
+        with mock.patch.object(ActivityEntry.objects, 'bulk_create', side_effect=DatabaseError('down')) as write, \
+                self.assertLogs('api.activity_log', 'ERROR') as logs:
+            for i in range(12):
+                activity_log.log_activity(self.admin, 'create', 'project', i)
+            self.assertEqual(write.call_count, 1)  # no synchronous retries while backing off
+            self.assertEqual(activity_log.flush(), 0)
+        self.assertIn('dropped the 4 oldest entries', logs.output[-1])
+
+        self.assertEqual(activity_log.flush(), 8)
+        self.assertEqual(list(ActivityEntry.objects.order_by('id').values_list('object_id', flat=True)),
+                         [str(i) for i in range(4, 12)])
+
+
+
+@override_settings(METRICS_FLUSH_INTERVAL=3600, METRICS_TOKEN='scrape-token')
+class RuntimeMetricsTests(TestCase):
+    """Request, query and cache metrics are summed over every worker's snapshot."""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='pass12345', role='Admin', is_staff=True)
+        # A worker in another process: exited yesterday, but its totals still count
+        WorkerMetrics.objects.create(
+            worker='other-host:4242', role='web', started_at=timezone.now() - timedelta(days=1),
+            rss_bytes=50 * 1024 * 1024, data={
+                'counters': [['http_requests', {'view': 'book-list', 'method': 'GET', 'status': '500'}, 5]],
+                'histograms': [['http_request_duration_seconds', {'view': 'book-list'}, [0] * 9 + [5, 0, 0, 12.5]]],
+            },
+        )
+        WorkerMetrics.objects.filter(worker='other-host:4242').update(updated_at=timezone.now() - timedelta(days=1))
+
+    def test_requests_queries_and_cache_are_aggregated(self):
+        before = metrics.collect()['counters']
+        Book.objects.create(title='Metered', author='A')
+        self.client.get('/api/books/')
+        self.client.get('/api/books/')
+        cache.set('metrics-test', 1)
+        cache.get('metrics-test')
+        cache.get_many(['metrics-test', 'metrics-missing'])
+        after = metrics.collect()['counters']
+
+        def delta(name, **labels):
+            return metrics._total(after, name, **labels) - metrics._total(before, name, **labels)
+
+        self.assertEqual(delta('http_requests', view='book-list', status=200), 2)
+        self.assertGreater(delta('db_queries', view='book-list'), 0)
+        self.assertEqual(delta('cache_requests', result='hit'), 2)
+        self.assertEqual(delta('cache_requests', result='miss'), 1)
+
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        body = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-token').content.decode()
+        self.assertIn('elibrary_http_requests_total{method="GET",status="500",view="book-list"} 5', body)
+        self.assertIn('elibrary_http_request_duration_seconds_bucket{view="book-list",le="+Inf"}', body)
+        self.assertIn('elibrary_workers{role="web"} 1', body)  # only this process is live
+
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        health = client.get('/api/admin/system-health/').json()
+        self.assertEqual(health['checks']['database']['status'], 'healthy')
+        self.assertEqual(health['checks']['cache']['status'], 'healthy')
+        self.assertGreater(health['metrics']['memory_usage']['rss_bytes'], 0)
+        self.assertIsNotNone(health['metrics']['cache_hit_ratio'])
+        self.assertEqual(health['endpoints'][0]['view'], 'book-list')
+        self.assertEqual([w['role'] for w in health['workers']], ['web'])
+        self.assertEqual(health['services']['job_worker'], 'not_running')
+
+        # Pruned workers are folded into the retired row, so the totals never drop
+        totals = metrics.collect()
+        self.assertEqual(metrics.prune(retention=60), 1)
+        self.assertEqual(metrics.prune(retention=60), 0)
+        retired = metrics.collect()
+        self.assertEqual(metrics._total(retired['counters'], 'http_requests', status=500),
+                         metrics._total(totals['counters'], 'http_requests', status=500))
+        self.assertEqual(retired['histograms'][metrics._key('http_request_duration_seconds', {'view': 'book-list'})][-1],
+                         totals['histograms'][metrics._key('http_request_duration_seconds', {'view': 'book-list'})][-1])
+        self.assertEqual([row.role for row in retired['workers']], ['web'])
+
+    def test_metrics_accepts_jwt_admins(self):
+        from rest_framework_simplejwt.tokens import RefreshToken
+
+        def scrape(user):
+            token = RefreshToken.for_user(user).access_token
+            return self.client.get('/metrics', HTTP_AUTHORIZATION=f'Bearer {token}').status_code
+
+        self.assertEqual(scrape(User.objects.create_user(username='ops', password='pass12345', role='Admin')), 200)
+        self.assertEqual(scrape(User.objects.create_user(username='reader', password='pass12345')), 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer not-a-token').status_code, 403)
+
+
+class QueryBudgetTests(TestCase):
+    """Requests over their SQL budget are logged with fingerprints; every response reports its cost."""
+
+    def setUp(self):
+        Book.objects.bulk_create([Book(title=f'Book {i}', author='Author') for i in range(3)])
+
+    def test_fingerprints_collapse_literals_and_lists(self):
+        self.assertEqual(
+            query_budget.fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x' LIMIT 21"),
+            'SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?',
+        )
+        queries = [('SELECT * FROM t WHERE id = %s', hash(repr((i % 4,))), 0.001) for i in range(6)]
+        summary = query_budget.analyse(queries, repeat_threshold=5)
+        self.assertEqual(summary['repeated'][0][:2], ('SELECT * FROM t WHERE id = ?', 6))
+        self.assertEqual(summary['duplicates'], [('SELECT * FROM t WHERE id = ?', 2)])
+
+    def test_over_budget_request_is_logged(self):
+        response = self.client.get('/api/books/')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", app;dur=[\d.]+$')
+
+        with override_settings(SQL_BUDGET_MAX_QUERIES=0), self.assertLogs('api.query_budget', 'WARNING') as logs:
+            self.client.get('/api/books/')
+        self.assertIn('/api/books/ (book-list) over budget (queries)', logs.output[0])
+        self.assertIn('FROM "api_book"', logs.output[0])
+
+        # Parameter values stay out of the log, and only the first kept queries are broken down
+        with override_settings(SQL_BUDGET_MAX_QUERIES=0), self.assertLogs('api.query_budget', 'WARNING') as logs:
+            self.client.get('/api/adminbooks/?search=Secret')
+        self.assertIn('LIKE ?', logs.output[0])
+        self.assertNotIn('Secret', logs.output[0])
+        with override_settings(SQL_BUDGET_MAX_QUERIES=0, SQL_BUDGET_KEPT_QUERIES=0):
+            with self.assertLogs('api.query_budget', 'WARNING') as logs:
+                response = self.client.get('/api/books/')
+        self.assertIn('(breakdown of the first 0 queries)', logs.output[0])
+        self.assertNotIn('FROM "api_book"', logs.output[0])
+        self.assertRegex(response['Server-Timing'], r'desc="[1-9]\d* queries"')
+
+        with override_settings(SQL_BUDGET_MAX_QUERIES=0, SQL_BUDGET_OVERRIDES={'book-list': {'queries': None}}):
+            with self.assertNoLogs('api.query_budget', 'WARNING'):
+                self.client.get('/api/books/')
+
+
+def busy_loop(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(100))
+
+
+class RequestProfilingTests(TestCase):
+    """Admins capture sampled profiles of live requests and download them as pstats, stacks or flame graphs."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=media_root, PROFILING_INTERVAL=0.001)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.admin = User.objects.create_user(username='admin', password='pass12345', role='Admin')
+        self.admin_client = APIClient()
+        self.admin_client.force_authenticate(self.admin)
+
+    def test_sampler_output_loads_in_pstats(self):
+        sampler = profiling.Sampler(threading.get_ident(), 0.001)
+        sampler.start()
+        busy_loop(0.05)
+        sampler.stop()
+        self.assertIn('busy_loop', profiling.collapsed(sampler.stacks))
+
+        path = os.path.join(settings.MEDIA_ROOT, 'sample.prof')
+        with open(path, 'wb') as f:
+            f.write(marshal.dumps(profiling.pstats_data(sampler.stacks, sampler.interval)))
+        stats = pstats.Stats(path)
+        busy = [key for key in stats.stats if key[2] == 'busy_loop']
+        self.assertEqual(len(busy), 1)
+        self.assertGreater(stats.stats[busy[0]][3], 0)  # cumulative time
+        self.assertIn('busy_loop', profiling.flamegraph_svg(profiling.parse_collapsed(profiling.collapsed(sampler.stacks))))
+
+    def test_signed_header_capture_and_admin_downloads(self):
+        token = self.admin_client.post('/api/admin/profiles/token/').json()['token']
+        self.assertEqual(self.client.get('/api/books/', HTTP_X_PROFILE_TOKEN='forged').get('X-Profile-Id'), None)
+        response = self.client.get('/api/books/', HTTP_X_PROFILE_TOKEN=token)
+        self.assertEqual(response.status_code, 200)
+        capture = ProfileCapture.objects.get(id=response['X-Profile-Id'])
+        self.assertEqual((capture.view, capture.trigger, capture.requested_by), ('book-list', 'header', self.admin))
+
+        listed = self.admin_client.get('/api/admin/profiles/').json()
+        self.assertEqual([c['id'] for c in listed], [capture.id])
+        for fmt in profiling.FORMATS:
+            self.assertEqual(self.admin_client.get(listed[0]['downloads'][fmt]).status_code, 200)
+        self.assertEqual(self.client.get(f'/media/{capture.pstats_file.name}').status_code, 404)
+
+        reader = APIClient()
+        reader.force_authenticate(User.objects.create_user(username='reader', password='pass12345'))
+        self.assertEqual(reader.get('/api/admin/profiles/').status_code, 403)
+        self.assertEqual(reader.post('/api/admin/profiles/token/').status_code, 403)
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_VIEWS=['book-list'], PROFILING_MAX_CAPTURES=2)
+    def test_sampled_captures_are_pruned(self):
+        Book.objects.bulk_create([Book(title=f'Book {i}', author='Author') for i in range(100)])
+        for _ in range(3):
+            self.client.get('/api/books/')
+        self.client.get('/api/subjects/')  # not in PROFILING_VIEWS
+        self.assertEqual(list(ProfileCapture.objects.values_list('view', 'trigger')), [('book-list', 'sampled')] * 2)
+
+# What a gunicorn worker does before serving: set up Django and load every URL
+# (and so every view module), then report its peak RSS. On Linux ru_maxrss
+# survives exec, so it would report the test runner's peak; VmHWM does not.
+BOOT_SCRIPT = """
+import resource, sys
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+try:
+    with open('/proc/self/status') as status:
+        print(next(int(line.split()[1]) for line in status if line.startswith('VmHWM:')) / 1024)
+except OSError:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024)
+"""
+
+
+class WorkerBootBudgetTests(TestCase):
+    """Worker boot stays within its import-time and memory budget (``python -X importtime`` report)."""
+    # Measured at about 0.6 s / 70 MB once the OCR stack became lazy (1.3 s / 130 MB before)
+    BOOT_SECONDS = 2.5
+    BOOT_RSS_MB = 120
+    LAZY_MODULES = ('cv2', 'numpy', 'fitz', 'pymupdf', 'pytesseract', 'PIL', 'tkinter', 'reportlab', 'nltk', 'gtts')
+
+    def boot(self):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'dl.settings'))
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', BOOT_SCRIPT],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, timeout=120,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr[-2000:])
+
+        # "import time: self [us] | cumulative | imported package", nested imports indented
+        imports = []
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, name = line[len('import time:'):].split('|')
+            imports.append((int(cumulative), len(name) - len(name.lstrip()), name.strip()))
+        top_level = min(depth for _, depth, _ in imports)
+        seconds = sum(cumulative for cumulative, depth, _ in imports if depth == top_level) / 1e6
+        return seconds, float(result.stdout.strip().splitlines()[-1]), imports
+
+    def test_worker_boot_budget(self):
+        seconds, rss_mb, imports = self.boot()
+        slowest = sorted((i for i in imports if i[1] == min(d for _, d, _ in imports)), reverse=True)[:15]
+        report = '\n'.join(f'{cumulative / 1000:9.1f} ms  {name}' for cumulative, _, name in slowest)
+
+        loaded = sorted({name.split('.')[0] for _, _, name in imports} & set(self.LAZY_MODULES))
+        self.assertEqual(loaded, [], f'Heavy modules imported at boot:\n{report}')
+        self.assertLess(seconds, self.BOOT_SECONDS, f'Boot imports took {seconds:.2f}s:\n{report}')
+        self.assertLess(rss_mb, self.BOOT_RSS_MB, f'Boot RSS {rss_mb:.0f} MB:\n{report}')
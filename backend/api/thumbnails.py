@@ -0,0 +1,204 @@
+"""
+Resized WebP/JPEG derivatives of uploaded images.
+
+Covers, category images, project images, sign-word images and profile photos
+(``IMAGE_FIELDS``) are uploaded at full size. When one of those fields gets a
+new file, api.signals queues an ``image_derivatives`` job that renders it at
+each of ``THUMBNAIL_WIDTHS`` (never upscaling) in WebP and JPEG.
+
+Derivatives are content-addressed: they are stored under
+``thumbs/<sha256[:2]>/<sha256>/<width>.<ext>`` of the source bytes, so the
+same picture uploaded twice is rendered once, and a replaced image never
+serves stale thumbnails. An ``ImageDerivative`` row maps each source file
+name to its variants; serializers read those rows in one query per response
+(``load``) and expose them with ``describe`` as a srcset-style map.
+
+The job reads the source from ``default_storage``, so it must run where the
+upload was saved: with the local file system storage that is the web host,
+whose gunicorn master runs the job worker (see backend/gunicorn.conf.py). A
+source that is gone by the time the job runs (replaced or deleted) is skipped.
+
+``manage.py generate_thumbnails`` backfills existing uploads.
+"""
+import hashlib
+import logging
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .models import Book, BookCatagory, ImageDerivative, Project, SignWord, User
+
+logger = logging.getLogger(__name__)
+
+# (model, image field) pairs that get derivatives
+IMAGE_FIELDS = (
+    (Book, 'cover_image'),
+    (BookCatagory, 'image_path'),
+    (Project, 'image'),
+    (SignWord, 'image'),
+    (User, 'profile_image'),
+)
+
+DEFAULT_WIDTHS = (120, 240, 480, 960)
+FORMATS = {
+    # format: (extension, Pillow save options)
+    'webp': ('webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+ROOT = 'thumbs'
+
+
+def get_widths():
+    return tuple(sorted(getattr(settings, 'THUMBNAIL_WIDTHS', DEFAULT_WIDTHS)))
+
+
+def variant_name(digest, width, fmt):
+    return f"{ROOT}/{digest[:2]}/{digest}/{width}.{FORMATS[fmt][0]}"
+
+
+def target_widths(source_width):
+    """Configured widths below the source width; a small source gets one variant at its own size."""
+    widths = [w for w in get_widths() if w < source_width]
+    return widths or [source_width]
+
+
+def _render(image, width, fmt):
+    from PIL import Image
+
+    height = max(1, round(image.height * width / image.width))
+    resized = image.resize((width, height), Image.LANCZOS) if width != image.width else image
+    has_alpha = resized.mode in ('RGBA', 'LA')
+    if fmt == 'jpeg' and has_alpha:
+        # JPEG has no alpha channel: flatten onto white
+        flat = Image.new('RGB', resized.size, (255, 255, 255))
+        flat.paste(resized, mask=resized.getchannel('A'))
+        resized = flat
+    elif resized.mode not in ('RGB', 'RGBA'):
+        resized = resized.convert('RGBA' if has_alpha else 'RGB')
+    buffer = BytesIO()
+    resized.save(buffer, format=fmt.upper(), **FORMATS[fmt][1])
+    return buffer.getvalue()
+
+
+def _open(data):
+    from PIL import Image, ImageOps
+
+    image = Image.open(BytesIO(data))
+    image = ImageOps.exif_transpose(image)
+    if image.mode == 'P':
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    elif image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        image = image.convert('RGB')
+    return image
+
+
+def generate(source, force=False):
+    """
+    Render the variants of the stored file ``source`` and return its
+    ``ImageDerivative``. Existing variant files are reused unless ``force``.
+    """
+    if not force:
+        existing = ImageDerivative.objects.filter(source=source).first()
+        if existing is not None:
+            return existing
+
+    with default_storage.open(source, 'rb') as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    image = _open(data)
+
+    variants = {}
+    for fmt in FORMATS:
+        variants[fmt] = {}
+        for width in target_widths(image.width):
+            name = variant_name(digest, width, fmt)
+            if force and default_storage.exists(name):
+                default_storage.delete(name)
+            if not default_storage.exists(name):
+                name = default_storage.save(name, ContentFile(_render(image, width, fmt)))
+            variants[fmt][str(width)] = name
+
+    derivative, _ = ImageDerivative.objects.update_or_create(
+        source=source,
+        defaults={'content_hash': digest, 'width': image.width, 'height': image.height, 'variants': variants},
+    )
+    return derivative
+
+
+def needs_derivatives(name):
+    return bool(name) and not ImageDerivative.objects.filter(source=name).exists()
+
+
+def run_image_derivatives_job(job):
+    """Job handler (kind ``image_derivatives``): payload ``{"source": <file name>, "model": <label>}``."""
+    from django.apps import apps
+    from .response_cache import bump_version
+
+    source = job.payload['source']
+    if not default_storage.exists(source):
+        logger.warning(f"Image {source} is missing from media storage; skipping derivatives")
+        return {'source': source, 'skipped': 'missing'}
+    derivative = generate(source)
+    if job.payload.get('model'):
+        # Cached reference-data responses embed the (until now empty) variant map
+        bump_version(apps.get_model(job.payload['model']))
+    return {'source': derivative.source, 'variants': sum(len(v) for v in derivative.variants.values())}
+
+
+def prune():
+    """Delete derivatives of files no longer referenced by any image field; returns the number removed."""
+    referenced = set()
+    for model, field in IMAGE_FIELDS:
+        referenced.update(model._default_manager.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+                          .values_list(field, flat=True))
+    orphans = list(ImageDerivative.objects.exclude(source__in=referenced))
+    kept_hashes = set(ImageDerivative.objects.filter(source__in=referenced).values_list('content_hash', flat=True))
+    for derivative in orphans:
+        if derivative.content_hash in kept_hashes:
+            continue
+        for names in derivative.variants.values():
+            for name in names.values():
+                default_storage.delete(name)
+    ImageDerivative.objects.filter(pk__in=[d.pk for d in orphans]).delete()
+    return len(orphans)
+
+
+# -----------------------
+# Serialization
+# -----------------------
+def load(names):
+    """``{source name: ImageDerivative}`` for the given file names, in one query."""
+    names = {name for name in names if name}
+    if not names:
+        return {}
+    return {d.source: d for d in ImageDerivative.objects.filter(source__in=names)}
+
+
+def describe(fieldfile, derivative, request=None):
+    """
+    The srcset-style map for one image field::
+
+        {"original": url, "width": 1600, "height": 2400,
+         "webp": {"120": url, ...}, "jpeg": {"120": url, ...},
+         "srcset": {"webp": "url 120w, ...", "jpeg": "url 120w, ..."}}
+
+    Until the derivatives exist only ``original`` is set and the maps are empty.
+    """
+    def absolute(url):
+        return request.build_absolute_uri(url) if request is not None else url
+
+    data = {
+        'original': absolute(fieldfile.url),
+        'width': derivative.width if derivative else None,
+        'height': derivative.height if derivative else None,
+        'srcset': {},
+    }
+    for fmt in FORMATS:
+        variants = derivative.variants.get(fmt, {}) if derivative else {}
+        urls = {width: absolute(default_storage.url(name)) for width, name in
+                sorted(variants.items(), key=lambda item: int(item[0]))}
+        data[fmt] = urls
+        data['srcset'][fmt] = ', '.join(f'{url} {width}w' for width, url in urls.items())
+    return data
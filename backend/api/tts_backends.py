@@ -0,0 +1,75 @@
+"""
+Pluggable text-to-speech engines.
+
+``get_backend()`` returns the engine named by the ``TTS_BACKEND`` setting
+(a dotted path, default ``GTTSBackend``). Every backend returns MP3 bytes, so
+chunks from any engine can be cached (api.tts_cache) and concatenated into a
+single audio stream.
+"""
+from io import BytesIO
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+DEFAULT_BACKEND = 'api.tts_backends.GTTSBackend'
+
+
+class TTSBackend:
+    """Base class: ``synthesize`` returns MP3 bytes for one chunk of text."""
+    name = 'base'
+    content_type = 'audio/mpeg'
+
+    def synthesize(self, text, lang='en', speed=1.0):
+        raise NotImplementedError
+
+    def cache_params(self, lang='en', speed=1.0):
+        """The part of an audio cache key that ``lang`` and ``speed`` contribute: settings giving identical audio share it."""
+        return f"{lang}\0{float(speed):.2f}"
+
+
+class GTTSBackend(TTSBackend):
+    """Google Translate TTS (needs network access)."""
+    name = 'gtts'
+
+    def synthesize(self, text, lang='en', speed=1.0):
+        from gtts import gTTS
+
+        buffer = BytesIO()
+        gTTS(text=text, lang=lang, slow=self.is_slow(speed)).write_to_fp(buffer)
+        return buffer.getvalue()
+
+    def is_slow(self, speed):
+        # gTTS only has a normal and a slow voice
+        return float(speed) < 0.8
+
+    def cache_params(self, lang='en', speed=1.0):
+        return f"{lang}\0{'slow' if self.is_slow(speed) else 'normal'}"
+
+
+class SilentBackend(TTSBackend):
+    """
+    Offline engine emitting silent MP3 audio of a realistic length.
+
+    Used in tests and in development without network access: output has the
+    duration real speech would have (~150 words per minute at speed 1.0).
+    """
+    name = 'silent'
+    # MPEG-1 Layer III, 128 kbps, 44.1 kHz, no padding: 417-byte frames of 1152 samples
+    FRAME = b'\xff\xfb\x90\x64' + b'\x00' * 413
+    FRAME_SECONDS = 1152 / 44100
+    WORDS_PER_MINUTE = 150
+
+    def synthesize(self, text, lang='en', speed=1.0):
+        seconds = len(text.split()) * 60 / (self.WORDS_PER_MINUTE * max(float(speed), 0.1))
+        return self.FRAME * max(1, round(seconds / self.FRAME_SECONDS))
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    path = getattr(settings, 'TTS_BACKEND', DEFAULT_BACKEND)
+    if _backend is None or _backend[0] != path:
+        _backend = (path, import_string(path)())
+    return _backend[1]
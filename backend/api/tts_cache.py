@@ -0,0 +1,211 @@
+"""
+Content-addressed cache of synthesized TTS audio.
+
+Each chunk of text is stored once under ``MEDIA_ROOT/tts_cache`` keyed by a
+hash of (text, language, speed), so identical book passages are synthesized
+a single time (speeds the engine renders alike share entries, see
+``TTSBackend.cache_params``) and then served from disk to every listener. Cold chunks of a
+request are synthesized concurrently by the configured engine (see
+api.tts_backends), and ``iter_audio`` streams them in order while later
+chunks are still being synthesized.
+
+The directory is bounded by ``TTS_CACHE_MAX_BYTES`` (default 500 MB): files
+are touched on every hit and the least recently used ones are evicted once
+the limit is exceeded.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from .tts_backends import get_backend
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = 'tts_cache'
+DEFAULT_MAX_BYTES = 500 * 1024 * 1024
+MAX_SYNTH_WORKERS = 4
+EVICT_INTERVAL = 300  # seconds between directory scans per process
+
+_key_locks = {}  # key -> [lock, threads holding or waiting for it]
+_key_locks_guard = threading.Lock()
+_last_eviction = None
+
+
+def chunk_text(text, chunk_size=1000):
+    """Split text on word boundaries into chunks of roughly ``chunk_size`` characters."""
+    chunks = []
+    current_chunk = []
+    current_length = 0
+
+    for word in text.split():
+        if current_length + len(word) > chunk_size and current_chunk:
+            chunks.append(' '.join(current_chunk))
+            current_chunk = [word]
+            current_length = len(word)
+        else:
+            current_chunk.append(word)
+            current_length += len(word) + 1
+
+    if current_chunk:
+        chunks.append(' '.join(current_chunk))
+    return chunks
+
+
+def cache_key(text, lang, speed, backend=None):
+    backend = backend or get_backend()
+    normalized = ' '.join(text.split())
+    return hashlib.sha256(f"{backend.name}\0{backend.cache_params(lang, speed)}\0{normalized}".encode('utf-8')).hexdigest()
+
+
+def cache_name(key):
+    """Storage name (relative to MEDIA_ROOT) of a cached chunk."""
+    return f"{CACHE_DIR}/{key[:2]}/{key}.mp3"
+
+
+def _cache_root():
+    return os.path.join(settings.MEDIA_ROOT, CACHE_DIR)
+
+
+@contextmanager
+def _key_lock(key):
+    """Serialize work on ``key``; the lock is dropped once no thread holds or waits for it."""
+    with _key_locks_guard:
+        entry = _key_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _key_locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _key_locks[key]
+
+
+def synthesize(text, lang, speed, path):
+    """Render ``text`` to an mp3 at ``path`` with the configured TTS backend."""
+    with open(path, 'wb') as f:
+        f.write(get_backend().synthesize(text, lang, speed))
+
+
+def get_or_synthesize(text, lang='en', speed=1.0):
+    """
+    Return ``(storage_name, cached)`` for a chunk, synthesizing it on a miss.
+
+    Audio is written to a temp file and renamed into place, so concurrent
+    readers (and other worker processes) never see a partial mp3.
+    """
+    key = cache_key(text, lang, speed)
+    name = cache_name(key)
+    path = os.path.join(settings.MEDIA_ROOT, name)
+
+    with _key_lock(key):
+        if os.path.exists(path):
+            try:
+                os.utime(path)  # mark as recently used
+            except OSError:
+                pass
+            return name, True
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+        os.close(fd)
+        try:
+            synthesize(text, lang, speed, tmp)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return name, False
+
+
+def get_or_synthesize_many(chunks, lang='en', speed=1.0, max_workers=MAX_SYNTH_WORKERS):
+    """Like ``get_or_synthesize`` for a list of chunks, synthesizing cold ones concurrently."""
+    if not chunks:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as pool:
+        results = list(pool.map(lambda chunk: get_or_synthesize(chunk, lang, speed), chunks))
+    if not all(cached for _, cached in results):
+        maybe_evict()
+    return results
+
+
+def evict(max_bytes=None):
+    """Delete least recently used files until the cache fits in ``max_bytes``; returns files removed."""
+    if max_bytes is None:
+        max_bytes = getattr(settings, 'TTS_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)
+
+    files = []
+    total = 0
+    for dirpath, _, filenames in os.walk(_cache_root()):
+        for filename in filenames:
+            if not filename.endswith('.mp3'):
+                continue
+            path = os.path.join(dirpath, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+    if total <= max_bytes:
+        return 0
+
+    removed = 0
+    for _, size, path in sorted(files):
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        removed += 1
+        total -= size
+        if total <= max_bytes:
+            break
+    logger.info(f"Evicted {removed} cached TTS files")
+    return removed
+
+
+def maybe_evict():
+    """Run ``evict`` at most once every ``EVICT_INTERVAL`` seconds per process."""
+    global _last_eviction
+    now = time.monotonic()
+    if _last_eviction is not None and now - _last_eviction < EVICT_INTERVAL:
+        return 0
+    _last_eviction = now
+    try:
+        return evict()
+    except Exception as e:
+        logger.error(f"TTS cache eviction failed: {str(e)}")
+        return 0
+
+
+def iter_audio(chunks, lang='en', speed=1.0, lookahead=MAX_SYNTH_WORKERS, block_size=64 * 1024):
+    """
+    Yield the audio of ``chunks`` in order as one MP3 byte stream.
+
+    The first chunk is sent as soon as it is ready while up to ``lookahead``
+    following chunks are synthesized in the background. Closing the generator
+    (client disconnect) cancels chunks that have not started.
+    """
+    pool = ThreadPoolExecutor(max_workers=max(1, lookahead))
+    pending = []
+    next_index = 0
+    try:
+        while next_index < len(chunks) or pending:
+            while next_index < len(chunks) and len(pending) < lookahead + 1:
+                pending.append(pool.submit(get_or_synthesize, chunks[next_index], lang, speed))
+                next_index += 1
+            name, _ = pending.pop(0).result()
+            with open(os.path.join(settings.MEDIA_ROOT, name), 'rb') as f:
+                for block in iter(lambda: f.read(block_size), b''):
+                    yield block
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    maybe_evict()
@@ -1,11 +1,11 @@
 from django.urls import include, path
 from .views import (
     AboutUsViewSet, AdminBookViewSet, AdminUserViewSet, BookListView, BookCategoryListView, BookViewSet, BooksubCategorylist, BulkQuestionCreateView, CategoryViewSet, LoginView,
-    PDFUploadAPIView, PaymentViewSet, ProjectDetailView, ProjectListView, ProjectViewSet, QCategoryViewSet,
-    QcategoryView, QuestionsViewSet, SignWordListAPIView, SignWordViewSet, SubcategoryViewSet, SubjectViewSet, TeamMemberViewSet, TestimonialViewSet,  UserPurchaseViewSet, UserRegisterView, admin_analytics, admin_bulk_operation, admin_system_health, admin_user_activity, current_user, dashboard_stats, get_questions,
+    PDFUploadAPIView, PDFUploadJobAPIView, PaymentViewSet, ProjectDetailView, ProjectListView, ProjectViewSet, QCategoryViewSet,
+    QcategoryView, QuestionsViewSet, SignWordListAPIView, SignWordViewSet, SubcategoryViewSet, SubjectViewSet, TeamMemberViewSet, TestimonialViewSet,  UserPurchaseViewSet, UserRegisterView, admin_analytics, admin_bulk_operation, admin_profile_download, admin_profile_token, admin_profiles, admin_system_health, admin_user_activity, current_user, dashboard_stats, get_questions,
     get_subjects, get_grouped_subjects, UserViewSet, recent_activities
 )
-from .audiobook_views import AudioBookViewSet, get_audiobook_detail, list_audiobooks, save_recording, generate_ai_audio, extract_pdf_text, accessibility_settings, text_to_speech_stream
+from .audiobook_views import AudioBookViewSet, get_audiobook_detail, list_audiobooks, save_recording, generate_ai_audio, extract_pdf_text, audiobook_chapter_audio, accessibility_settings, text_to_speech_stream, text_to_speech_audio
 from rest_framework import routers
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
@@ -44,6 +44,9 @@ urlpatterns = [
     path('admin/bulk-operation/', admin_bulk_operation, name='admin-bulk-operation'),
     path('admin/system-health/', admin_system_health, name='admin-system-health'),
     path('admin/user-activity/', admin_user_activity, name='admin-user-activity'),
+    path('admin/profiles/', admin_profiles, name='admin-profiles'),
+    path('admin/profiles/token/', admin_profile_token, name='admin-profile-token'),
+    path('admin/profiles/<int:capture_id>/<str:fmt>/', admin_profile_download, name='admin-profile-download'),
     
     # Authentication endpoints
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
@@ -65,6 +68,7 @@ urlpatterns = [
     path('projects/<int:pk>/', ProjectDetailView.as_view(), name='project-detail'),
     path('words/', SignWordListAPIView.as_view(), name='word-list'),
     path('upload-parse/', PDFUploadAPIView.as_view()),
+    path('upload-parse/<uuid:job_id>/', PDFUploadJobAPIView.as_view(), name='upload-parse-job'),
     path('questions/bulk/', BulkQuestionCreateView.as_view()),
 
     # PDF processing endpoints
@@ -72,6 +76,7 @@ urlpatterns = [
     path("pdfs/", views.list_pdfs, name="list_pdfs"),
     path("pdfs/<int:pdf_id>/analyze/", views.analyze_pdf, name="analyze_pdf"),
     path("pdfs/<int:pdf_id>/download/<str:file_type>/", views.download_file, name="download_file"),
+    path("books/<int:book_id>/pdf/", views.book_pdf, name="book_pdf"),
     
     # Payment endpoints
     path('payments/process/', PaymentViewSet.as_view({'post': 'process_payment'}), name='process-payment'),
@@ -99,6 +104,7 @@ urlpatterns = [
     # Audio book endpoints
     path('audiobooks/list/', list_audiobooks, name='list-audiobooks'),
     path('audiobooks/<int:book_id>/detail/', get_audiobook_detail, name='audiobook-detail'),
+    path('audiobooks/<int:book_id>/chapters/<int:index>/audio/', audiobook_chapter_audio, name='audiobook-chapter-audio'),
     path('audiobooks/save-recording/', save_recording, name='save-recording'),
     path('audiobooks/generate-audio/', generate_ai_audio, name='generate-ai-audio'),
     path('audiobooks/extract-text/<int:book_id>/', extract_pdf_text, name='extract-pdf-text'),
@@ -106,6 +112,7 @@ urlpatterns = [
     # Accessibility endpoints
     path('accessibility/settings/', accessibility_settings, name='accessibility-settings'),
     path('accessibility/tts-stream/', text_to_speech_stream, name='tts-stream'),
+    path('accessibility/tts-stream/audio/', text_to_speech_audio, name='tts-stream-audio'),
     
     # Include ViewSet router URLs
     path('', include(router.urls)),
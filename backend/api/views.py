@@ -1,19 +1,12 @@
 import logging
 import mimetypes
 import re
-from io import BytesIO
-import pytesseract
-import numpy as np
-import cv2
 from rest_framework.decorators import action
 from rest_framework import serializers
-from PIL import Image
-import fitz
-
-import pytesseract
 from django.conf import settings
 from django.core.mail import send_mail
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.utils.text import slugify
 from django.contrib.auth import authenticate, get_user_model
 from rest_framework import generics, status, viewsets
@@ -29,9 +22,11 @@ import os
 from django.db import models
 from .models import (
     AboutUs,
+    BackgroundJob,
     Book,
     BookCatagory,
     Payment,
+    ProfileCapture,
     Project,
     Questions,
     QCategory,
@@ -77,9 +72,18 @@ from .serializers import (
 )
 
 from rest_framework_simplejwt.tokens import RefreshToken
-from .activity_log  import get_recent_activities, log_activity  # from memory store
+from .activity_log import get_recent_activities, log_activity
+from .search_index import BookFullTextFilter
+from .question_import import store_uploads
+from . import analytics, counters, jobs, metrics, payment_events, pdf_analysis, profiling
+from .stats import dashboard_data
+from .entitlements import check_access as check_book_access, media_user, parse_book_ids
+from .pagination import BookKeysetPagination
+from .response_cache import CachedResponseMixin, cached_response, bump_version as bump_response_cache
+from .file_delivery import serve_file
+from .exchange_rates import convert as convert_currency, get_rate as get_currency_rate
 from rest_framework import viewsets, filters
-from django.http import FileResponse
+from django.http import Http404, HttpResponse
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
@@ -106,113 +110,27 @@ def dashboard_stats(request):
     if not (user.is_superuser or user.role in ['Admin', 'Staff']):
         return Response({'error': 'Insufficient permissions'}, status=status.HTTP_403_FORBIDDEN)
     
-    # Get current date for analytics
-    now = timezone.now()
-    thirty_days_ago = now - timedelta(days=30)
-    
-    # Enhanced statistics
-    data = {
-        # Basic counts
-        "total_books": Book.objects.count(),
-        "total_courses": Subject.objects.count(),
-        "total_exams": Questions.objects.count(),
-        "research_papers": Project.objects.filter(badge='featured').count(),
-        "active_students": User.objects.filter(role='Student').count(),
-        "ongoing_projects": Project.objects.count(),
-        "total_users": User.objects.count(),
-        "total_categories": BookCatagory.objects.count(),
-        "total_subcategories": SubBookCategory.objects.count(),
-        "total_sign_words": SignWord.objects.count(),
-        "total_testimonials": Testimonial.objects.count(),
-        "total_team_members": TeamMember.objects.count(),
-        
-        # Enhanced book type statistics
-        "books_by_type": {
-            "hard_copy": Book.objects.filter(book_type__in=['hard', 'both'], hard_price__gt=0, is_for_sale=True).count(),
-            "soft_copy": Book.objects.filter(book_type__in=['soft', 'both'], soft_price__gt=0, is_for_sale=True).count(),
-            "both_available": Book.objects.filter(book_type='both').count(),
-            "rental_available": Book.objects.filter(is_for_rent=True).count(),
-        },
-        
-        # Recent activity (last 30 days)
-        "books_added_last_30_days": Book.objects.filter(created_at__gte=thirty_days_ago).count(),
-        "users_registered_last_30_days": User.objects.filter(date_joined__gte=thirty_days_ago).count(),
-        "projects_added_last_30_days": Project.objects.filter(created_at__gte=thirty_days_ago).count(),
-        "questions_added_last_30_days": Questions.objects.filter(subject__created_at__gte=thirty_days_ago).count(),
-        
-        # User role distribution
-        "user_roles": {
-            "students": User.objects.filter(role='Student').count(),
-            "staff": User.objects.filter(role='Staff').count(),
-            "admins": User.objects.filter(role='Admin').count(),
-            "superusers": User.objects.filter(is_superuser=True).count(),
-        },
-        
-        # Content distribution
-        "content_stats": {
-            "books": {
-                "total": Book.objects.count(),
-                "free": Book.objects.filter(is_free=True).count(),
-                "premium": Book.objects.filter(is_premium=True).count(),
-                "featured": Book.objects.filter(is_featured=True).count(),
-            },
-            "projects": {
-                "total": Project.objects.count(),
-                "featured": Project.objects.filter(badge='featured').count(),
-                "top_rated": Project.objects.filter(badge='top-rated').count(),
-                "new": Project.objects.filter(badge='new').count(),
-            },
-            "books_by_language": dict(
-                Book.objects.values('language').annotate(count=models.Count('id')).values_list('language', 'count')
-            ),
-            "books_by_grade": dict(
-                Book.objects.values('grade_level').annotate(count=models.Count('id')).values_list('grade_level', 'count')
-            ),
-        },
-        
-        # Performance metrics
-        "performance": {
-            "total_book_views": Book.objects.aggregate(total_views=models.Sum('views'))['total_views'] or 0,
-            "total_project_views": Project.objects.aggregate(total_views=models.Sum('views'))['total_views'] or 0,
-            "avg_book_rating": Book.objects.aggregate(avg_rating=models.Avg('rating'))['avg_rating'] or 0,
-            "avg_project_rating": Project.objects.aggregate(avg_rating=models.Avg('rating'))['avg_rating'] or 0,
-            "total_book_downloads": Book.objects.aggregate(total_downloads=models.Sum('downloads'))['total_downloads'] or 0,
-        },
-        
-        # Payment statistics
-        "payment_stats": {
-            "total_payments": Payment.objects.count(),
-            "completed_payments": Payment.objects.filter(status='completed').count(),
-            "payments_this_month": Payment.objects.filter(
-                created_at__gte=thirty_days_ago, 
-                status='completed'
-            ).count(),
-            "payment_types": dict(
-                Payment.objects.filter(status='completed').values('payment_type').annotate(
-                    count=models.Count('id')
-                ).values_list('payment_type', 'count')
-            )
-        },
-        
-        # System health
-        "system_health": {
-            "server_status": "operational",  # This would be checked from actual system metrics
-            "last_backup": "2024-11-03T10:00:00Z",  # This would come from backup system
-            "database_size": "2.4 GB",  # This would come from database monitoring
-            "active_sessions": 247,  # This would come from session tracking
-        }
-    }
-    
-    return Response(data)
+    # Counters are maintained by signals and cached (see api/stats.py)
+    return Response(dashboard_data())
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def recent_activities(request):
-    activities = get_recent_activities(limit=10)
+    # Shared by all workers (api.activity_log); page back with ?before=<id>, poll with ?after=<id>
+    try:
+        limit = int(request.query_params.get('limit', 10))
+        before = request.query_params.get('before')
+        after = request.query_params.get('after')
+        before = int(before) if before else None
+        after = int(after) if after else None
+    except ValueError:
+        return Response({'error': 'limit, before and after must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+    activities = get_recent_activities(limit=limit, before=before, after=after)
 
     response_data = []
     for activity in activities:
         response_data.append({
+            "id": activity["id"],
             "type": activity.get("action", "unknown"),
             "text": activity.get("text", ""),
             "timestamp": activity.get("timestamp", ""),
@@ -484,8 +402,16 @@ class LoginView(APIView):
         }, status=status.HTTP_200_OK)
 
 class BookListView(APIView):
+    # ?cursor= / ?page_size= switch to keyset pages; ?fields= trims each book
+    pagination_class = BookKeysetPagination
+
     def get(self, request, *args, **kwargs):
-        books = Book.objects.all()
+        books = BookSerializer.setup_eager_loading(Book.objects.all())
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(books, request, view=self)
+        if page is not None:
+            serializer = BookSerializer(page, many=True, context={'request': request})
+            return paginator.get_paginated_response(serializer.data)
         serializer = BookSerializer(books, many=True, context={'request': request})
         return Response(serializer.data)
 
@@ -533,15 +459,25 @@ def generate_worksheet(request):
     return Response({'message': 'Worksheet generation is not available via this API endpoint. Use the admin/CLI tool.'}, status=status.HTTP_501_NOT_IMPLEMENTED)
 
 
+def visible_pdfs(user):
+    """The ``UploadedPDF`` rows ``user`` may see: their own, or all of them for staff."""
+    pdfs = UploadedPDF.objects.all()
+    if not (user.is_superuser or user.role in ['Admin', 'Staff']):
+        pdfs = pdfs.filter(user=user)
+    return pdfs
+
+
 @api_view(['GET'])
+@permission_classes([IsAuthenticated])
 def list_pdfs(request):
-    pdfs = UploadedPDF.objects.all().order_by('-uploaded_at')
+    pdfs = visible_pdfs(request.user).order_by('-uploaded_at')
     data = [
         {
             'id': p.id,
             'filename': os.path.basename(p.document.name) if p.document else None,
             'uploaded_at': p.uploaded_at,
-            'url': getattr(p.document, 'url', p.document.name if p.document else None)
+            # uploads/ is not served from /media/ (api.file_delivery)
+            'url': request.build_absolute_uri(reverse('download_file', args=[p.id, 'pdf'])) if p.document else None,
         }
         for p in pdfs
     ]
@@ -549,42 +485,81 @@ def list_pdfs(request):
 
 
 @api_view(['GET'])
+@permission_classes([IsAuthenticated])
 def analyze_pdf(request, pdf_id):
-    try:
-        pdf = UploadedPDF.objects.get(id=pdf_id)
-    except UploadedPDF.DoesNotExist:
+    """
+    Page/word summary of an uploaded PDF, built by a background job (see api.pdf_analysis).
+
+    Only the PDF's uploader and staff see it. Answers 202 with the job's
+    progress until the summary is ready; poll the same URL. ``?refresh=1``
+    analyses the PDF again, unless an analysis is already queued or running.
+    """
+    pdf = visible_pdfs(request.user).filter(id=pdf_id).first()
+    if pdf is None or not pdf.document:
         return Response({'message': 'PDF not found'}, status=status.HTTP_404_NOT_FOUND)
 
-    # Lightweight analysis placeholder — avoid heavy libs at import time.
-    return Response({
-        'id': pdf.id,
-        'filename': os.path.basename(pdf.document.name) if pdf.document else None,
-        'analysis': 'not implemented in API; use backend tools to analyze'
-    })
+    job = pdf_analysis.active_job(pdf)
+    if job is None and not request.query_params.get('refresh'):
+        job = pdf_analysis.latest_job(pdf)
+    if job is None:
+        job = jobs.enqueue('analyze_pdf', {'pdf_id': pdf.id, 'document': pdf.document.name}, user=request.user)
+    if job.status == 'done':
+        return Response(job.result)
+    if job.status == 'failed':
+        return Response(
+            {**jobs.serialize_job(job), 'message': f'Failed to analyze PDF: {job.error}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+    return Response(jobs.serialize_job(job), status=status.HTTP_202_ACCEPTED)
 
 
 @api_view(['GET'])
+@permission_classes([IsAuthenticated])
 def download_file(request, pdf_id, file_type):
-    try:
-        pdf = UploadedPDF.objects.get(id=pdf_id)
-    except UploadedPDF.DoesNotExist:
+    pdf = visible_pdfs(request.user).filter(id=pdf_id).first()
+    if pdf is None:
         return Response({'message': 'PDF not found'}, status=status.HTTP_404_NOT_FOUND)
 
     if file_type.lower() != 'pdf':
         return Response({'message': 'Only original PDF download is supported via this endpoint'}, status=status.HTTP_400_BAD_REQUEST)
 
+    if not pdf.document:
+        return Response({'message': 'PDF not found'}, status=status.HTTP_404_NOT_FOUND)
     try:
-        path = pdf.document.path
-        return FileResponse(open(path, 'rb'), as_attachment=True, filename=os.path.basename(path))
+        # Range/conditional requests and optional proxy offload (api.file_delivery)
+        return serve_file(request, pdf.document.path, as_attachment=True)
+    except Http404:
+        return Response({'message': 'PDF file is missing'}, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
         return Response({'message': f'Failed to open file: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+
+@api_view(['GET'])
+def book_pdf(request, book_id):
+    """
+    A book's PDF for the reader, after the entitlement check. Supports Range
+    requests, so the reader can fetch just the pages it needs. Links from the
+    API carry a signed ``?token=`` for iframes and new tabs (api.entitlements).
+    """
+    book = Book.objects.filter(id=book_id, is_active=True).only('id', 'pdf_file').first()
+    if book is None or not book.pdf_file:
+        return Response({'error': 'Book not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    result = check_book_access(media_user(request, book.id), [book.id])[book.id]
+    if not result['access']:
+        return Response({'error': result.get('message', 'Access denied')}, status=status.HTTP_403_FORBIDDEN)
+
+    try:
+        return serve_file(request, book.pdf_file.path)
+    except Http404:
+        return Response({'error': 'PDF file is missing'}, status=status.HTTP_404_NOT_FOUND)
+
 # Get subjects with optional search
 # ----------------------------
 @api_view(['GET'])
 def get_subjects(request):
     search_query = request.GET.get('search', '').strip()
-    subjects = Subject.objects.all()
+    subjects = SubjectSerializer.setup_eager_loading(Subject.objects.all())
     if search_query:
         subjects = subjects.filter(name__icontains=search_query)
     serializer = SubjectSerializer(subjects, many=True, context={'request': request})
@@ -672,20 +647,24 @@ def get_exam_by_subject_id(request, subject_id):
 
 
 class BookCategoryListView(APIView):
+    @cached_response(BookCatagory)
     def get(self, request):
         categories = BookCatagory.objects.all()
         serializer = BookCatagorySerializer(categories, many=True, context={'request': request})
         return Response(serializer.data)
     
 class BooksubCategorylist(APIView):
+    @cached_response(SubBookCategory)
     def get(self, request):
         subcategory = SubBookCategory.objects.all()
         serializer =SubBookCategorySerializer(subcategory,many=True, context={'request': request} )
         return Response(serializer.data)
     
 class QcategoryView(APIView):
+    # Subjects carry the requesting user's progress, so entries are per user
+    @cached_response(QCategory, Subject, Questions, UserSubjectProgress, per_user=True)
     def get(self, request):
-        qCategory= QCategory.objects.all()
+        qCategory= QCategorySerializer.setup_eager_loading(QCategory.objects.all())
         Serializer= QCategorySerializer(qCategory, many=True, context={'request':request})
         return Response(Serializer.data)
     
@@ -702,12 +681,12 @@ class ProjectDetailView(APIView):
 
     def get(self, request, pk):
         project = get_object_or_404(Project, pk=pk)
-        project.views += 1
-        project.save(update_fields=['views'])
+        counters.increment(project, 'views')
         serializer = ProjectSerializer(project, context={'request': request})
         return Response(serializer.data)
     
 class SignWordListAPIView(APIView):
+    @cached_response(SignWord)
     def get(self, request):
         words = SignWord.objects.all().order_by('word')
         serializer = SignWordSerializer(words, many=True, context={'request': request})
@@ -716,7 +695,14 @@ class SignWordListAPIView(APIView):
 
 
 class PDFUploadAPIView(APIView):
+    """
+    Queue uploaded exam papers for OCR and question parsing.
+
+    Returns 202 with a job id; poll ``upload-parse/<job_id>/`` for progress
+    and the parsed questions (see api.question_import).
+    """
     parser_classes = [MultiPartParser]
+    permission_classes = [IsAuthenticated]
 
     def post(self, request):
         files = request.FILES.getlist('file')
@@ -730,117 +716,35 @@ class PDFUploadAPIView(APIView):
         except Subject.DoesNotExist:
             return Response({'error': 'Invalid subject ID.'}, status=404)
 
-        all_questions = []
-
-        for file in files:
-            mime_type, _ = mimetypes.guess_type(file.name)
-            file.seek(0)
-
-            if mime_type and 'pdf' in mime_type:
-                text = self.extract_text_from_pdf(file)
-            elif mime_type and mime_type.startswith('image/'):
-                text = self.extract_text_from_image(file)
-            else:
-                continue  # Unsupported file type
-
-            questions = self.parse_questions(text, subject.id)
-            all_questions.extend(questions)
+        stored = store_uploads(files)
+        if not stored:
+            return Response({'error': 'Upload PDF or image files.'}, status=400)
 
+        job = jobs.enqueue(
+            'ocr_questions',
+            {'subject_id': subject.id, 'files': stored},
+            user=request.user,
+        )
         return Response({
-            "message": f"{len(all_questions)} questions parsed.",
-            "questions": all_questions
-        }, status=200)
+            **jobs.serialize_job(job),
+            "message": f"{len(stored)} file(s) queued for parsing.",
+            "status_url": request.build_absolute_uri(f"{request.path.rstrip('/')}/{job.pk}/"),
+        }, status=202)
 
-    def extract_text_from_pdf(self, file):
-        text = ""
-        try:
-            file_bytes = file.read()
-            doc = fitz.open(stream=file_bytes, filetype="pdf")
-            for page in doc:
-                page_text = page.get_text().strip()
-
-                if not page_text:
-                    # OCR fallback using page image
-                    pix = page.get_pixmap()
-                    img_data = pix.tobytes("png")
-                    image = Image.open(BytesIO(img_data)).convert("RGB")
-
-                    img_np = np.array(image)
-                    gray = cv2.cvtColor(img_np, cv2.COLOR_RGB2GRAY)
-                    _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY)
-                    processed_img = Image.fromarray(thresh)
-
-                    page_text = pytesseract.image_to_string(processed_img)
-
-                text += "\n" + page_text
-        except Exception as e:
-            text = f"OCR Failed: {str(e)}"
-        return text
 
-    def extract_text_from_image(self, file):
-        try:
-            image = Image.open(file).convert("RGB")
-            img_np = np.array(image)
-            gray = cv2.cvtColor(img_np, cv2.COLOR_RGB2GRAY)
-            _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY)
-            processed_img = Image.fromarray(thresh)
-            return pytesseract.image_to_string(processed_img)
-        except Exception as e:
-            return f"OCR Failed on image: {str(e)}"
-
-    def parse_questions(self, text, subject_id):
-        # Normalize bullet points
-        text = re.sub(r'[•·●]', '-', text)
-
-        # Split text into question blocks
-        question_blocks = re.split(r'\n?\s*\d+[\.\)]\s+', '\n' + text)[1:]
-
-        parsed_questions = []
-
-        for block in question_blocks:
-            lines = [line.strip() for line in block.strip().split('\n') if line.strip()]
-            if not lines:
-                continue
-
-            question_text = lines[0]
-            options = []
-            correct_option = ""
-            explanation = ""
-
-            for line in lines[1:]:
-                opt_match = re.match(r'^([A-Da-d][\.\)])\s*(.*)', line)
-                if opt_match:
-                    options.append(opt_match.group(2).strip())
-                elif 'answer' in line.lower():
-                    ans_text = line.split(':')[-1].strip()
-                    # Handle single-letter answers or full option text
-                    if len(ans_text) == 1 and ans_text.upper() in ['A', 'B', 'C', 'D']:
-                        idx = ord(ans_text.upper()) - ord('A')
-                        if 0 <= idx < len(options):
-                            correct_option = options[idx]
-                            explanation = f"Answer: {ans_text.upper()} - {correct_option}"
-                        else:
-                            explanation = f"Answer {ans_text} not matched."
-                    else:
-                        # Attempt to match by option text
-                        try:
-                            idx = options.index(ans_text)
-                            correct_option = options[idx]
-                            explanation = f"Answer matched by text: {correct_option}"
-                        except ValueError:
-                            explanation = f"Answer {ans_text} not found in options."
-
-            if question_text and len(options) >= 2:
-                parsed_questions.append({
-                    "id": None,
-                    "subject": subject_id,
-                    "question_text": question_text,
-                    "options": options,
-                    "correct_option": correct_option,
-                    "explain": explanation
-                })
+class PDFUploadJobAPIView(APIView):
+    """Status, progress and (when done) parsed questions of an upload job; only its uploader and staff see it."""
+    permission_classes = [IsAuthenticated]
 
-        return parsed_questions
+    def get(self, request, job_id):
+        jobs_visible = BackgroundJob.objects.filter(kind='ocr_questions')
+        if not (request.user.is_superuser or request.user.role in ['Admin', 'Staff']):
+            jobs_visible = jobs_visible.filter(user=request.user)
+        job = get_object_or_404(jobs_visible, pk=job_id)
+        data = jobs.serialize_job(job)
+        if job.status == 'done' and job.result:
+            data.update(job.result)
+        return Response(data)
 
 
 class SaveEditedQuestionsAPIView(APIView):
@@ -909,10 +813,13 @@ class EnhancedBookViewSet(viewsets.ModelViewSet):
     queryset = Book.objects.filter(is_active=True)
     serializer_class = BookSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    # ?q= uses the full-text index (api.search_index); ?search= keeps the legacy icontains scan
+    filter_backends = [filters.SearchFilter, filters.OrderingFilter, BookFullTextFilter]
     search_fields = ['title', 'author', 'description', 'tags']
     ordering_fields = ['title', 'author', 'created_at', 'views', 'downloads', 'rating', 'price', 'hard_price', 'soft_price']
     ordering = ['-created_at']
+    # Opt-in keyset pages (?cursor= / ?page_size=); plain lists otherwise
+    pagination_class = BookKeysetPagination
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
@@ -920,7 +827,7 @@ class EnhancedBookViewSet(viewsets.ModelViewSet):
         return BookSerializer
 
     def get_queryset(self):
-        queryset = Book.objects.filter(is_active=True)
+        queryset = BookSerializer.setup_eager_loading(Book.objects.filter(is_active=True))
         
         # Filter by book type
         book_type = self.request.query_params.get('book_type')
@@ -951,8 +858,7 @@ class EnhancedBookViewSet(viewsets.ModelViewSet):
     def retrieve(self, request, *args, **kwargs):
         """Enhanced retrieve with view tracking"""
         instance = self.get_object()
-        instance.views += 1
-        instance.save()
+        counters.increment(instance, 'views')
         
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
@@ -961,17 +867,15 @@ class EnhancedBookViewSet(viewsets.ModelViewSet):
     def increment_views(self, request, pk=None):
         """Increment book view count"""
         book = self.get_object()
-        book.views += 1
-        book.save()
-        return Response({'success': True, 'views': book.views})
+        views = counters.increment(book, 'views')
+        return Response({'success': True, 'views': views})
 
     @action(detail=True, methods=['post'])
     def increment_downloads(self, request, pk=None):
         """Increment book download count"""
         book = self.get_object()
-        book.downloads += 1
-        book.save()
-        return Response({'success': True, 'downloads': book.downloads})
+        downloads = counters.increment(book, 'downloads')
+        return Response({'success': True, 'downloads': downloads})
 
     @action(detail=False, methods=['get'])
     def hard_books(self, request):
@@ -1142,11 +1046,13 @@ class QCategoryViewSet(viewsets.ModelViewSet):
     ordering_fields = ['created_at', 'enrolled']
     ordering = ['-created_at']
 
+    def get_queryset(self):
+        return QCategorySerializer.setup_eager_loading(super().get_queryset())
+
     @action(detail=True, methods=['post'])
     def enroll(self, request, pk=None):
         category = self.get_object()
-        category.enrolled += 1
-        category.save()
+        counters.increment(category, 'enrolled')
         serializer = self.get_serializer(category)
         return Response(serializer.data)
     
@@ -1154,6 +1060,12 @@ class QCategoryViewSet(viewsets.ModelViewSet):
 class SubjectViewSet(viewsets.ModelViewSet):
     queryset = Subject.objects.all()
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ['list', 'retrieve']:
+            queryset = SubjectSerializer.setup_eager_loading(queryset)
+        return queryset
+
     def get_serializer_class(self):
         if self.action in ['list', 'retrieve']:
             return SubjectWithProgressSerializer
@@ -1255,17 +1167,20 @@ class SignWordViewSet(viewsets.ModelViewSet):
     queryset = SignWord.objects.all()
     serializer_class = SignWordSerializer
 
-class AboutUsViewSet(viewsets.ModelViewSet):
+class AboutUsViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = AboutUs.objects.all()
     serializer_class = AboutUsSerializer
+    cache_models = (AboutUs,)
 
-class TestimonialViewSet(viewsets.ModelViewSet):
+class TestimonialViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Testimonial.objects.all()
     serializer_class = TestimonialSerializer
+    cache_models = (Testimonial,)
 
-class TeamMemberViewSet(viewsets.ModelViewSet):
+class TeamMemberViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = TeamMember.objects.all()
     serializer_class = TeamMemberSerializer
+    cache_models = (TeamMember,)
 
     def perform_create(self, serializer):
         project = serializer.save(profile=self.request.user)
@@ -1293,48 +1208,35 @@ class UserPurchaseViewSet(viewsets.ModelViewSet):
         return UserPurchase.objects.none()
 
     @action(detail=False, methods=['get'])
-    def check_access(self, request):
+    def check_access(self, request, book_id=None):
         """Check if user has access to a specific book"""
-        book_id = request.query_params.get('book_id')
+        book_id = book_id or request.query_params.get('book_id')
         if not book_id:
             return Response({'access': False, 'message': 'book_id is required'}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            book = Book.objects.get(id=book_id)
-        except Book.DoesNotExist:
+            book_ids = parse_book_ids([book_id])
+        except ValueError:
             return Response({'access': False, 'message': 'Book not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        # Free books are always accessible
-        if book.is_free:
-            return Response({'access': True, 'reason': 'free_book'})
+        result = check_book_access(request.user, book_ids)[book_ids[0]]
+        if result.get('message') == 'Book not found':
+            return Response(result, status=status.HTTP_404_NOT_FOUND)
+        return Response(result)
 
-        # Check user purchases
-        if request.user.is_authenticated:
-            # Check for purchases that haven't expired
-            now = timezone.now()
-            purchase = UserPurchase.objects.filter(
-                user=request.user,
-                book=book,
-                expires_at__isnull=True
-            ).first()
-            
-            if not purchase:
-                # Check for rental that hasn't expired
-                purchase = UserPurchase.objects.filter(
-                    user=request.user,
-                    book=book,
-                    expires_at__gte=now
-                ).first()
-            
-            if purchase:
-                return Response({
-                    'access': True, 
-                    'purchase_type': purchase.purchase_type,
-                    'purchase_id': purchase.id,
-                    'expires_at': purchase.expires_at
-                })
-        
-        return Response({'access': False, 'message': 'No purchase found'})
+    @action(detail=False, methods=['get', 'post'], url_path='check-access-batch')
+    def check_access_batch(self, request):
+        """Check access to many books at once (?book_ids=1,2,3 or {"book_ids": [1, 2, 3]})"""
+        raw = request.data.get('book_ids') if request.method == 'POST' else request.query_params.get('book_ids')
+        try:
+            book_ids = parse_book_ids(raw)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if not book_ids:
+            return Response({'error': 'book_ids is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = check_book_access(request.user, book_ids)
+        return Response({'results': {str(book_id): result for book_id, result in results.items()}})
 
 
 class PaymentViewSet(viewsets.ModelViewSet):
@@ -1441,8 +1343,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
                 else:
                     return Response({'error': 'Invalid payment type'}, status=400)
                 
-                exchange_rate = 55  # USD to ETB
-                local_amount = amount * exchange_rate
+                local_amount, exchange_rate = convert_currency(amount, 'USD', 'ETB')
                 transaction_id = f"TXN{timezone.now().strftime('%Y%m%d%H%M%S')}{book_id}"
                 
                 # Calculate rental dates
@@ -1468,7 +1369,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
                     rental_start_date=rental_start_date,
                     rental_end_date=rental_end_date,
                     payment_details={
-                        'exchange_rate': exchange_rate,
+                        'exchange_rate': float(exchange_rate),
                         'user_agent': request.META.get('HTTP_USER_AGENT', ''),
                         'ip_address': self.get_client_ip(request),
                     }
@@ -1660,13 +1561,8 @@ class BookAnalyticsView(APIView):
 # ================================
 
 def get_exchange_rate():
-    """Get current USD to ETB exchange rate"""
-    try:
-        import requests
-        response = requests.get('https://api.exchangerate-api.com/v4/latest/USD')
-        return response.json().get('rates', {}).get('ETB', 55)
-    except:
-        return 55
+    """Get current USD to ETB exchange rate (cached, see api.exchange_rates)"""
+    return float(get_currency_rate('USD', 'ETB'))
 
 
 # ================================
@@ -1682,64 +1578,13 @@ def admin_analytics(request):
     if not (user.is_superuser or user.role in ['Admin', 'Staff']):
         return Response({'error': 'Insufficient permissions'}, status=status.HTTP_403_FORBIDDEN)
     
-    # Date ranges
-    now = timezone.now()
-    last_7_days = now - timedelta(days=7)
-    last_30_days = now - timedelta(days=30)
-    last_90_days = now - timedelta(days=90)
-    
-    # User growth analytics
-    user_growth = []
-    for i in range(7):
-        date = now - timedelta(days=i)
-        count = User.objects.filter(date_joined__date=date.date()).count()
-        user_growth.append({'date': date.date().isoformat(), 'count': count})
-    
-    # Content analytics
-    content_analytics = {
-        'books': {
-            'total': Book.objects.count(),
-            'this_week': Book.objects.filter(created_at__gte=last_7_days).count(),
-            'this_month': Book.objects.filter(created_at__gte=last_30_days).count(),
-            'most_viewed': list(Book.objects.order_by('-views')[:5].values('id', 'title', 'views')),
-            'most_downloaded': list(Book.objects.order_by('-downloads')[:5].values('id', 'title', 'downloads')),
-        },
-        'projects': {
-            'total': Project.objects.count(),
-            'this_week': Project.objects.filter(created_at__gte=last_7_days).count(),
-            'this_month': Project.objects.filter(created_at__gte=last_30_days).count(),
-            'most_viewed': list(Project.objects.order_by('-views')[:5].values('id', 'title', 'views')),
-        },
-        'questions': {
-            'total': Questions.objects.count(),
-            'this_week': Questions.objects.filter(subject__created_at__gte=last_7_days).count(),
-            'this_month': Questions.objects.filter(subject__created_at__gte=last_30_days).count(),
-        }
-    }
-    
-    # Revenue analytics (if payment data exists)
-    revenue_analytics = {
-        'total_payments': Payment.objects.count(),
-        'completed_payments': Payment.objects.filter(status='completed').count(),
-        'total_revenue': Payment.objects.filter(status='completed').aggregate(
-            total=models.Sum('amount')
-        )['total'] or 0,
-        'payments_this_month': Payment.objects.filter(
-            created_at__gte=last_30_days, status='completed'
-        ).count(),
-        'payment_methods': dict(
-            Payment.objects.filter(status='completed').values('payment_method').annotate(
-                count=models.Count('id')
-            ).values_list('payment_method', 'count')
-        )
-    }
-    
-    return Response({
-        'user_growth': user_growth,
-        'content_analytics': content_analytics,
-        'revenue_analytics': revenue_analytics,
-        'generated_at': now.isoformat()
-    })
+    # ?range=7d|30d|365d (or a number of days), read from rollups (see api/analytics.py)
+    try:
+        days = analytics.parse_range(request.query_params.get('range'))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(analytics.report(days))
 
 
 @api_view(['POST'])
@@ -1786,10 +1631,12 @@ def admin_bulk_operation(request):
         
         elif operation == 'activate':
             updated_count = queryset.update(is_active=True)
+            bump_response_cache(model_class)
             return Response({'success': True, 'updated_count': updated_count, 'message': f'Activated {updated_count} items'})
         
         elif operation == 'deactivate':
             updated_count = queryset.update(is_active=False)
+            bump_response_cache(model_class)
             return Response({'success': True, 'updated_count': updated_count, 'message': f'Deactivated {updated_count} items'})
         
         elif operation == 'export':
@@ -1813,33 +1660,71 @@ def admin_system_health(request):
     if not (user.is_superuser or user.role in ['Admin', 'Staff']):
         return Response({'error': 'Insufficient permissions'}, status=status.HTTP_403_FORBIDDEN)
     
-    health_data = {
-        'status': 'healthy',
-        'timestamp': timezone.now().isoformat(),
-        'checks': {
-            'database': 'healthy',
-            'cache': 'healthy', 
-            'storage': 'healthy',
-            'email': 'healthy',
-        },
-        'metrics': {
-            'database_size': '2.4 GB',
-            'active_sessions': 247,
-            'memory_usage': '68%',
-            'cpu_usage': '23%',
-            'disk_usage': '45%',
-            'uptime': '15 days, 4 hours',
-        },
-        'services': {
-            'django': 'running',
-            'redis': 'running',
-            'postgres': 'running',
-            'nginx': 'running',
-        },
-        'alerts': []
-    }
-    
-    return Response(health_data)
+    return Response(metrics.health_report())
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def admin_profiles(request):
+    """Recent request profiles (api.profiling), newest first"""
+    user = request.user
+
+    if not (user.is_superuser or user.role in ['Admin', 'Staff']):
+        return Response({'error': 'Insufficient permissions'}, status=status.HTTP_403_FORBIDDEN)
+
+    try:
+        limit = min(int(request.query_params.get('limit', 50)), 200)
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    captures = ProfileCapture.objects.select_related('requested_by')
+    view = request.query_params.get('view')
+    if view:
+        captures = captures.filter(view=view)
+    return Response([profiling.serialize_capture(capture, request) for capture in captures[:limit]])
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def admin_profile_token(request):
+    """A signed header value that makes the server profile the requests sending it"""
+    user = request.user
+
+    if not (user.is_superuser or user.role in ['Admin', 'Staff']):
+        return Response({'error': 'Insufficient permissions'}, status=status.HTTP_403_FORBIDDEN)
+
+    return Response({
+        'header': profiling.HEADER,
+        'token': profiling.issue_token(user),
+        'expires_in': getattr(settings, 'PROFILING_TOKEN_MAX_AGE', profiling.DEFAULT_TOKEN_MAX_AGE),
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def admin_profile_download(request, capture_id, fmt):
+    """A profile as pstats (``.prof``), collapsed stacks or a flame graph SVG"""
+    user = request.user
+
+    if not (user.is_superuser or user.role in ['Admin', 'Staff']):
+        return Response({'error': 'Insufficient permissions'}, status=status.HTTP_403_FORBIDDEN)
+    if fmt not in profiling.FORMATS:
+        return Response({'error': f"Format must be one of: {', '.join(profiling.FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+    capture = ProfileCapture.objects.filter(id=capture_id).first()
+    if capture is None:
+        return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        if fmt == 'pstats':
+            return serve_file(request, capture.pstats_file.path, filename=f'profile-{capture.id}.prof', as_attachment=True)
+        if fmt == 'collapsed':
+            return serve_file(request, capture.collapsed_file.path, filename=f'profile-{capture.id}.txt', as_attachment=True)
+        with capture.collapsed_file.open('rb') as f:
+            stacks = profiling.parse_collapsed(f.read().decode('utf-8'))
+    except (Http404, FileNotFoundError):
+        return Response({'error': 'Profile file is missing'}, status=status.HTTP_404_NOT_FOUND)
+    response = HttpResponse(profiling.flamegraph_svg(stacks), content_type='image/svg+xml')
+    response['Content-Security-Policy'] = "default-src 'none'; style-src 'unsafe-inline'"
+    return response
 
 
 @api_view(['GET'])
@@ -2121,9 +2006,12 @@ class ChapaPaymentAPIView(APIView):
             phone_number = serializer.validated_data.get('phone_number', '')
             description = serializer.validated_data.get('description', f'Purchase: {book.title}')
             
+            # Prices are in USD; Chapa charges in ETB
+            local_amount, exchange_rate = convert_currency(amount, 'USD', 'ETB')
+
             # Create Chapa checkout
             checkout_response = chapa_service.create_checkout(
-                amount=amount,
+                amount=float(local_amount),
                 currency='ETB',
                 description=description,
                 return_url=f"{request.build_absolute_uri('/')}/payment/success?tx_ref={{tx_ref}}",
@@ -2143,7 +2031,6 @@ class ChapaPaymentAPIView(APIView):
             if checkout_response['success']:
                 # Create payment record in database
                 transaction_id = checkout_response['tx_ref']
-                local_amount = amount
                 local_currency = 'ETB'
                 
                 payment = Payment.objects.create(
@@ -2160,6 +2047,7 @@ class ChapaPaymentAPIView(APIView):
                     rental_duration_weeks=serializer.validated_data.get('rental_duration_weeks'),
                     payment_details={
                         'chapa_payment_id': checkout_response.get('payment_id'),
+                        'exchange_rate': float(exchange_rate),
                         'checkout_url': checkout_response['checkout_url'],
                         'customer_email': customer_email,
                         'customer_name': customer_name,
@@ -2174,7 +2062,7 @@ class ChapaPaymentAPIView(APIView):
                         'checkout_url': checkout_response['checkout_url'],
                         'tx_ref': transaction_id,
                         'payment_id': checkout_response.get('payment_id'),
-                        'amount': amount,
+                        'amount': float(local_amount),
                         'currency': 'ETB',
                         'payment_id': payment.id
                     }
@@ -2283,7 +2171,10 @@ class ChapaPaymentAPIView(APIView):
 @permission_classes([AllowAny])
 def chapa_webhook(request):
     """
-    Chapa webhook endpoint for receiving payment notifications
+    Chapa webhook endpoint for receiving payment notifications.
+
+    The event is only stored in the inbox and acknowledged; a background job
+    applies it to the payment (see api.payment_events).
     """
     try:
         # Parse webhook data
@@ -2291,39 +2182,11 @@ def chapa_webhook(request):
         if not serializer.is_valid():
             logger.warning(f"Invalid webhook data: {serializer.errors}")
             return Response({'status': 'ignored'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        webhook_data = serializer.validated_data
-        tx_ref = webhook_data['tx_ref']
-        status = webhook_data['status']
-        
-        # Update payment status
-        try:
-            payment = Payment.objects.get(transaction_id=tx_ref)
-            payment.status = status
-            
-            # Update payment details with webhook data
-            payment_details = payment.payment_details or {}
-            payment_details.update({
-                'chapa_reference': webhook_data.get('reference'),
-                'webhook_event': webhook_data.get('event'),
-                'webhook_time': webhook_data.get('event_time').isoformat() if webhook_data.get('event_time') else None,
-                'customer_phone': webhook_data.get('customer_phone_number')
-            })
-            payment.payment_details = payment_details
-            payment.save()
-            
-            # Create user purchase if payment is successful
-            if status == 'success':
-                ChapaPaymentAPIView()._create_user_purchase(payment)
-            
-            logger.info(f"Webhook processed for {tx_ref}: {status}")
-            
-        except Payment.DoesNotExist:
-            logger.warning(f"Payment not found for webhook: {tx_ref}")
-            return Response({'status': 'ignored'}, status=status.HTTP_404_NOT_FOUND)
-        
-        return Response({'status': 'processed'})
-        
+
+        payload = request.data.dict() if hasattr(request.data, 'dict') else dict(request.data)
+        event, created = payment_events.record(payload, serializer.validated_data)
+        return Response({'status': 'received' if created else 'duplicate'})
+
     except Exception as e:
         logger.error(f"Webhook processing error: {str(e)}")
         return Response({'status': 'error', 'message': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -2363,8 +2226,8 @@ def get_chapa_supported_currencies(request):
             ],
             'default_currency': 'ETB',
             'exchange_rates': {
-                'USD_TO_ETB': 55.0,
-                'ETB_TO_USD': 0.018
+                'USD_TO_ETB': float(get_currency_rate('USD', 'ETB')),
+                'ETB_TO_USD': float(get_currency_rate('ETB', 'USD'))
             }
         }
         return Response({
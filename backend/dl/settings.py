@@ -26,6 +26,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # MUST be top
+    'api.metrics.MetricsMiddleware',  # request latency and SQL counts (see api/metrics.py)
+    'api.query_budget.QueryBudgetMiddleware',  # slow-request log and Server-Timing (see api/query_budget.py)
+    'api.profiling.ProfilingMiddleware',  # sampled/on-demand request profiles (see api/profiling.py)
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -41,6 +44,10 @@ CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1:8081",  # Expo dev server
 ]
 
+# Let browser clients read the per-request backend cost (see api/query_budget.py)
+# and the id of a requested profile (see api/profiling.py)
+CORS_EXPOSE_HEADERS = ['Server-Timing', 'X-Profile-Id']
+
 # Allow all origins for mobile development (more permissive)
 CORS_ALLOW_ALL_ORIGINS = True  # For development only!
 
@@ -71,6 +78,13 @@ DATABASES = {
     }
 }
 
+# The built-in backends, counting hits and misses (see api/cache_backends.py)
+CACHES = {
+    'default': {
+        'BACKEND': 'api.cache_backends.LocMemCache',
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',},
@@ -111,6 +125,85 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# How PDFs and media are sent (see api/file_delivery.py): 'django' streams them
+# itself; 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache) hands the transfer
+# to the front proxy after Django's access check. For nginx, map
+# FILE_DELIVERY_ACCEL_PREFIX to MEDIA_ROOT in an `internal` location.
+FILE_DELIVERY_BACKEND = os.getenv('FILE_DELIVERY_BACKEND', 'django')
+FILE_DELIVERY_ACCEL_PREFIX = '/protected-media/'
+
+# Text-to-speech engine (see api/tts_backends.py); SilentBackend works offline
+TTS_BACKEND = os.getenv('TTS_BACKEND', 'api.tts_backends.GTTSBackend')
+
+# Disk cache of OCR'd PDF pages and images (see api/ocr.py)
+OCR_CACHE_MAX_BYTES = 200 * 1024 * 1024
+OCR_CACHE_MAX_AGE = 90 * 24 * 3600  # seconds a page may go unused before it is deleted
+
+# Admin dashboard statistics (see api/stats.py)
+DASHBOARD_STATS_TTL = 60  # seconds the assembled payload is cached
+DASHBOARD_STATS_RECONCILE_INTERVAL = 3600  # seconds between full recounts
+
+# Admin analytics rollups (see api/analytics.py)
+ANALYTICS_TTL = 60  # seconds a report is cached
+ANALYTICS_REFRESH_INTERVAL = 900  # seconds between incremental aggregations
+
+# Seconds a reference-data response body is cached (see api/response_cache.py);
+# entries are invalidated as soon as the underlying models change
+RESPONSE_CACHE_TTL = 3600
+# Cache alias holding the model version tokens that 304s are answered from;
+# point it at a non-database cache so revalidations skip the database
+RESPONSE_CACHE_VERSIONS_ALIAS = 'default'
+
+# Seconds a user's purchased-book set is cached (see api/entitlements.py)
+ENTITLEMENT_CACHE_TTL = 300
+# Seconds a signed book file link (PDF, audiobook chapters) keeps working
+BOOK_MEDIA_TOKEN_MAX_AGE = 24 * 3600
+
+# Widths (px) of the WebP/JPEG variants rendered for uploaded images (see api/thumbnails.py)
+THUMBNAIL_WIDTHS = (120, 240, 480, 960)
+
+# Chapa gateway client (see api/chapa_service.py and api/http_client.py)
+CHAPA_TIMEOUTS = {}  # per-operation (connect, read) seconds, e.g. {'verify_transaction': (3, 5)}
+CHAPA_MAX_RETRIES = 2  # idempotent calls only, plus calls that never reached the gateway
+CHAPA_BREAKER_THRESHOLD = 5  # consecutive failures before failing fast...
+CHAPA_BREAKER_COOLDOWN = 30  # ...for this many seconds
+
+# Exchange rates for payments (see api/exchange_rates.py); rates are per 1 USD
+EXCHANGE_RATE_PROVIDER = os.getenv('EXCHANGE_RATE_PROVIDER', 'api.exchange_rates.ExchangeRateAPIProvider')
+EXCHANGE_RATE_TTL = 3600  # seconds before rates are refreshed in the background
+EXCHANGE_RATE_MAX_AGE = 7 * 24 * 3600  # longest stale rates are served during an upstream outage
+EXCHANGE_RATE_STATIC_RATES = {'USD': 1.0, 'ETB': 55.0}  # StaticProvider table and last-resort fallback
+
+# Admin activity feed (see api/activity_log.py)
+ACTIVITY_LOG_FLUSH_INTERVAL = 2  # seconds entries are buffered per worker; 0 writes immediately
+ACTIVITY_LOG_BUFFER_MAX = 10000  # entries kept per worker while writes fail; the oldest are dropped
+ACTIVITY_LOG_RETENTION_DAYS = 90
+ACTIVITY_LOG_MAX_ROWS = 100000
+
+# Runtime metrics (see api/metrics.py), served at /metrics and in the admin system health
+METRICS_FLUSH_INTERVAL = 15  # seconds between each worker's snapshot writes
+METRICS_WORKER_RETENTION = 24 * 3600  # seconds before a stopped worker's row is folded into the 'retired' totals
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')  # bearer token for Prometheus scrapes
+
+# Per-request SQL budget (see api/query_budget.py); requests over it are logged
+SQL_BUDGET_MAX_QUERIES = 50
+SQL_BUDGET_MAX_SECONDS = 1.0
+SQL_BUDGET_REPEAT_THRESHOLD = 5  # runs of one query shape reported as a likely N+1
+SQL_BUDGET_KEPT_QUERIES = 200  # queries per request kept for the over-budget breakdown (see api/metrics.py)
+SQL_BUDGET_OVERRIDES = {}  # per URL name, e.g. {'seller_orders': {'queries': 100, 'seconds': None}}
+SQL_BUDGET_SERVER_TIMING = True
+
+# Request profiling (see api/profiling.py); profiles are also taken on demand
+# with an X-Profile-Token header from POST /api/admin/profiles/token/
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0'))  # fraction of requests; 0 disables sampling
+PROFILING_VIEWS = []  # only sample these URL names (empty: all)
+PROFILING_INTERVAL = 0.005  # seconds between stack samples
+PROFILING_TOKEN_MAX_AGE = 3600
+PROFILING_MAX_CAPTURES = 200
+
+# Write-behind view/download counters (see api/counters.py)
+COUNTER_FLUSH_INTERVAL = 5  # seconds; 0 writes every increment immediately
+
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'  # Use a valid SMTP server
 EMAIL_PORT = 587
@@ -24,6 +24,22 @@ if os.environ.get('DATABASE_URL'):
         )
     }
 
+# Cache shared by all gunicorn workers (table created with `manage.py createcachetable`)
+CACHES = {
+    'default': {
+        'BACKEND': 'api.cache_backends.DatabaseCache',
+        'LOCATION': 'django_cache',
+    },
+    # Response cache version tokens (see api/response_cache.py): on local disk
+    # so conditional GETs are answered without a database round trip
+    'response_versions': {
+        'BACKEND': 'api.cache_backends.FileBasedCache',
+        'LOCATION': os.environ.get('RESPONSE_CACHE_VERSIONS_DIR', '/tmp/dl_response_versions'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+RESPONSE_CACHE_VERSIONS_ALIAS = 'response_versions'
+
 # Static files
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATIC_URL = '/static/'
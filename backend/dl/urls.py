@@ -16,18 +16,17 @@ Including another URLconf
 """
 from django.conf import settings
 from django.contrib import admin
-from django.urls import path , include
-from django.conf.urls.static import static
-from api.health import health_check
+from django.urls import path , include, re_path
+from api.file_delivery import serve_media
+from api.health import health_check, prometheus_metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
     path('api/health/', health_check, name='health_check'),
     path('health/', health_check, name='health_check_root'),
+    path('metrics', prometheus_metrics, name='metrics'),
+    # Media files (also in production, where static() would add nothing), with
+    # Range/conditional support and optional proxy offload (api.file_delivery)
+    re_path(r'^%s(?P<path>.*)$' % settings.MEDIA_URL.lstrip('/'), serve_media, name='media'),
 ]
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-else:
-    # Serve media files in production
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -0,0 +1,60 @@
+"""
+Gunicorn settings, loaded automatically when gunicorn starts in backend/.
+
+The master process also runs the background job worker (``manage.py
+run_jobs``, see api/jobs.py) as a child process. Job handlers read files the
+web workers saved to the local ``MEDIA_ROOT`` (exam-paper uploads, images to
+resize), so they have to run on the same machine as the web service; a
+separate worker service would have its own disk. The child is restarted if
+it exits and stopped with gunicorn.
+
+Set ``JOB_WORKERS`` to the number of job worker processes to run (default 1,
+0 to run none, e.g. when the media storage is shared and jobs run elsewhere).
+"""
+import os
+import subprocess
+import sys
+import threading
+
+RESTART_DELAY = 5
+
+_job_workers = []
+_stopping = threading.Event()
+
+
+def _supervise(server, index):
+    """Keep job worker ``index`` running until gunicorn stops."""
+    command = [sys.executable, 'manage.py', 'run_jobs']
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    while not _stopping.is_set():
+        process = subprocess.Popen(command, cwd=cwd)
+        _job_workers[index] = process
+        process.wait()
+        if _stopping.is_set():
+            break
+        server.log.warning(f"Job worker exited with status {process.returncode}; restarting in {RESTART_DELAY}s")
+        if _stopping.wait(RESTART_DELAY):
+            break
+
+
+def when_ready(server):
+    count = int(os.environ.get('JOB_WORKERS', '1'))
+    for index in range(count):
+        _job_workers.append(None)
+        threading.Thread(target=_supervise, args=(server, index), name=f'job-worker-{index}', daemon=True).start()
+    if count:
+        server.log.info(f"Started {count} background job worker(s)")
+
+
+def on_exit(server):
+    _stopping.set()
+    for process in _job_workers:
+        if process is not None and process.poll() is None:
+            process.terminate()
+    for process in _job_workers:
+        if process is None:
+            continue
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
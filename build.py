@@ -50,6 +50,11 @@ def main():
     if not run_command("python manage.py migrate --settings=dl.settings_production", cwd=backend_dir):
         sys.exit(1)
     
+    # Create the shared cache table
+    print("\n4. Creating cache table...")
+    if not run_command("python manage.py createcachetable --settings=dl.settings_production", cwd=backend_dir):
+        sys.exit(1)
+    
     print("\n✅ Build completed successfully!")
 
 if __name__ == "__main__":
@@ -50,16 +50,31 @@ const UploadExam = () => {
     formData.append('subject_id', selectedSubject);
 
     try {
+      const token = localStorage.getItem('access_token');
+      const authHeaders = token ? { Authorization: `Bearer ${token}` } : {};
       const res = await axios.post(
         'http://127.0.0.1:8000/api/upload-parse/',
         formData,
         {
           headers: {
             'Content-Type': 'multipart/form-data',
+            ...authHeaders,
           },
         }
       );
-      setParsedQuestions(res.data.questions || []);
+      // Parsing runs as a background job; poll until it finishes
+      let job = res.data;
+      while (job.status === 'queued' || job.status === 'running') {
+        await new Promise((resolve) => setTimeout(resolve, 2000));
+        job = (await axios.get(
+          `http://127.0.0.1:8000/api/upload-parse/${job.job_id}/`,
+          { headers: authHeaders }
+        )).data;
+      }
+      if (job.status === 'failed') {
+        throw new Error(job.error || 'Parsing job failed');
+      }
+      setParsedQuestions(job.questions || []);
     } catch (err) {
       console.error('PDF parsing failed:', err);
       alert('Failed to scan PDF.');
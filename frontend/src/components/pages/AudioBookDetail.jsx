@@ -17,6 +17,9 @@ const AudioBookDetail = () => {
   const [generatingAI, setGeneratingAI] = useState(false);
   const [aiAudioUrl, setAiAudioUrl] = useState(null);
   const [aiAudioPlaying, setAiAudioPlaying] = useState(false);
+  const [chapters, setChapters] = useState([]);
+  const [chapterIndex, setChapterIndex] = useState(0);
+  const [renderProgress, setRenderProgress] = useState(0);
   
   // Recording state
   const [isRecording, setIsRecording] = useState(false);
@@ -34,6 +37,7 @@ const AudioBookDetail = () => {
 
   useEffect(() => {
     fetchBook();
+    loadChapters().catch((error) => console.error('Error fetching chapters:', error));
   }, [id]);
 
   const fetchBook = async () => {
@@ -62,25 +66,53 @@ const AudioBookDetail = () => {
     }
   };
 
+  // Signed-in requests get chapter audio links signed for the user (paid books)
+  const authHeaders = () => {
+    const token = localStorage.getItem('access_token');
+    return token ? { Authorization: `Bearer ${token}` } : {};
+  };
+
+  // Rendered chapter audio and the status of the latest rendering job
+  const loadChapters = async () => {
+    const { data } = await axios.get(`http://127.0.0.1:8000/api/audiobooks/${id}/chapters/`, { headers: authHeaders() });
+    setChapters(data.chapters || []);
+    if (data.chapters && data.chapters.length > 0) {
+      setChapterIndex(0);
+      setAiAudioUrl(data.chapters[0].audio_url);
+    }
+    return data;
+  };
+
+  const playChapter = (index, keepPlaying = false) => {
+    setChapterIndex(index);
+    setAiAudioUrl(chapters[index].audio_url);
+    setAiAudioPlaying(keepPlaying);
+  };
+
   // Generate AI Audio from PDF
   const generateAIAudio = async () => {
     setGeneratingAI(true);
+    setRenderProgress(0);
     try {
-      // Call backend API to generate audio from PDF
-      const response = await axios.post(
+      // Rendering runs as a background job; poll the chapters until it finishes
+      await axios.post(
         `http://127.0.0.1:8000/api/audiobooks/generate-audio/`,
-        { book_id: id }
+        { book_id: id },
+        { headers: authHeaders() }
       );
-      
-      if (response.data.success) {
-        setAiAudioUrl(response.data.audio_url);
-        alert('AI audio generated successfully! You can now play it.');
-        // Refresh book data to get updated audio file
-        fetchBook();
+      let data = await loadChapters();
+      while (data.rendering && ['queued', 'running'].includes(data.rendering.status)) {
+        setRenderProgress(data.rendering.percent || 0);
+        await new Promise((resolve) => setTimeout(resolve, 3000));
+        data = await loadChapters();
+      }
+      if (data.rendering && data.rendering.status === 'failed') {
+        throw new Error(data.rendering.error || 'Audio rendering failed');
       }
+      alert('AI audio generated successfully! You can now play it.');
     } catch (error) {
       console.error('Error generating AI audio:', error);
-      const errorMsg = error.response?.data?.error || 'Failed to generate audio. Please try again.';
+      const errorMsg = error.response?.data?.error || error.message || 'Failed to generate audio. Please try again.';
       alert(`Error: ${errorMsg}`);
     } finally {
       setGeneratingAI(false);
@@ -257,7 +289,7 @@ const AudioBookDetail = () => {
                     {generatingAI ? (
                       <>
                         <FaSpinner className="animate-spin mr-3" />
-                        Generating AI Audio...
+                        Generating AI Audio... {renderProgress}%
                       </>
                     ) : (
                       <>
@@ -279,7 +311,17 @@ const AudioBookDetail = () => {
                     src={aiAudioUrl}
                     onTimeUpdate={(e) => setCurrentTime(e.target.currentTime)}
                     onLoadedMetadata={(e) => setDuration(e.target.duration)}
-                    onEnded={() => setAiAudioPlaying(false)}
+                    onEnded={() => {
+                      // Continue with the next chapter
+                      if (chapterIndex + 1 < chapters.length) {
+                        playChapter(chapterIndex + 1, true);
+                      } else {
+                        setAiAudioPlaying(false);
+                      }
+                    }}
+                    onCanPlay={(e) => {
+                      if (aiAudioPlaying) e.target.play();
+                    }}
                   />
 
                   {/* Progress Bar */}
@@ -340,6 +382,23 @@ const AudioBookDetail = () => {
                     </button>
                   </div>
 
+                  {/* Chapters */}
+                  {chapters.length > 1 && (
+                    <ul className="mb-6 divide-y divide-gray-200 dark:divide-gray-700">
+                      {chapters.map((chapter, index) => (
+                        <li key={chapter.id}>
+                          <button
+                            onClick={() => playChapter(index)}
+                            className={`w-full flex justify-between py-2 text-left ${index === chapterIndex ? 'text-purple-600 font-semibold' : 'text-gray-700 dark:text-gray-300'}`}
+                          >
+                            <span>{chapter.title}</span>
+                            <span>{chapter.duration}</span>
+                          </button>
+                        </li>
+                      ))}
+                    </ul>
+                  )}
+
                   {/* Download AI Audio */}
                   <button
                     onClick={() => downloadRecording(aiAudioUrl, 'ai')}
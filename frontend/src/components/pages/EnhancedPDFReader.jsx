@@ -79,7 +79,12 @@ const EnhancedPDFReader = () => {
 
   const fetchPDFText = async (bookId) => {
     try {
-      const response = await axios.get(`http://127.0.0.1:8000/api/audiobooks/extract-text/${bookId}/`);
+      // Text is extracted by a background job the first time; poll until it finishes
+      let response = await axios.get(`http://127.0.0.1:8000/api/audiobooks/extract-text/${bookId}/`);
+      while (response.status === 202) {
+        await new Promise((resolve) => setTimeout(resolve, 2000));
+        response = await axios.get(`http://127.0.0.1:8000/api/audiobooks/extract-text/${bookId}/`);
+      }
       if (response.data.success) {
         setPdfText(response.data.text);
       }
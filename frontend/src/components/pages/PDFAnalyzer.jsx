@@ -4,6 +4,12 @@ import { Loader2, FileText, UploadCloud, BookOpen, Download } from "lucide-react
 
 const API_BASE = "http://127.0.0.1:8000/api"; // Adjust if your backend is different
 
+// Uploads and their analyses are visible to their uploader (and staff) only
+const authHeaders = () => {
+  const token = localStorage.getItem("access_token");
+  return token ? { Authorization: `Bearer ${token}` } : {};
+};
+
 const PDFAnalyzer = () => {
   const [file, setFile] = useState(null);
   const [pdfs, setPdfs] = useState([]);
@@ -15,7 +21,7 @@ const PDFAnalyzer = () => {
   // Fetch PDFs from API
   const fetchPDFs = async () => {
     try {
-      const res = await axios.get(`${API_BASE}/pdfs/`);
+      const res = await axios.get(`${API_BASE}/pdfs/`, { headers: authHeaders() });
       setPdfs(res.data);
     } catch (err) {
       console.error(err);
@@ -34,7 +40,7 @@ const PDFAnalyzer = () => {
 
     try {
       await axios.post(`${API_BASE}/pdfs/upload/`, formData, {
-        headers: { "Content-Type": "multipart/form-data" },
+        headers: { ...authHeaders(), "Content-Type": "multipart/form-data" },
         onUploadProgress: (event) => {
           const percent = Math.round((event.loaded * 100) / event.total);
           setProgress(percent);
@@ -58,14 +64,13 @@ const PDFAnalyzer = () => {
     setProgress(0);
 
     try {
-      const res = await axios.get(`${API_BASE}/pdfs/${pdf.id}/analyze/`, {
-        onDownloadProgress: (event) => {
-          if (event.lengthComputable) {
-            const percent = Math.round((event.loaded * 100) / event.total);
-            setProgress(percent);
-          }
-        },
-      });
+      // Analysis (OCR of scanned pages) runs as a background job; poll until it finishes
+      let res = await axios.get(`${API_BASE}/pdfs/${pdf.id}/analyze/`, { headers: authHeaders() });
+      while (res.status === 202) {
+        setProgress(res.data.percent || 0);
+        await new Promise((resolve) => setTimeout(resolve, 2000));
+        res = await axios.get(`${API_BASE}/pdfs/${pdf.id}/analyze/`, { headers: authHeaders() });
+      }
       setAnalysis(res.data);
     } catch (err) {
       console.error(err);
@@ -80,6 +85,7 @@ const PDFAnalyzer = () => {
   const downloadFile = async (pdfId, type) => {
     try {
       const res = await axios.get(`${API_BASE}/pdfs/${pdfId}/download/${type}/`, {
+        headers: authHeaders(),
         responseType: "blob",
       });
       const url = window.URL.createObjectURL(new Blob([res.data]));